@@ -7,7 +7,7 @@
 import streamlit as st
 from datetime import datetime
 import logging
-import re
+import uuid
 from config.settings import (
     DEFAULT_MODEL,
     AVAILABLE_MODELS,
@@ -15,10 +15,10 @@ from config.settings import (
     EMBEDDING_MODEL,
     AVAILABLE_EMBEDDING_MODELS
 )
-# RAGAgent: 用于处理用户输入和生成响应的智能体，封装模型交互逻辑。
-from models.agent import RAGAgent
-# ChatHistoryManager: 管理对话历史
-from utils.chat_history import ChatHistoryManager
+# rag_agent_pool: 按模型版本复用RAGAgent（智能体封装模型交互逻辑）
+from models.agent import rag_agent_pool
+# history_store: 按会话id管理对话历史（进程内共享）
+from utils.chat_history import history_store, is_valid_session_id
 # DocumentProcessor: 处理用户上传的文档
 from utils.document_processor import DocumentProcessor
 # VectorStoreService: 向量数据库服务，用于文档索引与检索
@@ -40,14 +40,20 @@ class App:
         @description 初始化应用
         """
         self._init_session_state()  # 初始化会话状态
-        self.chat_history = ChatHistoryManager()  # 创建聊天历史管理器
+        self.chat_history = history_store.get(st.session_state.session_id)  # 获取当前会话的聊天历史（重跑时复用，不重复读文件）
         self.document_processor = DocumentProcessor()  # 创建文档处理器
-        self.vector_store = VectorStoreService()  # 创建向量存储服务
+        self.vector_store = VectorStoreService()  # 创建向量存储服务（嵌入模型与索引从进程级注册表复用）
+        self.vector_store.load_vector_store()  # 每次重跑仅在索引文件变化时才真正读取磁盘
         logger.info("应用初始化成功")
     
     # 1. 初始化会话状态
     @error_handler(show_error=False)
     def _init_session_state(self):
+        if 'session_id' not in st.session_state:
+            # 会话id写入URL参数，刷新页面后仍对应同一份历史；格式不符的id不使用，改为新建会话
+            session_id = st.query_params.get("session")
+            st.session_state.session_id = session_id if is_valid_session_id(session_id) else uuid.uuid4().hex
+            st.query_params["session"] = st.session_state.session_id
         if 'model_version' not in st.session_state:
             st.session_state.model_version = DEFAULT_MODEL  # 设置默认模型
         if 'processed_documents' not in st.session_state:
@@ -114,6 +120,8 @@ class App:
         2️⃣ 普通模式：直接调用模型
         """
         self.chat_history.add_message("user", prompt)  # 将用户消息添加到聊天历史
+        with st.chat_message("user"):
+            st.write(prompt)  # 立即显示用户消息，回复随后流式显示
         if st.session_state.rag_enabled:
             self._process_rag_query(prompt)  # 如果启用RAG，处理RAG查询
         else:
@@ -136,15 +144,14 @@ class App:
             logger.info(f"检索到的文档数: {len(docs)}")  
             # 获取文档上下文
             context = self.vector_store.get_context(docs)  
-            # 创建RAG代理
-            agent = RAGAgent(st.session_state.model_version)  
-            # 运行代理获取响应
-            response = agent.run(  
-                prompt, 
-                context=context
+        # 从池中借用RAG代理，流式生成并显示响应
+        with rag_agent_pool.lease(st.session_state.model_version) as agent:
+            response, think_content = UIComponents.render_streaming_response(
+                agent.stream(prompt, context=context),
+                docs
             )
-            # 处理响应
-            self._process_response(response, docs)  
+        # 处理响应
+        self._process_response(response, think_content, docs)  
     
 
     # 6. 处理简单查询
@@ -154,38 +161,28 @@ class App:
         """
         prompt - 用户输入的提示文本
         """
-        with st.spinner("🤖 思考中..."): 
-            # 创建RAG代理
-            agent = RAGAgent(st.session_state.model_version)  
-            # 运行代理获取响应
-            response = agent.run(prompt)  
-            # 处理响应
-            self._process_response(response)  
+        # 从池中借用RAG代理，流式生成并显示响应
+        with rag_agent_pool.lease(st.session_state.model_version) as agent:
+            response, think_content = UIComponents.render_streaming_response(agent.stream(prompt))
+        # 处理响应
+        self._process_response(response, think_content)  
     
     
     # 7. 处理Agent的响应
-    def _process_response(self, response: str, docs=None):
+    def _process_response(self, response_wo_think: str, think_content=None, docs=None):
         """
-        response - 模型的原始响应
+        response_wo_think - 去除思考过程后的回答（流式解析时已分离<think>块）
+        think_content - 思考过程（可选）
         docs - 检索到的文档（可选）
         """
-        # 7.1 处理响应中的思考过程
-        think_pattern = r'<think>([\s\S]*?)</think>'  # 定义思考过程的正则表达式模式
-        think_match = re.search(think_pattern, response)  # 搜索思考过程
-        if think_match:
-            think_content = think_match.group(1).strip()  # 提取思考内容
-            response_wo_think = re.sub(think_pattern, '', response).strip()  # 移除思考部分
-        else:
-            think_content = None
-            response_wo_think = response
-        
-        # 7.2 保存响应到历史
-        self.chat_history.add_message("assistant", response_wo_think)  # 添加助手回复
+        # 保存响应到历史（本轮消息一次追加写入）
+        messages = [{"role": "assistant", "content": response_wo_think}]  # 添加助手回复
         if think_content:
-            self.chat_history.add_message("assistant_think", think_content)  # 添加思考过程
+            messages.append({"role": "assistant_think", "content": think_content})  # 添加思考过程
         if docs:
             doc_contents = [doc.page_content for doc in docs]  # 提取文档内容
-            self.chat_history.add_message("retrieved_doc", doc_contents)  # 添加检索到的文档
+            messages.append({"role": "retrieved_doc", "content": doc_contents})  # 添加检索到的文档
+        self.chat_history.add_messages(messages)
 
 
     # 入口处：运行应用
@@ -204,11 +201,11 @@ class App:
                 "询问您的文档..." if st.session_state.rag_enabled else "问我任何问题..."
             )
             
+            # 先渲染已有的聊天历史，本轮消息在其后流式显示
+            UIComponents.render_chat_history(self.chat_history)
+            
             if prompt:
                 self.process_user_input(prompt)  # 处理用户输入
-                
-            # 渲染聊天历史
-            UIComponents.render_chat_history(self.chat_history)
         
         mode_description = ""
         if st.session_state.rag_enabled:
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检索基准脚本
+在当前知识库上对比各FAISS索引类型的召回率与查询延迟，用于选择大规模语料的索引配置；
+并对比纯向量检索与向量+BM25混合检索的质量与延迟
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent))
+
+from services.vector_store import VectorStoreService
+from services.sparse_index import tokenize
+from config.settings import VECTOR_STORE_PATH, DEFAULT_SIMILARITY_THRESHOLD
+
+# 配置日志
+logging.basicConfig(level=logging.WARNING)
+
+
+def load_queries(queries_file: str):
+    """
+    读取查询文件，每行一个查询
+    """
+    with open(queries_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def print_index_report(vector_store: VectorStoreService, queries, k: int):
+    """
+    打印召回率-延迟报告
+    """
+    rows = vector_store.index_report(queries, k)
+    if not rows:
+        print("❌ 向量存储为空或没有查询")
+        return
+
+    print(f"\n📊 索引召回率-延迟报告 (查询数: {len(queries)}, k={k})")
+    print(f"{'索引类型':<10}{'查询参数':<22}{'召回率':>8}{'延迟(ms)':>12}{'构建(s)':>10}")
+    for row in rows:
+        params = ", ".join(f"{key}={value}" for key, value in row['params'].items()) or "-"
+        print(f"{row['index_type']:<12}{params:<24}{row[f'recall@{k}']:>8.3f}{row['avg_latency_ms']:>12.3f}{row['build_seconds']:>10.2f}")
+
+
+def load_qrels(qrels_file: str):
+    """
+    读取相关性标注，JSONL格式，每行 {"query": 查询, "relevant": [相关文档块应包含的文本片段, ...]}
+    """
+    qrels = {}
+    with open(qrels_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                qrels[record['query']] = record['relevant']
+    return qrels
+
+
+def evaluate_ranking(docs, query: str, relevant=None):
+    """
+    评估单个查询的检索结果
+
+    有标注时返回 (召回率, 倒数排名)：召回率为被top-k结果覆盖的相关片段比例，倒数排名取第一个相关结果；
+    无标注时返回 (词项覆盖率, None)：查询词项（中文二元组）出现在top-k结果中的比例，衡量命名实体等精确匹配
+    """
+    texts = [doc.page_content for doc in docs]
+    if relevant:
+        recall = sum(any(snippet in text for text in texts) for snippet in relevant) / len(relevant)
+        rank = next((i for i, text in enumerate(texts, start=1) if any(snippet in text for snippet in relevant)), None)
+        return recall, 1.0 / rank if rank else 0.0
+    terms = set(tokenize(query))
+    if not terms:
+        return 0.0, None
+    found = set(tokenize(" ".join(texts)))
+    return len(terms & found) / len(terms), None
+
+
+def print_hybrid_report(vector_store: VectorStoreService, queries, threshold: float, qrels=None):
+    """
+    打印纯向量检索与混合检索的质量-延迟对比
+    """
+    if not queries:
+        print("❌ 没有查询")
+        return
+    # 预热：查询向量进入缓存、BM25索引完成补建，两种方式只比较检索本身的耗时
+    for query in queries:
+        vector_store.search_documents(query, threshold, hybrid=True)
+
+    qrels = qrels or {}
+    metric = "召回率" if qrels else "词项覆盖率"
+    print(f"\n📊 混合检索对比 (查询数: {len(queries)}, 相似度阈值: {threshold})")
+    print(f"{'检索方式':<10}{metric:>10}{'MRR':>8}{'平均结果数':>10}{'延迟(ms)':>12}")
+    for name, hybrid in (("dense", False), ("hybrid", True)):
+        scores, reciprocal_ranks, sizes, seconds = [], [], [], 0.0
+        for query in queries:
+            started = time.perf_counter()
+            docs = vector_store.search_documents(query, threshold, hybrid=hybrid)
+            seconds += time.perf_counter() - started
+            score, reciprocal_rank = evaluate_ranking(docs, query, qrels.get(query))
+            scores.append(score)
+            sizes.append(len(docs))
+            if reciprocal_rank is not None:
+                reciprocal_ranks.append(reciprocal_rank)
+        mrr = f"{sum(reciprocal_ranks) / len(reciprocal_ranks):.3f}" if reciprocal_ranks else "-"
+        print(f"{name:<12}{sum(scores) / len(scores):>10.3f}{mrr:>8}{sum(sizes) / len(sizes):>12.1f}{seconds / len(queries) * 1000:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索基准测试")
+    parser.add_argument('--queries', type=str, default='test_queries.txt', help='查询文件路径')
+    parser.add_argument('-k', type=int, default=10, help='召回率计算的top-k')
+    parser.add_argument('--index-dir', type=str, default=VECTOR_STORE_PATH, help='索引目录')
+    parser.add_argument('--report', choices=['index', 'hybrid', 'all'], default='all', help='要运行的对比')
+    parser.add_argument('--qrels', type=str, help='相关性标注文件（JSONL），不提供时以查询词项覆盖率衡量检索质量')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLD, help='相似度阈值')
+    args = parser.parse_args()
+
+    vector_store = VectorStoreService(args.index_dir)
+    queries = load_queries(args.queries)
+    if args.report in ('index', 'all'):
+        print_index_report(vector_store, queries, args.k)
+    if args.report in ('hybrid', 'all'):
+        qrels = load_qrels(args.qrels) if args.qrels else None
+        print_hybrid_report(vector_store, queries, args.threshold, qrels)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,19 +6,23 @@ Agentic RAG CLI应用
 """
 
 import argparse
+import asyncio
 import json
 import logging
 import sys
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from models.multi_agent_rag import MultiAgentRAGSystem
 from services.vector_store import VectorStoreService
+from services.ingest_pipeline import IngestPipeline
 from utils.document_processor import DocumentProcessor
 from config.settings import (
     DEEPSEEK_API_KEY,
     DEFAULT_SIMILARITY_THRESHOLD,
-    VECTOR_STORE_PATH
+    VECTOR_STORE_PATH,
+    BATCH_CONCURRENCY,
+    BATCH_RATE_LIMIT
 )
 
 # 配置日志
@@ -49,8 +53,11 @@ class AgenticRAGCLI:
         
         if documents_path and Path(documents_path).exists():
             print(f"📁 从 {documents_path} 加载文档...")
-            # 这里可以添加文档加载逻辑
-            # 由于原项目使用Streamlit上传，这里我们使用Mock数据
+            # 流式导入：解析、嵌入、写入并行进行，内存占用与语料规模无关
+            stats = IngestPipeline(self.vector_store, self.document_processor).run(documents_path)
+            print(f"✅ 知识库设置完成: {stats['files']} 个文件，新增 {stats['written']} 个文档块，"
+                  f"耗时 {stats['seconds']:.1f}s ({stats['chunks_per_second']:.1f} 块/秒)")
+            return
         
         # 创建Mock知识库数据
         self._create_mock_knowledge_base()
@@ -103,17 +110,9 @@ class AgenticRAGCLI:
             }
         ]
         
-        # 将Mock数据添加到向量存储
-        for i, doc in enumerate(mock_documents):
-            # 调用向量存储的添加方法
-            success = self.rag_system.vector_store.add_document(
-                content=doc["content"],
-                metadata=doc["metadata"]
-            )
-            if success:
-                logger.info(f"添加文档 {i+1}: {doc['content'][:50]}...")
-            else:
-                logger.error(f"添加文档 {i+1} 失败")
+        # 将Mock数据批量写入向量存储（统一嵌入，结束时持久化一次）
+        added_chunks = self.rag_system.vector_store.add_documents_bulk(mock_documents)
+        logger.info(f"Mock知识库写入 {added_chunks} 个文档块")
         
         print(f"📚 已添加 {len(mock_documents)} 个文档到知识库")
     
@@ -224,31 +223,58 @@ class AgenticRAGCLI:
         if missing_info:
             print(f"⚠️ 缺失信息: {', '.join(missing_info)}")
     
-    def batch_mode(self, queries_file: str, output_file: str = None):
+    def batch_mode(
+        self,
+        queries_file: str,
+        output_file: str = None,
+        concurrency: int = BATCH_CONCURRENCY,
+        rate_limit: float = BATCH_RATE_LIMIT,
+        similarity_threshold: float = None
+    ):
         """
-        批处理模式
+        批处理模式：查询在同一事件循环上并发处理，结果按完成顺序逐行写入JSONL
         
         Args:
             queries_file: 查询文件路径
-            output_file: 输出文件路径
+            output_file: 输出文件路径（JSONL，每行带index字段可恢复输入顺序；已存在时跳过其中成功的查询继续处理）
+            concurrency: 同时处理的最大查询数
+            rate_limit: 每秒最多启动的查询数，0表示不限制
+            similarity_threshold: 相似度阈值
         """
+        if similarity_threshold is None:
+            similarity_threshold = DEFAULT_SIMILARITY_THRESHOLD
+        
         try:
             with open(queries_file, 'r', encoding='utf-8') as f:
                 queries = [line.strip() for line in f if line.strip()]
             
-            results = []
+            done = self._load_finished_indexes(output_file, queries) if output_file else set()
+            pending = [(i, query) for i, query in enumerate(queries) if i not in done]
+            if done:
+                print(f"⏩ 从 {output_file} 恢复：已完成 {len(done)} 个，剩余 {len(pending)} 个")
             
-            for i, query in enumerate(queries, 1):
-                print(f"\n处理查询 {i}/{len(queries)}: {query}")
-                result = self.process_query(query)
-                results.append(result)
+            results = []
+            out = open(output_file, 'a', encoding='utf-8') if output_file else None
+            try:
+                def on_result(index: int, result: Dict[str, Any], finished: int):
+                    print(f"✅ [{finished}/{len(pending)}] 查询 {index + 1}: {result.get('user_query')}"
+                          + (f" ❌ {result['error']}" if 'error' in result else ""))
+                    if out:
+                        out.write(json.dumps({'index': index, **result}, ensure_ascii=False, default=str) + "\n")
+                        out.flush()
+                    else:
+                        results.append((index, result))
+                
+                asyncio.run(self._run_batch(pending, similarity_threshold, concurrency, rate_limit, on_result))
+            finally:
+                if out:
+                    out.close()
             
+            self._print_planner_stats()
             if output_file:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, ensure_ascii=False, indent=2)
                 print(f"\n结果已保存到: {output_file}")
             else:
-                for result in results:
+                for _, result in sorted(results, key=lambda item: item[0]):
                     self._display_result(result)
                     print("\n" + "-" * 40 + "\n")
                     
@@ -257,6 +283,86 @@ class AgenticRAGCLI:
         except Exception as e:
             logger.error(f"批处理失败: {e}")
             print(f"❌ 批处理失败: {e}")
+    
+    def _print_planner_stats(self):
+        """
+        显示各规划层级的使用情况
+        """
+        stats = self.rag_system.planner.stats()
+        tiers = "，".join(
+            f"{tier} {info['count']} 次 ({info['avg_ms']:.0f}ms)" for tier, info in stats['tiers'].items()
+        )
+        print(f"\n📈 查询规划: {tiers}；快速路径占比 {stats['fast_path_rate']:.0%}，"
+              f"估计节省 {stats['estimated_seconds_saved']:.1f}s")
+    
+    async def _run_batch(self, pending, similarity_threshold: float, concurrency: int, rate_limit: float, on_result):
+        """
+        固定数量的worker从队列取查询处理，按rate_limit控制启动间隔
+        
+        Args:
+            pending: (输入序号, 查询) 列表
+            similarity_threshold: 相似度阈值
+            concurrency: worker数量
+            rate_limit: 每秒最多启动的查询数，0表示不限制
+            on_result: 每个查询完成时的回调 (序号, 结果, 已完成数)
+        """
+        queue = asyncio.Queue()
+        for item in pending:
+            queue.put_nowait(item)
+        
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / rate_limit if rate_limit else 0.0
+        throttle = asyncio.Lock()
+        next_start = loop.time()
+        finished = 0
+        
+        async def worker():
+            nonlocal next_start, finished
+            while True:
+                try:
+                    index, query = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if interval:
+                    async with throttle:
+                        delay = next_start - loop.time()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        next_start = max(next_start, loop.time()) + interval
+                try:
+                    result = await self.rag_system.aprocess_query(query, similarity_threshold)
+                except Exception as e:
+                    logger.error(f"查询处理失败: {e}")
+                    result = {'error': str(e), 'user_query': query}
+                finished += 1
+                on_result(index, result, finished)
+        
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    
+    @staticmethod
+    def _load_finished_indexes(output_file: str, queries: List[str]) -> set:
+        """
+        读取已有输出中成功完成的查询序号（失败的查询会重新处理，末尾不完整的行被忽略）；
+        记录的查询与查询文件中同一序号的查询不一致时，说明输出文件属于另一份查询列表，不跳过任何查询而是报错
+        """
+        done = set()
+        if not Path(output_file).exists():
+            return done
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'index' in record and 'error' not in record:
+                    index = record['index']
+                    if not (isinstance(index, int) and 0 <= index < len(queries) and record.get('user_query') == queries[index]):
+                        raise ValueError(
+                            f"{output_file} 中序号 {index} 的查询与查询文件不一致（{record.get('user_query')!r}），"
+                            f"请改用新的输出文件或删除该文件后重跑"
+                        )
+                    done.add(index)
+        return done
 
 def main():
     """
@@ -269,7 +375,7 @@ def main():
 示例用法:
   python cli_app.py                          # 交互模式
   python cli_app.py -q "张三参与了哪个项目？"    # 单次查询
-  python cli_app.py -b queries.txt           # 批处理模式
+  python cli_app.py -b queries.txt -o results.jsonl --concurrency 8   # 并发批处理，中断后重跑同一命令可续跑
   python cli_app.py --setup-kb               # 设置知识库
         """
     )
@@ -289,7 +395,21 @@ def main():
     parser.add_argument(
         '-o', '--output',
         type=str,
-        help='输出文件路径（批处理模式）'
+        help='输出文件路径（批处理模式，JSONL格式，已存在时续跑）'
+    )
+    
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=BATCH_CONCURRENCY,
+        help=f'批处理并发查询数 (默认: {BATCH_CONCURRENCY})'
+    )
+    
+    parser.add_argument(
+        '--rate-limit',
+        type=float,
+        default=BATCH_RATE_LIMIT,
+        help='批处理每秒最多启动的查询数，0表示不限制'
     )
     
     parser.add_argument(
@@ -334,7 +454,7 @@ def main():
         elif args.batch:
             # 批处理模式
             app.setup_knowledge_base()  # 确保知识库已设置
-            app.batch_mode(args.batch, args.output)
+            app.batch_mode(args.batch, args.output, args.concurrency, args.rate_limit, args.threshold)
         else:
             # 交互模式（默认）
             app.setup_knowledge_base()  # 确保知识库已设置
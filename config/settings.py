@@ -4,7 +4,8 @@
 
 # 1. 文件路径
 VECTOR_STORE_PATH = "faiss_index"
-HISTORY_FILE = "chat_history.json"
+HISTORY_FILE = "chat_history.jsonl"  # 旧版全局历史文件，迁移到旧版会话（LEGACY_SESSION_ID）
+HISTORY_DIR = "chat_history"  # 按会话存放的JSONL历史文件目录
 
 # 2. 模型配置
 DEFAULT_MODEL = "deepseek-chat"
@@ -30,4 +31,79 @@ CHUNK_OVERLAP = 30
 SEPARATORS = ["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""]
 
 # 5. 对话历史配置
-MAX_HISTORY_TURNS = 5
\ No newline at end of file
+MAX_HISTORY_TURNS = 5
+HISTORY_MAX_TOKENS = 1500  # 注入提示词的对话历史token预算
+HISTORY_LOAD_MESSAGES = 200  # 启动时只从文件尾部读取的消息数（内存中保留的上限）
+HISTORY_COMPACT_THRESHOLD = 5000  # 活跃文件消息数超过该值时压缩，0表示不压缩
+HISTORY_RETAIN_MESSAGES = 1000  # 压缩后活跃文件保留的最近消息数，更早的消息移入归档文件（导出时仍包含）
+DEFAULT_SESSION_ID = "default"  # 未指定会话时使用的会话id
+LEGACY_SESSION_ID = "legacy"  # 旧版全局历史迁移后所在的会话id（Web界面通过 ?session=legacy 访问）
+MAX_ACTIVE_SESSIONS = 256  # 内存中保留的最大会话数（LRU淘汰）
+
+# 6. 批量导入配置
+INGEST_BATCH_SIZE = 256  # 每批嵌入的文档块数量
+INGEST_CHECKPOINT_BATCHES = 0  # 每处理多少批持久化一次，0表示仅在导入结束时持久化
+INGEST_QUEUE_SIZE = 8  # 流式导入各阶段间队列的最大长度（决定内存上限）
+INGEST_PROGRESS_INTERVAL = 5.0  # 流式导入进度输出间隔（秒）
+
+# 7. 查询向量缓存配置
+QUERY_EMBEDDING_CACHE_SIZE = 4096  # 最大缓存条目数（LRU淘汰）
+QUERY_EMBEDDING_CACHE_PATH = ".cache/query_embeddings.json"  # 持久化文件，设为None则仅内存缓存
+QUERY_EMBEDDING_CACHE_SAVE_EVERY = 64  # 每新增多少条目落盘一次，0表示仅在进程退出时落盘
+
+# 8. FAISS索引配置
+FAISS_INDEX_TYPE = "flat"  # flat / ivf_flat / ivf_pq / hnsw，非flat类型在向量数足够训练时自动由Flat重建
+FAISS_IVF_NLIST = 1024  # IVF聚类中心数量，建议约为 4*sqrt(向量数)
+FAISS_PQ_M = 16  # PQ子量化器数量，需整除嵌入维度
+FAISS_PQ_NBITS = 8  # PQ每个子量化器的编码位数
+FAISS_HNSW_M = 32  # HNSW每个节点的邻居数
+FAISS_HNSW_MIN_SIZE = 10000  # 向量数达到该值才由Flat转换为HNSW，更小的语料Flat精确检索已足够快
+FAISS_TRAIN_SAMPLE_SIZE = 100000  # 训练样本数上限
+FAISS_NPROBE = 16  # IVF查询时访问的聚类数
+FAISS_EF_SEARCH = 64  # HNSW查询时的候选队列长度
+VECTOR_STORE_MMAP = True  # 以只读内存映射方式加载index.faiss，docstore按需加载；IVF倒排表总是映射，Flat/HNSW向量仅在faiss支持IO_FLAG_MMAP_IFC时映射（否则仍完整读入内存），HNSW图结构总是读入内存
+
+# 9. 文档解析配置
+PDF_PAGES_PER_TASK = 32  # 大PDF按页段拆分到进程池并行解析，每个任务的页数
+PARSE_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 解析缓存总大小上限（字节），超出时按最近使用时间淘汰，0表示不限制
+PARSE_CACHE_LEVEL = 3  # 解析缓存的zstd压缩级别
+
+# 10. 上下文token预算配置
+TOKEN_ENCODING = "cl100k_base"  # tiktoken编码名称，未安装tiktoken时按字符估算
+CONTEXT_MAX_TOKENS = 3000  # RAG提示词中检索内容的token预算
+ANALYZER_CONTEXT_MAX_TOKENS = 6000  # 分析Agent提示词中文档部分的token预算
+CONTEXT_MIN_TRUNCATE_TOKENS = 50  # 剩余预算少于该值时不再截断放入片段
+
+# 11. 智能体池配置
+AGENT_POOL_MAX_IDLE = 8  # 每个模型版本最多保留的空闲RAGAgent数
+AGENT_POOL_MAX_MODELS = 4  # 智能体池最多保留的模型版本数
+AGENT_POOL_IDLE_TTL = 600  # 空闲智能体的最长保留时间（秒），超时后释放，0表示不按时间淘汰
+
+# 12. CLI批处理配置
+BATCH_CONCURRENCY = 4  # 批处理同时处理的最大查询数
+BATCH_RATE_LIMIT = 0  # 批处理每秒最多启动的查询数，0表示不限制
+
+# 13. 语义答案缓存配置
+ANSWER_CACHE_SIZE = 512  # 多Agent系统最多缓存的查询结果数，0表示禁用
+ANSWER_CACHE_TTL = 3600  # 缓存结果的有效期（秒），0表示不过期
+ANSWER_CACHE_SIMILARITY = 1.0  # 查询向量余弦相似度不低于该值时视为同一问题；1.0表示只命中归一化文本完全相同的查询（默认，多语言嵌入模型下可调低如0.95）
+ANSWER_CACHE_MIN_OVERLAP = 0.9  # 语义命中还需两个查询的词项重合度（Jaccard）不低于该值，防止只有实体名不同的问题互相命中
+
+# 14. 查询规划配置
+PLAN_CACHE_SIZE = 1024  # 按归一化查询缓存的规划结果数，0表示禁用
+PLAN_FAST_PATH = False  # 开启后，明确的单实体定义类查询（如"飞天项目是什么？"）跳过规划LLM直接检索
+PLAN_FAST_PATH_MAX_CHARS = 40  # 超过该长度的查询不走快速路径
+
+# 15. 多跳分析配置
+ANALYSIS_CONVERGENCE_DELTA = 0.05  # 新一轮证据使置信度提升小于该值时视为收敛，提前结束迭代
+
+# 16. 结构化输出配置
+STRUCTURED_OUTPUT_MAX_REPAIRS = 1  # 规划/分析输出无法解析时，最多要求模型修复的次数
+
+# 17. 混合检索配置
+HYBRID_SEARCH = True  # 向量检索结果与BM25检索结果按倒数排名融合（RRF）
+SPARSE_TOP_K = 10  # BM25检索返回的最大文档块数
+SPARSE_MIN_SCORE = 0.5  # BM25分数下限（除以查询词idf之和归一化，约等于按idf加权的查询词命中比例），低于该值的BM25结果不参与融合
+RRF_K = 60  # 倒数排名融合的平滑常数，越大排名靠后的结果权重越接近靠前的结果
+BM25_K1 = 1.5  # BM25词频饱和参数
+BM25_B = 0.75  # BM25文档长度归一化参数
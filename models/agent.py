@@ -1,12 +1,16 @@
 """
 智能体模型类
 """
-from typing import Optional, Dict, Any, List
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterator, Tuple
 from agno.agent import Agent
 from agno.models.ollama import Ollama
 from agno.tools.reasoning import ReasoningTools
 from agno.tools.function import Function
-from config.settings import DEFAULT_MODEL, AMAP_API_KEY
+from config.settings import DEFAULT_MODEL, AMAP_API_KEY, AGENT_POOL_MAX_IDLE, AGENT_POOL_MAX_MODELS, AGENT_POOL_IDLE_TTL
 from services.weather_tools import WeatherTools
 import logging
 
@@ -88,13 +92,150 @@ class RAGAgent:
         Returns:
             str: 智能体的响应
         """
+        # 让Agent处理请求，会自动判断是否使用天气查询工具
+        response = self.agent.run(self._build_prompt(prompt, context))
+        return response.content 
+
+    def stream(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        """
+        流式运行智能体，模型每生成一段文本即产出
+        
+        Args:
+            prompt (str): 用户输入的提示
+            context (Optional[str]): 可选的文档上下文
+            
+        Returns:
+            Iterator[str]: 增量文本片段（可能包含<think>标签，由调用方增量解析）
+        """
+        for chunk in self.agent.run(self._build_prompt(prompt, context), stream=True):
+            content = getattr(chunk, "content", None)
+            if isinstance(content, str) and content:
+                yield content
+
+    def _build_prompt(self, prompt: str, context: Optional[str] = None) -> str:
         if context:
             # RAG模式：有上下文的情况
-            full_prompt = f"""【检索内容】\n{context}\n\n【用户问题】\n{prompt}\n\n请严格按照【检索内容】作答。但如果是询问天气相关信息，请直接使用query_weather工具获取实时天气数据。"""
-        else:
-            # 普通对话模式：无上下文的情况
-            full_prompt = f"【用户问题】\n{prompt}\n\n请提供准确、有帮助的回答。如果用户询问天气，请使用query_weather工具。"
+            return f"""【检索内容】\n{context}\n\n【用户问题】\n{prompt}\n\n请严格按照【检索内容】作答。但如果是询问天气相关信息，请直接使用query_weather工具获取实时天气数据。"""
+        # 普通对话模式：无上下文的情况
+        return f"【用户问题】\n{prompt}\n\n请提供准确、有帮助的回答。如果用户询问天气，请使用query_weather工具。"
+
+    def reset(self) -> None:
+        """
+        清除本次运行留在Agent中的记忆，避免被池化复用时在会话之间串话或持续占用内存
+        """
+        memory = getattr(self.agent, "memory", None)
+        if memory is not None and hasattr(memory, "clear"):
+            memory.clear()
+
+
+class RAGAgentPool:
+    """
+    RAGAgent池：按模型版本缓存已配置好的智能体（连同其工具与HTTP连接），跨请求复用；
+    agno的Agent在一次运行期间持有运行状态，因此同一实例同一时刻只借给一个请求；
+    空闲实例按空闲时长与模型版本数淘汰，不再使用的模型版本无需调用方显式失效
+    """
+    def __init__(self, max_idle: int = AGENT_POOL_MAX_IDLE, max_models: int = AGENT_POOL_MAX_MODELS, idle_ttl: float = AGENT_POOL_IDLE_TTL):
+        """
+        初始化智能体池
         
-        # 让Agent处理请求，会自动判断是否使用天气查询工具
-        response = self.agent.run(full_prompt)
-        return response.content 
\ No newline at end of file
+        Args:
+            max_idle (int): 每个模型版本最多保留的空闲智能体数
+            max_models (int): 最多保留的模型版本数（按最近使用淘汰）
+            idle_ttl (float): 空闲智能体的最长保留时间（秒），0表示不按时间淘汰
+        """
+        self.max_idle = max_idle
+        self.max_models = max_models
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        # 模型版本 -> [(智能体, 归还时间)]，最近归还的在末尾
+        self._idle: "OrderedDict[str, List[Tuple[RAGAgent, float]]]" = OrderedDict()
+        # 模型版本 -> 代次，失效后归还的旧代次智能体直接丢弃
+        self._generations: Dict[str, int] = {}
+        
+    def checkout(self, model_version: str = DEFAULT_MODEL) -> RAGAgent:
+        """
+        借出智能体，没有空闲实例时新建
+        
+        Args:
+            model_version (str): 模型版本名称
+            
+        Returns:
+            RAGAgent: 智能体实例，用完后需调用checkin归还
+        """
+        with self._lock:
+            self._expire()
+            idle = self._idle.get(model_version)
+            if idle:
+                self._idle.move_to_end(model_version)
+                return idle.pop()[0]
+            generation = self._generations.setdefault(model_version, 0)
+        agent = RAGAgent(model_version)
+        agent.pool_generation = generation
+        logger.info(f"创建新的智能体实例: {model_version}")
+        return agent
+    
+    def checkin(self, agent: RAGAgent) -> None:
+        """
+        归还智能体
+        
+        Args:
+            agent (RAGAgent): checkout借出的智能体
+        """
+        with self._lock:
+            model_version = agent.model_version
+            if getattr(agent, "pool_generation", None) != self._generations.get(model_version):
+                return
+            agent.reset()
+            idle = self._idle.setdefault(model_version, [])
+            self._idle.move_to_end(model_version)
+            if len(idle) < self.max_idle:
+                idle.append((agent, time.monotonic()))
+            while len(self._idle) > self.max_models:
+                evicted, _ = self._idle.popitem(last=False)
+                self._generations[evicted] = self._generations.get(evicted, 0) + 1
+            self._expire()
+    
+    @contextmanager
+    def lease(self, model_version: str = DEFAULT_MODEL) -> Iterator[RAGAgent]:
+        """
+        以上下文管理器方式借用智能体，退出时自动归还
+        
+        Args:
+            model_version (str): 模型版本名称
+        """
+        agent = self.checkout(model_version)
+        try:
+            yield agent
+        finally:
+            self.checkin(agent)
+    
+    def invalidate(self, model_version: Optional[str] = None) -> None:
+        """
+        使某个模型版本（默认全部）的智能体失效，正在使用中的实例归还时丢弃
+        
+        Args:
+            model_version (Optional[str]): 模型版本名称
+        """
+        with self._lock:
+            versions = [model_version] if model_version else list(self._generations)
+            for version in versions:
+                self._idle.pop(version, None)
+                self._generations[version] = self._generations.get(version, 0) + 1
+    
+    def _expire(self) -> None:
+        """
+        丢弃空闲超过idle_ttl的智能体，没有空闲实例的模型版本一并移出（调用方持有锁）
+        """
+        if not self.idle_ttl:
+            return
+        deadline = time.monotonic() - self.idle_ttl
+        for version in list(self._idle):
+            idle = [(agent, returned_at) for agent, returned_at in self._idle[version] if returned_at >= deadline]
+            if idle:
+                self._idle[version] = idle
+            else:
+                del self._idle[version]
+
+
+# 进程级共享的智能体池（Streamlit各会话与重跑之间复用）
+rag_agent_pool = RAGAgentPool()
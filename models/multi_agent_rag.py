@@ -4,24 +4,73 @@
 实现支持多跳推理的Agentic RAG架构
 """
 
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Generator, Tuple
 from agno.agent import Agent
 from agno.models.deepseek import DeepSeek
 from agno.tools.reasoning import ReasoningTools
 from agno.tools.function import Function
-from config.settings import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEFAULT_MODEL
+from config.settings import (
+    DEEPSEEK_API_KEY,
+    DEEPSEEK_BASE_URL,
+    DEFAULT_MODEL,
+    ANALYZER_CONTEXT_MAX_TOKENS,
+    PLAN_CACHE_SIZE,
+    PLAN_FAST_PATH,
+    ANALYSIS_CONVERGENCE_DELTA
+)
+from models.schemas import QueryPlan, Analysis
 from services.vector_store import VectorStoreService
+from services.answer_cache import answer_cache
+from services.embedding_cache import QueryEmbeddingCache
+from utils.context_builder import ContextBuilder, dedupe_indexed
+from utils.query_router import is_single_hop, single_hop_plan
+from utils.structured_output import run_structured, arun_structured, StructuredOutputError
+import asyncio
+import copy
+import inspect
 import logging
 import json
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+
+def _stream(agent: Agent, prompt: str):
+    """
+    流式运行Agent，结构化输出解析器边接收边解析，JSON对象闭合后即停止读取
+    """
+    return agent.run(prompt, stream=True)
+
+
+async def _astream(agent: Agent, prompt: str):
+    """
+    异步流式运行Agent：agno的Agent在运行期间持有运行状态，同一实例上的并发调用各自使用一份副本
+    """
+    response = agent.deep_copy().arun(prompt, stream=True)
+    if inspect.isawaitable(response):
+        response = await response
+    async for chunk in response:
+        yield chunk
+
 class PlannerAgent:
     """
     规划Agent：负责分析用户查询，制定多跳推理计划
+    
+    规划分为四个层级：cache（命中规划缓存）、heuristic（本地规则判定为单跳，直接检索）、
+    llm（调用规划LLM）、fallback（LLM输出无法解析，使用单跳计划）
     """
+    TIERS = ("cache", "heuristic", "llm", "fallback")
     
-    def __init__(self):
+    def __init__(self, cache_size: int = PLAN_CACHE_SIZE, fast_path: bool = PLAN_FAST_PATH):
+        self.cache_size = cache_size
+        self.fast_path = fast_path
+        self._lock = threading.Lock()
+        # 归一化查询 -> LLM生成的规划
+        self._plan_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tier_counts = {tier: 0 for tier in self.TIERS}
+        self._tier_seconds = {tier: 0.0 for tier in self.TIERS}
         self.agent = Agent(
             name="Planner",
             model=DeepSeek(
@@ -66,9 +115,101 @@ class PlannerAgent:
             user_query: 用户查询
             
         Returns:
-            Dict: 包含规划信息的字典
+            Dict: 包含规划信息的字典（planner_tier字段记录规划来源层级）
+        """
+        started = time.perf_counter()
+        plan = self._fast_plan(user_query, started)
+        if plan is None:
+            try:
+                parsed = run_structured(lambda prompt: _stream(self.agent, prompt), self._plan_prompt(user_query), QueryPlan)
+            except StructuredOutputError as e:
+                logger.error(f"解析规划结果失败: {e}")
+                parsed = None
+            plan = self._finish_llm_plan(parsed, user_query, started)
+        return plan
+    
+    async def aplan_query(self, user_query: str) -> Dict[str, Any]:
+        """
+        plan_query的异步版本
+        """
+        started = time.perf_counter()
+        plan = self._fast_plan(user_query, started)
+        if plan is None:
+            try:
+                parsed = await arun_structured(lambda prompt: _astream(self.agent, prompt), self._plan_prompt(user_query), QueryPlan)
+            except StructuredOutputError as e:
+                logger.error(f"解析规划结果失败: {e}")
+                parsed = None
+            plan = self._finish_llm_plan(parsed, user_query, started)
+        return plan
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        各规划层级的使用次数与平均耗时，以及快速层级（cache/heuristic）相对调用LLM估算节省的时间
+        
+        Returns:
+            Dict: 统计信息
+        """
+        with self._lock:
+            counts = dict(self._tier_counts)
+            seconds = dict(self._tier_seconds)
+            cache_size = len(self._plan_cache)
+        total = sum(counts.values())
+        llm_calls = counts["llm"] + counts["fallback"]
+        llm_average = (seconds["llm"] + seconds["fallback"]) / llm_calls if llm_calls else 0.0
+        fast = counts["cache"] + counts["heuristic"]
+        return {
+            "tiers": {
+                tier: {
+                    "count": counts[tier],
+                    "avg_ms": seconds[tier] / counts[tier] * 1000 if counts[tier] else 0.0
+                }
+                for tier in self.TIERS
+            },
+            "fast_path_rate": fast / total if total else 0.0,
+            "estimated_seconds_saved": max(0.0, fast * llm_average - seconds["cache"] - seconds["heuristic"]),
+            "cache_size": cache_size
+        }
+    
+    def _fast_plan(self, user_query: str, started: float) -> Optional[Dict[str, Any]]:
+        """
+        不调用LLM的规划层级：先查规划缓存，再用本地规则识别单跳查询
+        """
+        key = QueryEmbeddingCache.normalize(user_query)
+        with self._lock:
+            cached = self._plan_cache.get(key)
+            if cached is not None:
+                self._plan_cache.move_to_end(key)
+        if cached is not None:
+            return self._record("cache", copy.deepcopy(cached), started)
+        if self.fast_path and is_single_hop(user_query):
+            return self._record("heuristic", single_hop_plan(user_query), started)
+        return None
+    
+    def _finish_llm_plan(self, parsed: Optional[QueryPlan], user_query: str, started: float) -> Dict[str, Any]:
         """
-        prompt = f"""
+        记录LLM规划；成功的规划写入缓存，修复重试后仍无法解析时使用单跳计划（不缓存，下次重新规划）
+        """
+        if parsed is None:
+            return self._record("fallback", single_hop_plan(user_query), started)
+        plan = parsed.model_dump()
+        logger.info(f"查询规划完成: {plan}")
+        if self.cache_size > 0:
+            with self._lock:
+                self._plan_cache[QueryEmbeddingCache.normalize(user_query)] = copy.deepcopy(plan)
+                while len(self._plan_cache) > self.cache_size:
+                    self._plan_cache.popitem(last=False)
+        return self._record("llm", plan, started)
+    
+    def _record(self, tier: str, plan: Dict[str, Any], started: float) -> Dict[str, Any]:
+        with self._lock:
+            self._tier_counts[tier] += 1
+            self._tier_seconds[tier] += time.perf_counter() - started
+        plan["planner_tier"] = tier
+        return plan
+    
+    def _plan_prompt(self, user_query: str) -> str:
+        return f"""
         请分析以下用户查询并制定检索计划：
         
         用户查询：{user_query}
@@ -78,42 +219,6 @@ class PlannerAgent:
         2. 识别所有关键实体和可能的中间实体
         3. 制定逐步的检索和推理策略
         """
-        
-        response = self.agent.run(prompt)
-        
-        try:
-            # 尝试从响应中提取JSON
-            content = response.content
-            if '```json' in content:
-                json_start = content.find('```json') + 7
-                json_end = content.find('```', json_start)
-                json_str = content[json_start:json_end].strip()
-            else:
-                # 寻找JSON对象
-                start = content.find('{')
-                end = content.rfind('}') + 1
-                json_str = content[start:end]
-            
-            plan = json.loads(json_str)
-            logger.info(f"查询规划完成: {plan}")
-            return plan
-            
-        except Exception as e:
-            logger.error(f"解析规划结果失败: {e}")
-            # 返回默认规划
-            return {
-                "query_type": "simple",
-                "key_entities": [user_query],
-                "reasoning_steps": [
-                    {
-                        "step": 1,
-                        "action": "search",
-                        "target": user_query,
-                        "purpose": "直接搜索相关信息"
-                    }
-                ],
-                "expected_hops": 1
-            }
 
 class RetrieverAgent:
     """
@@ -160,28 +265,38 @@ class RetrieverAgent:
         """
         all_documents = []
         
-        for step in plan.get('reasoning_steps', []):
-            if step['action'] == 'search':
-                search_target = step['target']
-                logger.info(f"执行检索步骤 {step['step']}: {search_target}")
-                
-                # 执行搜索
-                docs = self.vector_store.search_documents(search_target, similarity_threshold)
-                
-                # 为每个文档添加检索步骤信息
-                for doc in docs:
-                    doc_info = {
-                        'content': doc.page_content,
-                        'metadata': doc.metadata,
-                        'retrieval_step': step['step'],
-                        'search_target': search_target,
-                        'purpose': step['purpose']
-                    }
-                    all_documents.append(doc_info)
+        search_steps = [step for step in plan.get('reasoning_steps', []) if step['action'] == 'search']
+        for step in search_steps:
+            logger.info(f"执行检索步骤 {step['step']}: {step['target']}")
+        
+        # 所有检索步骤一次批量编码、一次矩阵检索
+        results = self.vector_store.search_many(
+            [step['target'] for step in search_steps],
+            threshold=similarity_threshold
+        )
+        
+        for step, docs in zip(search_steps, results):
+            # 为每个文档添加检索步骤信息
+            for doc in docs:
+                doc_info = {
+                    'chunk_id': VectorStoreService.chunk_id(doc),
+                    'content': doc.page_content,
+                    'metadata': doc.metadata,
+                    'retrieval_step': step['step'],
+                    'search_target': step['target'],
+                    'purpose': step['purpose']
+                }
+                all_documents.append(doc_info)
         
         logger.info(f"总共检索到 {len(all_documents)} 个文档片段")
         return all_documents
     
+    async def aretrieve_documents(self, plan: Dict[str, Any], similarity_threshold: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        retrieve_documents的异步版本：全部检索步骤仍合并为一次批量检索，在线程中执行，不阻塞事件循环
+        """
+        return await asyncio.to_thread(self.retrieve_documents, plan, similarity_threshold)
+    
     def expand_search(self, entities: List[str], similarity_threshold: float = 0.5) -> List[Dict[str, Any]]:
         """
         基于实体进行扩展搜索
@@ -195,12 +310,13 @@ class RetrieverAgent:
         """
         expanded_docs = []
         
-        for entity in entities:
-            logger.info(f"扩展搜索实体: {entity}")
-            docs = self.vector_store.search_documents(entity, similarity_threshold)
-            
+        logger.info(f"扩展搜索实体: {entities}")
+        results = self.vector_store.search_many(entities, threshold=similarity_threshold)
+        
+        for entity, docs in zip(entities, results):
             for doc in docs:
                 doc_info = {
+                    'chunk_id': VectorStoreService.chunk_id(doc),
                     'content': doc.page_content,
                     'metadata': doc.metadata,
                     'retrieval_step': 'expansion',
@@ -210,6 +326,12 @@ class RetrieverAgent:
                 expanded_docs.append(doc_info)
         
         return expanded_docs
+    
+    async def aexpand_search(self, entities: List[str], similarity_threshold: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        expand_search的异步版本
+        """
+        return await asyncio.to_thread(self.expand_search, entities, similarity_threshold)
 
 class AnalyzerAgent:
     """
@@ -259,28 +381,67 @@ class AnalyzerAgent:
             markdown=True
         )
     
-    def analyze_documents(self, documents: List[Dict[str, Any]], user_query: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_documents(self, documents: List[Dict[str, Any]], user_query: str, plan: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         分析检索到的文档并执行推理
         
         Args:
-            documents: 检索到的文档列表
+            documents: 检索到的文档列表（增量分析时只传本轮新增的文档）
             user_query: 用户查询
             plan: 查询规划
+            previous: 上一轮的分析结果，提供时以摘要形式放入提示词，模型在其基础上更新
             
         Returns:
             Dict: 分析结果
         """
-        # 构建文档上下文
+        prompt = self._analysis_prompt(documents, user_query, plan, previous)
+        try:
+            analysis = run_structured(lambda prompt: _stream(self.agent, prompt), prompt, Analysis)
+        except StructuredOutputError as e:
+            return self._fallback_analysis(e)
+        return self._finish_analysis(analysis)
+    
+    async def aanalyze_documents(self, documents: List[Dict[str, Any]], user_query: str, plan: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        analyze_documents的异步版本
+        """
+        prompt = self._analysis_prompt(documents, user_query, plan, previous)
+        try:
+            analysis = await arun_structured(lambda prompt: _astream(self.agent, prompt), prompt, Analysis)
+        except StructuredOutputError as e:
+            return self._fallback_analysis(e)
+        return self._finish_analysis(analysis)
+    
+    def _analysis_prompt(self, documents: List[Dict[str, Any]], user_query: str, plan: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> str:
+        # 构建文档上下文：多轮检索的重复/重叠片段只保留一次，按检索顺序放入token预算
         context_parts = []
-        for i, doc in enumerate(documents):
+        for i, (index, content) in enumerate(dedupe_indexed(doc['content'] for doc in documents)):
+            doc = documents[index]
             context_parts.append(f"""文档 {i+1} (检索步骤: {doc['retrieval_step']}, 目标: {doc['search_target']}):
-{doc['content']}
+{content}
 """)
         
-        context = "\n\n".join(context_parts)
+        context = "\n\n".join(ContextBuilder(ANALYZER_CONTEXT_MAX_TOKENS).select(context_parts))
+        
+        if previous:
+            return f"""
+        请在已有分析的基础上，结合本轮新检索到的文档继续推理，输出更新后的完整分析结果。
+        
+        用户问题：{user_query}
+        
+        已有分析（此前的文档不再重复提供）：
+        {self._summarize(previous)}
         
-        prompt = f"""
+        本轮新增文档：
+        {context}
+        
+        请特别注意：
+        1. 保留已有推理链中仍然成立的事实，补充新文档中的事实
+        2. 新信息与已有结论矛盾时，以文档为准修正结论
+        3. 只在新文档仍不足以回答时，在missing_info中列出尚缺的信息
+        """
+        
+        return f"""
         请分析以下检索到的文档，回答用户问题并执行多跳推理。
         
         用户问题：{user_query}
@@ -296,43 +457,48 @@ class AnalyzerAgent:
         3. 评估信息的完整性和可靠性
         4. 如果需要更多信息，请明确指出
         """
-        
-        response = self.agent.run(prompt)
-        
-        try:
-            # 尝试从响应中提取JSON
-            content = response.content
-            if '```json' in content:
-                json_start = content.find('```json') + 7
-                json_end = content.find('```', json_start)
-                json_str = content[json_start:json_end].strip()
-            else:
-                # 寻找JSON对象
-                start = content.find('{')
-                end = content.rfind('}') + 1
-                json_str = content[start:end]
-            
-            analysis = json.loads(json_str)
-            logger.info(f"文档分析完成: {analysis}")
-            return analysis
-            
-        except Exception as e:
-            logger.error(f"解析分析结果失败: {e}")
-            # 返回原始响应
-            return {
-                "reasoning_chain": [],
-                "conclusion": response.content,
-                "confidence": 0.5,
-                "missing_info": [],
-                "need_more_search": False
-            }
+    
+    @staticmethod
+    def _summarize(analysis: Dict[str, Any]) -> str:
+        """
+        上一轮分析状态的紧凑摘要：推理链事实、结论、置信度与缺失信息
+        """
+        facts = [
+            f"- {step.get('fact', '')}（来源: {step.get('source', '未知')}）"
+            for step in analysis.get('reasoning_chain', []) if isinstance(step, dict)
+        ]
+        return "\n".join([
+            "推理链：",
+            *(facts or ["- 无"]),
+            f"结论：{analysis.get('conclusion', '')}",
+            f"置信度：{analysis.get('confidence', 0)}",
+            f"缺失信息：{'、'.join(map(str, analysis.get('missing_info', []))) or '无'}"
+        ])
+    
+    def _finish_analysis(self, analysis: Analysis) -> Dict[str, Any]:
+        result = analysis.model_dump()
+        logger.info(f"文档分析完成: {result}")
+        return result
+    
+    def _fallback_analysis(self, error: StructuredOutputError) -> Dict[str, Any]:
+        logger.error(f"解析分析结果失败: {error}")
+        # 修复重试后仍无法解析：返回原始响应
+        return {
+            "reasoning_chain": [],
+            "conclusion": error.content,
+            "confidence": 0.5,
+            "missing_info": [],
+            "need_more_search": False
+        }
 
 class MultiAgentRAGSystem:
     """
     多Agent协作RAG系统主类
     """
     
-    def __init__(self, vector_store: VectorStoreService):
+    def __init__(self, vector_store: Optional[VectorStoreService] = None):
+        # 未指定时创建新服务实例，其嵌入模型与索引均来自进程级共享注册表
+        vector_store = vector_store or VectorStoreService()
         self.planner = PlannerAgent()
         self.retriever = RetrieverAgent(vector_store)
         self.analyzer = AnalyzerAgent()
@@ -352,54 +518,149 @@ class MultiAgentRAGSystem:
         """
         logger.info(f"开始处理查询: {user_query}")
         
+        # 相同或语义相近的问题在索引未变化时直接返回缓存结果
+        scope = self._cache_scope(similarity_threshold, max_iterations)
+        query_vector = self.vector_store.embed_query(user_query) if answer_cache.enabled else None
+        cached = self._cached_result(scope, user_query, query_vector)
+        if cached:
+            print(f"⚡ 命中答案缓存（相似问题: {cached['cache_hit']['matched_query']}）")
+            return cached
+        
         # 第一步：规划
         print("🤔 Planner Agent 正在分析查询...")
         plan = self.planner.plan_query(user_query)
         print(f"📋 查询规划完成: {plan['query_type']} 类型，预期 {plan['expected_hops']} 跳推理")
         
+        # 第二、三步：迭代检索与分析，由共享的迭代过程决定下一步调用
+        steps = self._iterate(user_query, plan, max_iterations, print)
+        response = None
+        try:
+            while True:
+                kind, payload = steps.send(response)
+                if kind == "retrieve":
+                    response = self.retriever.retrieve_documents(plan, similarity_threshold)
+                elif kind == "expand":
+                    response = self.retriever.expand_search(payload, similarity_threshold)
+                else:
+                    response = self.analyzer.analyze_documents(payload[0], user_query, plan, payload[1])
+        except StopIteration as stop:
+            result = stop.value
+        
+        logger.info(f"查询处理完成，共 {result['iterations']} 轮迭代")
+        answer_cache.put(scope, user_query, query_vector, result)
+        return result
+    
+    async def aprocess_query(self, user_query: str, similarity_threshold: float = 0.5, max_iterations: int = 3) -> Dict[str, Any]:
+        """
+        process_query的异步版本：LLM调用使用异步客户端，检索在线程中执行，
+        同一事件循环上可以同时处理多个查询
+        
+        Args:
+            user_query: 用户查询
+            similarity_threshold: 相似度阈值
+            max_iterations: 最大迭代次数
+            
+        Returns:
+            Dict: 处理结果（与process_query相同）
+        """
+        logger.info(f"开始处理查询: {user_query}")
+        
+        scope = self._cache_scope(similarity_threshold, max_iterations)
+        query_vector = await asyncio.to_thread(self.vector_store.embed_query, user_query) if answer_cache.enabled else None
+        cached = self._cached_result(scope, user_query, query_vector)
+        if cached:
+            return cached
+        
+        # 第一步：规划
+        plan = await self.planner.aplan_query(user_query)
+        logger.info(f"查询规划完成: {plan.get('query_type')} 类型，预期 {plan.get('expected_hops')} 跳推理")
+        
+        # 第二、三步：与process_query共用迭代过程，并发处理时进度写入日志而不是打印
+        steps = self._iterate(user_query, plan, max_iterations, lambda message: logger.info(f"{user_query}: {message.strip()}"))
+        response = None
+        try:
+            while True:
+                kind, payload = steps.send(response)
+                if kind == "retrieve":
+                    response = await self.retriever.aretrieve_documents(plan, similarity_threshold)
+                elif kind == "expand":
+                    response = await self.retriever.aexpand_search(payload, similarity_threshold)
+                else:
+                    response = await self.analyzer.aanalyze_documents(payload[0], user_query, plan, payload[1])
+        except StopIteration as stop:
+            result = stop.value
+        
+        logger.info(f"查询处理完成，共 {result['iterations']} 轮迭代")
+        answer_cache.put(scope, user_query, query_vector, result)
+        return result
+    
+    def _iterate(self, user_query: str, plan: Dict[str, Any], max_iterations: int, report: Callable[[str], Any]) -> Generator[Tuple[str, Any], Any, Dict[str, Any]]:
+        """
+        迭代检索与分析（同步与异步版本共用）：只决定下一步做什么，检索与LLM调用由调用方执行后把结果send回来
+        
+        Args:
+            user_query: 用户查询
+            plan: 查询规划
+            max_iterations: 最大迭代次数
+            report: 输出进度信息的函数
+            
+        Yields:
+            ("retrieve", None) 按规划检索；("expand", 检索目标列表) 补充检索；("analyze", (新增文档, 上一轮分析)) 分析
+            
+        Returns:
+            Dict: 处理结果
+        """
         iteration = 0
         all_documents = []
+        seen_chunks = set()
+        searched = self._plan_targets(plan)
         final_analysis = None
         
         while iteration < max_iterations:
             iteration += 1
-            print(f"\n🔍 第 {iteration} 轮检索和分析...")
+            report(f"\n🔍 第 {iteration} 轮检索和分析...")
             
             # 第二步：检索
-            print("📚 Retriever Agent 正在检索文档...")
+            report("📚 Retriever Agent 正在检索文档...")
             if iteration == 1:
                 # 首次检索：按照规划执行
-                documents = self.retriever.retrieve_documents(plan, similarity_threshold)
+                documents = yield "retrieve", None
             else:
-                # 后续检索：基于缺失信息扩展搜索
-                if final_analysis and final_analysis.get('missing_info'):
-                    documents = self.retriever.expand_search(final_analysis['missing_info'], similarity_threshold)
-                else:
+                # 后续检索：只搜索尚未搜索过的缺失信息
+                targets = self._pending_targets(final_analysis, searched)
+                if not targets:
+                    report("✅ 没有新的缺失信息需要检索")
                     break
+                documents = yield "expand", targets
             
-            if not documents:
-                print("❌ 未检索到相关文档")
+            # 只保留此前未分析过的文档块
+            new_documents = self._new_evidence(documents, seen_chunks)
+            if not new_documents:
+                report("❌ 未检索到新的相关文档")
                 break
                 
-            all_documents.extend(documents)
-            print(f"✅ 检索到 {len(documents)} 个文档片段")
+            all_documents.extend(new_documents)
+            report(f"✅ 检索到 {len(documents)} 个文档片段，其中新增 {len(new_documents)} 个")
             
-            # 第三步：分析
-            print("🧠 Analyzer Agent 正在分析文档...")
-            analysis = self.analyzer.analyze_documents(all_documents, user_query, plan)
+            # 第三步：分析（只发送新增文档与上一轮分析摘要）
+            report("🧠 Analyzer Agent 正在分析文档...")
+            analysis = yield "analyze", (new_documents, final_analysis)
+            converged = self._converged(final_analysis, analysis)
             final_analysis = analysis
             
-            print(f"📊 分析完成，置信度: {analysis.get('confidence', 0)}")
+            report(f"📊 分析完成，置信度: {analysis.get('confidence', 0)}")
             
             # 判断是否需要继续搜索
-            if not analysis.get('need_more_search', False) or analysis.get('confidence', 0) > 0.8:
-                print("✅ 分析完成，信息充分")
+            if not analysis.get('need_more_search', False) or self._confidence(analysis) > 0.8:
+                report("✅ 分析完成，信息充分")
+                break
+            if converged:
+                report("✅ 新证据未能提升置信度，停止迭代")
                 break
             
-            print("🔄 需要更多信息，准备下一轮检索...")
+            report("🔄 需要更多信息，准备下一轮检索...")
         
-        # 构建最终结果
-        result = {
+        return {
             'user_query': user_query,
             'plan': plan,
             'total_documents': len(all_documents),
@@ -407,6 +668,110 @@ class MultiAgentRAGSystem:
             'analysis': final_analysis,
             'documents': all_documents
         }
+    
+    @staticmethod
+    def _plan_targets(plan: Dict[str, Any]) -> set:
+        """
+        首轮按规划检索的目标（归一化），后续轮次不再重复搜索
+        """
+        return {
+            QueryEmbeddingCache.normalize(str(step.get('target', '')))
+            for step in plan.get('reasoning_steps', []) if step.get('action') == 'search'
+        }
+    
+    @staticmethod
+    def _pending_targets(analysis: Optional[Dict[str, Any]], searched: set) -> List[str]:
+        """
+        上一轮分析中尚未搜索过的缺失信息，并登记为已搜索
+        """
+        targets = []
+        for item in (analysis or {}).get('missing_info') or []:
+            key = QueryEmbeddingCache.normalize(str(item))
+            if key and key not in searched:
+                searched.add(key)
+                targets.append(str(item))
+        return targets
+    
+    @staticmethod
+    def _new_evidence(documents: List[Dict[str, Any]], seen_chunks: set) -> List[Dict[str, Any]]:
+        """
+        按文档块id去重：本轮重复命中或此前已分析过的文档块被丢弃
+        """
+        new_documents = []
+        for doc in documents:
+            chunk_id = doc.get('chunk_id') or doc['content']
+            if chunk_id not in seen_chunks:
+                seen_chunks.add(chunk_id)
+                new_documents.append(doc)
+        return new_documents
+    
+    @staticmethod
+    def _confidence(analysis: Optional[Dict[str, Any]]) -> float:
+        try:
+            return float((analysis or {}).get('confidence', 0))
+        except (TypeError, ValueError):
+            return 0.0
+    
+    def _converged(self, previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> bool:
+        """
+        新一轮证据使置信度提升不足ANALYSIS_CONVERGENCE_DELTA时视为收敛
+        """
+        if previous is None:
+            return False
+        return self._confidence(current) - self._confidence(previous) < ANALYSIS_CONVERGENCE_DELTA
+    
+    def _cache_scope(self, similarity_threshold: float, max_iterations: int):
+        """
+        答案缓存的作用域：处理开始前取索引版本号，处理期间索引发生变化时结果写入旧版本，不会被命中
+        """
+        return (
+            str(self.vector_store.index_dir.resolve()),
+            self.vector_store.embedding_model_name,
+            self.vector_store.index_version,
+            similarity_threshold,
+            max_iterations
+        )
+    
+    def _cached_result(self, scope, user_query: str, query_vector: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+        """
+        查找答案缓存
+        
+        Returns:
+            Dict: 缓存的处理结果（user_query替换为本次查询，cache_hit记录命中的原查询与相似度），未命中时返回None
+        """
+        if query_vector is None:
+            return None
+        hit = answer_cache.get(scope, user_query, query_vector)
+        if hit is None:
+            return None
+        result, matched_query, similarity = hit
+        logger.info(f"答案缓存命中: {user_query} -> {matched_query} (相似度 {similarity:.3f})")
+        return {
+            **result,
+            'user_query': user_query,
+            'cache_hit': {'matched_query': matched_query, 'similarity': similarity}
+        }
+    
+    async def aprocess_queries(self, user_queries: List[str], similarity_threshold: float = 0.5, max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        在同一事件循环上并发处理多个查询
+        
+        Args:
+            user_queries: 查询列表
+            similarity_threshold: 相似度阈值
+            max_concurrency: 同时处理的最大查询数
+            
+        Returns:
+            List: 与user_queries一一对应的结果，失败的查询结果中包含error字段
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run_one(user_query: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self.aprocess_query(user_query, similarity_threshold)
+                except Exception as e:
+                    logger.error(f"查询处理失败: {user_query} - {e}")
+                    return {'user_query': user_query, 'error': str(e)}
         
-        logger.info(f"查询处理完成，共 {iteration} 轮迭代")
-        return result
\ No newline at end of file
+        return await asyncio.gather(*(run_one(user_query) for user_query in user_queries))
\ No newline at end of file
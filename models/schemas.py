@@ -0,0 +1,82 @@
+"""
+多Agent系统的结构化输出模型
+规划Agent与分析Agent的输出格式在此声明，模型输出按这些模型校验；
+字段缺失时取默认值，多余字段忽略，常见的类型偏差（如置信度写成字符串）在校验时修正
+"""
+from typing import List, Literal
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+class ReasoningStep(BaseModel):
+    """
+    检索计划中的一步
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    step: int = 1
+    action: str = "search"
+    target: str
+    purpose: str = ""
+
+
+class QueryPlan(BaseModel):
+    """
+    规划Agent的输出：查询类型、关键实体与检索步骤
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    query_type: Literal["simple", "multi_hop"] = "simple"
+    key_entities: List[str] = Field(default_factory=list)
+    reasoning_steps: List[ReasoningStep] = Field(min_length=1)
+    expected_hops: int = 1
+
+    @field_validator("query_type", mode="before")
+    @classmethod
+    def _normalize_query_type(cls, value):
+        # 模型常输出 "multi-hop" / "Multi_Hop" 等写法
+        text = str(value or "simple").strip().lower().replace("-", "_").replace(" ", "_")
+        return "multi_hop" if "multi" in text else "simple"
+
+
+class ReasoningFact(BaseModel):
+    """
+    推理链中的一条事实
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    step: int = 1
+    fact: str
+    source: str = ""
+
+
+class Analysis(BaseModel):
+    """
+    分析Agent的输出：推理链、结论、置信度与缺失信息
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    reasoning_chain: List[ReasoningFact] = Field(default_factory=list)
+    conclusion: str
+    confidence: float = 0.5
+    missing_info: List[str] = Field(default_factory=list)
+    need_more_search: bool = False
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _normalize_confidence(cls, value):
+        # 兼容 "0.8"、"80%"、85 等写法，结果限制在[0, 1]
+        if isinstance(value, str):
+            text = value.strip()
+            value = float(text.rstrip("%")) / 100 if text.endswith("%") else float(text)
+        value = float(value)
+        if value > 1:
+            value /= 100
+        return min(max(value, 0.0), 1.0)
+
+    @field_validator("missing_info", mode="before")
+    @classmethod
+    def _normalize_missing_info(cls, value):
+        if value is None:
+            return []
+        return [value] if isinstance(value, str) else [str(item) for item in value if item]
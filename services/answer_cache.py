@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+语义答案缓存
+按查询向量缓存多Agent系统的完整处理结果：相同或语义相近（余弦相似度不低于阈值）的查询直接返回缓存结果；
+向量相近不代表问的是同一个实体（"张三参与了哪个项目"与"赵六参与了哪个项目"），语义命中还须通过词项重合度检查。
+缓存按作用域（索引目录、嵌入模型、索引版本、检索参数）隔离，索引内容变化后版本号递增，旧结果不再命中；
+条目超过TTL后失效，超出容量时淘汰最久未使用的条目
+"""
+import copy
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_MIN_OVERLAP
+from services.embedding_cache import QueryEmbeddingCache
+from services.sparse_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    线程安全的语义答案缓存
+    """
+    # 1. 初始化缓存
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+        min_overlap: float = ANSWER_CACHE_MIN_OVERLAP
+    ):
+        """
+        max_entries - 最大缓存条目数，0表示禁用缓存
+        ttl - 条目有效期（秒），0表示不过期
+        similarity - 命中所需的最低余弦相似度，不低于1表示只命中归一化文本完全相同的查询
+        min_overlap - 语义命中所需的最低词项重合度（两个查询词项集合的Jaccard系数）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.min_overlap = min_overlap
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # 条目id -> (作用域, 归一化查询文本, 原查询, 单位向量, 写入时间, 结果)，按最近使用排序
+        self._entries: "OrderedDict[int, Tuple[Hashable, str, str, np.ndarray, float, Dict[str, Any]]]" = OrderedDict()
+        # 作用域 -> 条目id列表，查找时只与同一作用域的向量比较
+        self._scopes: Dict[Hashable, List[int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    # 2. 查找缓存结果
+    def get(self, scope: Hashable, query: str, vector: List[float]) -> Optional[Tuple[Dict[str, Any], str, float]]:
+        """
+        scope - 作用域（索引版本等，不同作用域之间互不命中）
+        query - 查询文本
+        vector - 查询向量
+
+        @return (缓存结果的副本, 命中的原查询, 相似度)，未命中时返回None
+        """
+        if not self.enabled:
+            return None
+        text = QueryEmbeddingCache.normalize(query)
+        unit = self._unit(vector)
+        tokens = set(tokenize(text))
+        with self._lock:
+            self._expire(scope)
+            ids = self._scopes.get(scope, [])
+            best_id, best_score = None, min(self.similarity, 1.0)
+            for entry_id in ids:
+                _, entry_text, _, entry_vector, _, _ = self._entries[entry_id]
+                if entry_text == text:
+                    best_id, best_score = entry_id, 1.0
+                    break
+                if self.similarity >= 1:
+                    continue
+                score = float(np.dot(entry_vector, unit))
+                if score >= best_score and self._overlap(tokens, set(tokenize(entry_text))) >= self.min_overlap:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            _, _, entry_query, _, _, result = self._entries[best_id]
+        # 返回副本：调用方修改结果不影响缓存
+        return copy.deepcopy(result), entry_query, best_score
+
+    # 3. 写入缓存结果
+    def put(self, scope: Hashable, query: str, vector: List[float], result: Dict[str, Any]):
+        """
+        scope - 作用域
+        query - 查询文本
+        vector - 查询向量
+        result - 处理结果
+        """
+        if not self.enabled:
+            return
+        # 保存副本：调用方之后修改结果不影响缓存
+        result = copy.deepcopy(result)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, QueryEmbeddingCache.normalize(query), query, self._unit(vector), time.monotonic(), result)
+            self._scopes.setdefault(scope, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    # 4. 缓存统计
+    def stats(self) -> Dict[str, float]:
+        """
+        @return 命中数、未命中数、命中率、当前条目数和容量
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+    # 5. 清空缓存
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    # 6. 清除过期条目；作用域已失效（索引版本变化）的条目由LRU自然淘汰
+    def _expire(self, scope: Hashable):
+        if not self.ttl:
+            return
+        deadline = time.monotonic() - self.ttl
+        for entry_id in [i for i in self._scopes.get(scope, []) if self._entries[i][4] < deadline]:
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        scope = self._entries.pop(entry_id)[0]
+        ids = self._scopes[scope]
+        ids.remove(entry_id)
+        if not ids:
+            del self._scopes[scope]
+
+    @staticmethod
+    def _overlap(tokens: set, other: set) -> float:
+        # 词项集合的Jaccard系数；实体名不同（中文按二元组切分）时重合度明显下降
+        if not tokens and not other:
+            return 1.0
+        return len(tokens & other) / len(tokens | other)
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
+
+
+# 进程内共享的语义答案缓存
+answer_cache = SemanticAnswerCache()
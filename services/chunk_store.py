@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+基于SQLite的文档块存储
+替代 index.pkl：按id随机读取、追加写入无需重写整个文件，检索后只取回top-k文档块的正文；
+同一库中维护BM25倒排索引与内容寻址清单，与文档块在同一事务中写入
+"""
+import json
+import sqlite3
+import threading
+import logging
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+from services.sparse_index import SparseIndex
+
+logger = logging.getLogger(__name__)
+
+CHUNK_STORE_FILE = "chunks.sqlite3"
+
+# 单条SQL中IN子句的最大参数个数（低于SQLite默认上限）
+MAX_SQL_VARIABLES = 500
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    文档块存储，实现LangChain FAISS所需的docstore接口（search / add / delete）；
+    FAISS按isinstance(docstore, AddableMixin)判断能否追加文档块
+    写操作在同一事务中累积，由commit统一提交
+    """
+    # 1. 打开（或创建）存储
+    def __init__(self, path: Union[str, Path]):
+        """
+        path - SQLite数据库文件路径
+        """
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, id TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS positions_id ON positions (id)")
+        self.positions = PositionMap(self)
+        self.manifest = ChunkManifest(self)
+        self.sparse = SparseIndex(self)
+        self._conn.commit()
+
+    # 2. 按id读取单个文档块（与InMemoryDocstore.search语义一致）
+    def search(self, search: str) -> Union[str, Document]:
+        """
+        search - docstore id
+
+        @return Document，不存在时返回提示字符串
+        """
+        docs = self.get_many([search])
+        return docs.get(search, f"ID {search} not found.")
+
+    # 3. 按id批量读取文档块
+    def get_many(self, ids: List[str]) -> Dict[str, Document]:
+        """
+        ids - docstore id列表
+
+        @return id -> Document
+        """
+        ids = list(ids)
+        rows = []
+        with self._lock:
+            for start in range(0, len(ids), MAX_SQL_VARIABLES):
+                batch = ids[start:start + MAX_SQL_VARIABLES]
+                rows += self._conn.execute(
+                    f"SELECT id, content, metadata FROM chunks WHERE id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+        return {
+            row_id: Document(page_content=content, metadata=json.loads(metadata))
+            for row_id, content, metadata in rows
+        }
+
+    # 4. 追加文档块
+    def add(self, texts: Dict[str, Document]):
+        """
+        texts - id -> Document
+        """
+        with self._lock:
+            existing = self.get_many(list(texts.keys()))
+            if existing:
+                raise ValueError(f"Tried to add ids that already exist: {set(existing)}")
+            self._conn.executemany(
+                "INSERT INTO chunks (id, content, metadata) VALUES (?, ?, ?)",
+                [
+                    (doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str))
+                    for doc_id, doc in texts.items()
+                ]
+            )
+            self.sparse.add({doc_id: doc.page_content for doc_id, doc in texts.items()})
+
+    # 5. 删除文档块
+    def delete(self, ids: List[str]):
+        """
+        ids - 待删除的docstore id
+        """
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids])
+            self.manifest.delete_ids(ids)
+            self.sparse.delete(ids)
+
+    # 6. 遍历全部文档块（用于迁移与清单重建）
+    def iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, content, metadata FROM chunks").fetchall()
+        for row_id, content, metadata in rows:
+            yield row_id, Document(page_content=content, metadata=json.loads(metadata))
+
+    # 7. 清空全部数据（在事务中，提交后生效）
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM positions")
+            self.manifest.reset()
+            self.sparse.reset()
+            self.positions.invalidate()
+
+    # 8. 提交累积的写操作
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    # 9. 丢弃未提交的写操作
+    def rollback(self):
+        with self._lock:
+            self._conn.rollback()
+            self.positions.invalidate()
+            self.sparse.invalidate()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def execute(self, sql: str, parameters: Iterable = ()):
+        with self._lock:
+            return self._conn.execute(sql, tuple(parameters)).fetchall()
+
+    def executemany(self, sql: str, rows: Iterable[Tuple]):
+        with self._lock:
+            self._conn.executemany(sql, rows)
+
+
+class PositionMap(MutableMapping):
+    """
+    FAISS向量位置 -> docstore id 的映射，存储在同一SQLite库的positions表中
+    """
+    def __init__(self, store: ChunkStore):
+        self._store = store
+        self._length = None
+
+    def invalidate(self):
+        self._length = None
+
+    def __getitem__(self, position: int) -> str:
+        rows = self._store.execute("SELECT id FROM positions WHERE position = ?", (int(position),))
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def __setitem__(self, position: int, doc_id: str):
+        self.update({position: doc_id})
+
+    def __delitem__(self, position: int):
+        self._store.execute("DELETE FROM positions WHERE position = ?", (int(position),))
+        self.invalidate()
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self._store.execute("SELECT position FROM positions ORDER BY position")])
+
+    def __len__(self) -> int:
+        if self._length is None:
+            self._length = self._store.execute("SELECT COUNT(*) FROM positions")[0][0]
+        return self._length
+
+    def items(self):
+        return self._store.execute("SELECT position, id FROM positions ORDER BY position")
+
+    def values(self):
+        return [doc_id for _, doc_id in self.items()]
+
+    # 批量查询位置对应的id（检索后一次取回top-k）
+    def lookup(self, positions: Iterable[int]) -> Dict[int, str]:
+        positions = [int(position) for position in positions]
+        result = {}
+        for start in range(0, len(positions), MAX_SQL_VARIABLES):
+            batch = positions[start:start + MAX_SQL_VARIABLES]
+            result.update(self._store.execute(
+                f"SELECT position, id FROM positions WHERE position IN ({','.join('?' * len(batch))})",
+                batch
+            ))
+        return result
+
+    # 按docstore id批量反查位置（按标签删除向量时使用）
+    def positions_of(self, ids: Iterable[str]) -> Dict[str, int]:
+        ids = list(ids)
+        result = {}
+        for start in range(0, len(ids), MAX_SQL_VARIABLES):
+            batch = ids[start:start + MAX_SQL_VARIABLES]
+            result.update(
+                (doc_id, position) for position, doc_id in self._store.execute(
+                    f"SELECT position, id FROM positions WHERE id IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+            )
+        return result
+
+    # 下一个可用的位置（带标签索引追加向量时使用，删除后标签不连续，不能按长度分配）
+    def next_position(self) -> int:
+        return self._store.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM positions")[0][0]
+
+    # 批量删除位置
+    def remove(self, positions: Iterable[int]):
+        self._store.executemany("DELETE FROM positions WHERE position = ?", [(int(position),) for position in positions])
+        self.invalidate()
+
+    # 批量写入（FAISS追加向量时调用），只插入新增位置
+    def update(self, mapping: Mapping[int, str] = (), **kwargs):
+        rows = [(int(position), doc_id) for position, doc_id in dict(mapping).items()]
+        self._store.executemany("INSERT OR REPLACE INTO positions (position, id) VALUES (?, ?)", rows)
+        self.invalidate()
+
+    # 整体替换（删除向量导致位置重排后调用）
+    def replace_all(self, mapping: Mapping[int, str]):
+        self._store.execute("DELETE FROM positions")
+        self.update(mapping)
+
+
+class ChunkManifest:
+    """
+    内容寻址清单：文档块内容哈希 -> docstore id 与来源，存储在同一SQLite库的manifest表中；
+    按需查询，启动时不整体载入内存，写入随文档块在同一事务中提交
+    """
+    def __init__(self, store: ChunkStore):
+        self._store = store
+        store.execute("CREATE TABLE IF NOT EXISTS manifest (hash TEXT PRIMARY KEY, id TEXT NOT NULL, source TEXT)")
+        store.execute("CREATE INDEX IF NOT EXISTS manifest_source ON manifest (source)")
+        store.execute("CREATE INDEX IF NOT EXISTS manifest_id ON manifest (id)")
+
+    # 1. 批量查询已索引的内容哈希
+    def lookup(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """
+        hashes - 内容哈希
+
+        @return 已索引的内容哈希 -> docstore id（未索引的哈希不在结果中）
+        """
+        hashes = list(dict.fromkeys(hashes))
+        result = {}
+        for start in range(0, len(hashes), MAX_SQL_VARIABLES):
+            batch = hashes[start:start + MAX_SQL_VARIABLES]
+            result.update(self._store.execute(
+                f"SELECT hash, id FROM manifest WHERE hash IN ({','.join('?' * len(batch))})",
+                batch
+            ))
+        return result
+
+    # 2. 某来源的全部内容哈希
+    def source_hashes(self, source: str) -> List[str]:
+        return [row[0] for row in self._store.execute("SELECT hash FROM manifest WHERE source = ?", (source,))]
+
+    # 3. 登记文档块
+    def record(self, rows: Iterable[Tuple[str, str, Optional[str]]]):
+        """
+        rows - (内容哈希, docstore id, 来源)
+        """
+        self._store.executemany("INSERT OR REPLACE INTO manifest (hash, id, source) VALUES (?, ?, ?)", rows)
+
+    # 4. 按docstore id删除（随文档块一起删除）
+    def delete_ids(self, ids: Iterable[str]):
+        self._store.executemany("DELETE FROM manifest WHERE id = ?", [(doc_id,) for doc_id in ids])
+
+    def reset(self):
+        self._store.execute("DELETE FROM manifest")
+
+    def __len__(self) -> int:
+        return self._store.execute("SELECT COUNT(*) FROM manifest")[0][0]
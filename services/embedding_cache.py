@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+查询向量缓存
+按 (嵌入模型, 嵌入函数类型, 归一化查询文本) 缓存查询向量，LRU淘汰，可选持久化到本地文件；
+embed_query与embed_documents的编码参数可能不同（如查询指令前缀），两者的结果分开缓存
+"""
+import os
+import re
+import json
+import base64
+import atexit
+import threading
+import logging
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.settings import (
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_PATH,
+    QUERY_EMBEDDING_CACHE_SAVE_EVERY
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """
+    线程安全的查询向量LRU缓存
+    """
+    # 1. 初始化缓存
+    def __init__(self, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE, persist_path: Optional[str] = QUERY_EMBEDDING_CACHE_PATH, save_every: int = QUERY_EMBEDDING_CACHE_SAVE_EVERY):
+        """
+        max_entries - 最大缓存条目数，超出后淘汰最久未使用的条目
+        persist_path - 持久化文件路径，为空时仅缓存在内存中
+        save_every - 每新增多少条目写一次磁盘，0表示仅在进程退出时写入
+        """
+        self.max_entries = max_entries
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], List[float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        # 串行化磁盘写入，保证较新的快照不会被较旧的快照覆盖；写文件期间不占用self._lock
+        self._save_lock = threading.Lock()
+        self._dirty = 0
+        self._loaded = False
+
+    # 2. 归一化查询文本（全半角统一、去除首尾及重复空白、小写）
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        text - 原始查询文本
+
+        @return 归一化后的文本
+        """
+        text = unicodedata.normalize("NFKC", text)
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    # 3. 读取缓存
+    def get(self, model_name: str, text: str, kind: str = "query") -> Optional[List[float]]:
+        """
+        model_name - 嵌入模型名称
+        text - 查询文本
+        kind - 嵌入函数类型："query"（embed_query）或 "documents"（embed_documents）
+
+        @return 缓存的查询向量，未命中时返回None
+        """
+        key = (model_name, kind, self.normalize(text))
+        with self._lock:
+            self._ensure_loaded()
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    # 4. 写入缓存
+    def put(self, model_name: str, text: str, vector: List[float], kind: str = "query"):
+        """
+        model_name - 嵌入模型名称
+        text - 查询文本
+        vector - 查询向量
+        kind - 嵌入函数类型
+        """
+        key = (model_name, kind, self.normalize(text))
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[key] = list(vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty += 1
+            should_save = bool(self.save_every and self._dirty >= self.save_every)
+        # 在锁外写盘，写文件期间其他线程的读写不受阻塞
+        if should_save:
+            self.save()
+
+    # 5. 读取缓存，未命中时调用嵌入函数计算并写入
+    def get_or_compute(self, model_name: str, text: str, embed_fn: Callable[[str], List[float]], kind: str = "query") -> List[float]:
+        """
+        model_name - 嵌入模型名称
+        text - 查询文本
+        embed_fn - 单条文本的嵌入函数
+        kind - embed_fn的类型
+
+        @return 查询向量
+        """
+        vector = self.get(model_name, text, kind)
+        if vector is None:
+            vector = embed_fn(text)
+            self.put(model_name, text, vector, kind)
+        return vector
+
+    # 6. 批量读取缓存，未命中的文本去重后一次性批量计算
+    def get_many_or_compute(self, model_name: str, texts: List[str], embed_many_fn: Callable[[List[str]], List[List[float]]], kind: str = "documents") -> List[List[float]]:
+        """
+        model_name - 嵌入模型名称
+        texts - 查询文本列表
+        embed_many_fn - 批量嵌入函数（一次前向计算多条文本）
+        kind - embed_many_fn的类型
+
+        @return 与texts一一对应的查询向量列表
+        """
+        vectors: List[Optional[List[float]]] = [self.get(model_name, text, kind) for text in texts]
+        missing: Dict[str, List[int]] = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                missing.setdefault(self.normalize(text), []).append(i)
+
+        if missing:
+            first_texts = [texts[positions[0]] for positions in missing.values()]
+            for text, positions, vector in zip(first_texts, missing.values(), embed_many_fn(first_texts)):
+                self.put(model_name, text, vector, kind)
+                for i in positions:
+                    vectors[i] = vector
+        return vectors
+
+    # 7. 缓存统计
+    def stats(self) -> Dict[str, float]:
+        """
+        @return 命中数、未命中数、命中率、当前条目数和容量
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+    # 8. 清空缓存（不删除持久化文件）
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self._dirty = 0
+
+    # 9. 将有新增条目的缓存写入磁盘（向量以float32紧凑编码）
+    def save(self):
+        """
+        持锁时只复制条目引用（向量列表写入后不再修改），编码与写文件在锁外进行，
+        先写临时文件再原子替换，写入中途失败不会损坏已有的缓存文件
+        """
+        if not self.persist_path or not self._dirty:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = list(self._entries.items())
+                self._dirty = 0
+            try:
+                entries = [
+                    [model_name, kind, text, base64.b64encode(array('f', vector).tobytes()).decode('ascii')]
+                    for (model_name, kind, text), vector in snapshot
+                ]
+                self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.persist_path.with_suffix(self.persist_path.suffix + ".tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"entries": entries}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.persist_path)
+            except Exception as e:
+                logger.warning(f"保存查询向量缓存失败: {str(e)}")
+
+    # 10. 首次使用时从磁盘加载缓存
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.persist_path or not self.persist_path.exists():
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for entry in data.get("entries", [])[-self.max_entries:]:
+                # 旧格式条目不含嵌入函数类型，无法确定来源，丢弃
+                if len(entry) != 4:
+                    continue
+                model_name, kind, text, encoded = entry
+                vector = array('f')
+                vector.frombytes(base64.b64decode(encoded))
+                self._entries[(model_name, kind, text)] = vector.tolist()
+            logger.info(f"已加载 {len(self._entries)} 条查询向量缓存")
+        except Exception as e:
+            logger.warning(f"加载查询向量缓存失败: {str(e)}")
+
+
+# 进程内共享的查询向量缓存，退出时落盘
+query_embedding_cache = QueryEmbeddingCache()
+atexit.register(query_embedding_cache.save)
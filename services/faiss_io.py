@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+FAISS索引文件读写
+index.faiss 可以内存映射方式加载（多个工作进程共享同一份页缓存；IVF倒排表与新版faiss下的Flat编码可映射，HNSW图结构仍需读入内存），
+文档块正文与位置映射存放在SQLite文档块存储中，按需读取、追加写入；
+index.faiss 写入时先写临时文件再原子替换
+"""
+import os
+import pickle
+import logging
+from pathlib import Path
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from services.chunk_store import ChunkStore, CHUNK_STORE_FILE
+from services.index_factory import apply_search_params
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# IO_FLAG_MMAP只映射IVF的倒排表，Flat与HNSW的向量仍会完整读入内存；
+# 支持IO_FLAG_MMAP_IFC的faiss版本同时映射Flat编码（HNSW的图结构仍需读入内存）
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+# 1. 创建空的向量存储（覆盖目录中已有的文档块存储，提交后生效）
+def new_vector_store(index_dir: Path, embeddings: Embeddings, dim: int) -> FAISS:
+    """
+    index_dir - 索引目录
+    embeddings - 嵌入模型
+    dim - 向量维度
+
+    @return 空的FAISS向量存储
+    """
+    store = ChunkStore(index_dir / CHUNK_STORE_FILE)
+    store.reset()
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=faiss.IndexFlatL2(dim),
+        docstore=store,
+        index_to_docstore_id=store.positions
+    )
+    vector_store.mmap_loaded = False
+    return vector_store
+
+
+# 2. 加载向量存储：索引可选只读内存映射，文档块按需从SQLite读取
+def load(index_dir: Path, embeddings: Embeddings, mmap: bool = True) -> FAISS:
+    """
+    index_dir - 索引目录
+    embeddings - 嵌入模型
+    mmap - 是否以只读内存映射方式打开index.faiss
+
+    @return FAISS向量存储（内存映射时索引只读，写入前需调用ensure_writable）
+    """
+    index = faiss.read_index(str(index_dir / INDEX_FILE), MMAP_FLAGS if mmap else 0)
+
+    if not (index_dir / CHUNK_STORE_FILE).exists() and (index_dir / LEGACY_DOCSTORE_FILE).exists():
+        _migrate_legacy_docstore(index_dir)
+
+    store = ChunkStore(index_dir / CHUNK_STORE_FILE)
+    # 建立BM25索引之前写入的文档块存储在此补建一次
+    store.sparse.ensure_built()
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=store,
+        index_to_docstore_id=store.positions
+    )
+    vector_store.mmap_loaded = mmap
+    vector_store.index_path = index_dir / INDEX_FILE
+    return vector_store
+
+
+# 3. 写入前将内存映射的只读索引替换为进程私有的可写索引
+def ensure_writable(vector_store: FAISS):
+    """
+    vector_store - FAISS向量存储
+    """
+    if getattr(vector_store, "mmap_loaded", False):
+        # 不能用clone_index：IVF内存映射加载的倒排表（OnDiskInvertedLists）不支持复制，改为不带映射重新读取文件
+        vector_store.index = faiss.read_index(str(vector_store.index_path))
+        apply_search_params(vector_store.index)
+        vector_store.mmap_loaded = False
+        logger.info("内存映射索引已重新完整加载为可写索引")
+
+
+# 4. 保存：先提交文档块存储中新增/删除的行，再原子替换index.faiss
+def save(vector_store: FAISS, index_dir: Path):
+    """
+    vector_store - FAISS向量存储
+    index_dir - 索引目录
+    """
+    store: ChunkStore = vector_store.docstore
+    sync_positions(vector_store)
+    store.commit()
+
+    index_tmp = index_dir / (INDEX_FILE + ".tmp")
+    faiss.write_index(vector_store.index, str(index_tmp))
+    os.replace(index_tmp, index_dir / INDEX_FILE)
+
+
+# 5. 将位置映射恢复为文档块存储中的PositionMap（不提交）
+def sync_positions(vector_store: FAISS):
+    """
+    vector_store - FAISS向量存储
+    """
+    store: ChunkStore = vector_store.docstore
+    # Flat索引删除向量后FAISS会以普通dict重建位置映射，此时整体写回
+    if vector_store.index_to_docstore_id is not store.positions:
+        store.positions.replace_all(vector_store.index_to_docstore_id)
+        vector_store.index_to_docstore_id = store.positions
+
+
+# 6. 将旧版 index.pkl 一次性迁移到文档块存储
+def _migrate_legacy_docstore(index_dir: Path):
+    """
+    index.pkl 保留不动：迁移后只要 chunks.sqlite3 存在就不再读取它，删除 chunks.sqlite3 即可回退重新迁移
+
+    index_dir - 索引目录
+    """
+    legacy_path = index_dir / LEGACY_DOCSTORE_FILE
+    with open(legacy_path, 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    store = ChunkStore(index_dir / CHUNK_STORE_FILE)
+    try:
+        store.add(dict(docstore._dict))
+        store.positions.replace_all(index_to_docstore_id)
+        store.commit()
+    except Exception:
+        store.close()
+        for suffix in ("", "-wal", "-shm"):
+            (index_dir / (CHUNK_STORE_FILE + suffix)).unlink(missing_ok=True)
+        raise
+    store.close()
+    logger.info(f"已将 {LEGACY_DOCSTORE_FILE} 迁移到 {CHUNK_STORE_FILE}，共 {len(index_to_docstore_id)} 个文档块")
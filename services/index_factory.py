@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+FAISS索引构建模块
+支持 Flat / IVF-Flat / IVF-PQ / HNSW 四种索引类型：按配置构建、在样本上训练、
+设置查询时参数（nprobe / efSearch），并输出召回率-延迟对比报告；
+重建出的索引以稳定标签（即位置映射中的键）保存向量：IVF原生支持add_with_ids / remove_ids，
+Flat与HNSW外包一层IDMap2，删除向量后其余向量的标签保持不变
+"""
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+from config.settings import (
+    FAISS_INDEX_TYPE,
+    FAISS_IVF_NLIST,
+    FAISS_PQ_M,
+    FAISS_PQ_NBITS,
+    FAISS_HNSW_M,
+    FAISS_TRAIN_SAMPLE_SIZE,
+    FAISS_NPROBE,
+    FAISS_EF_SEARCH,
+    FAISS_HNSW_MIN_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# 重建索引时每次从旧索引取出的向量数，控制内存峰值
+REBUILD_BLOCK_SIZE = 65536
+
+
+# 1. 生成faiss.index_factory描述字符串
+def factory_string(index_type: str = FAISS_INDEX_TYPE, nlist: int = FAISS_IVF_NLIST, pq_m: int = FAISS_PQ_M, pq_nbits: int = FAISS_PQ_NBITS, hnsw_m: int = FAISS_HNSW_M) -> str:
+    """
+    index_type - 索引类型
+    nlist - IVF聚类中心数量
+    pq_m - PQ子量化器数量（需整除向量维度）
+    pq_nbits - 每个子量化器的编码位数
+    hnsw_m - HNSW每个节点的邻居数
+
+    @return 索引描述字符串
+    """
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}"
+    raise ValueError(f"不支持的索引类型: {index_type}，可选: {', '.join(INDEX_TYPES)}")
+
+
+# 2. 由Flat转换为该类型索引所需的最少向量数
+def min_train_size(index_type: str = FAISS_INDEX_TYPE, nlist: int = FAISS_IVF_NLIST, pq_nbits: int = FAISS_PQ_NBITS, hnsw_min_size: int = FAISS_HNSW_MIN_SIZE) -> int:
+    """
+    index_type - 索引类型
+    nlist - IVF聚类中心数量
+    pq_nbits - PQ编码位数
+    hnsw_min_size - HNSW无需训练，向量数较少时Flat精确检索已足够快，不值得付出建图开销与召回损失
+
+    @return 最少向量数，不足时应继续使用Flat索引
+    """
+    if index_type == "ivf_flat":
+        return nlist
+    if index_type == "ivf_pq":
+        return max(nlist, 2 ** pq_nbits)
+    if index_type == "hnsw":
+        return hnsw_min_size
+    return 1
+
+
+# 3. 设置查询时参数
+def apply_search_params(index: faiss.Index, nprobe: Optional[int] = FAISS_NPROBE, ef_search: Optional[int] = FAISS_EF_SEARCH):
+    """
+    index - FAISS索引
+    nprobe - IVF查询时访问的聚类数（越大召回越高、越慢）
+    ef_search - HNSW查询时的候选队列长度（越大召回越高、越慢）
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    inner = _unwrap(index)
+    if hasattr(inner, "hnsw") and ef_search:
+        inner.hnsw.efSearch = ef_search
+
+
+# 4. 在样本上训练并构建空索引
+def train_index(sample: np.ndarray, index_type: str = FAISS_INDEX_TYPE, **factory_kwargs) -> faiss.Index:
+    """
+    sample - 训练样本矩阵 (n, d)，float32
+    index_type - 索引类型
+    factory_kwargs - 传给factory_string的参数
+
+    @return 已训练（尚未添加向量）的索引
+    """
+    dim = sample.shape[1]
+    index = faiss.index_factory(dim, factory_string(index_type, **factory_kwargs), faiss.METRIC_L2)
+    if not index.is_trained:
+        start = time.perf_counter()
+        index.train(sample)
+        logger.info(f"{index_type} 索引训练完成，样本数 {len(sample)}，耗时 {time.perf_counter() - start:.2f}s")
+    apply_search_params(index)
+    return index
+
+
+# 5. 从现有索引抽取训练样本
+def sample_vectors(index: faiss.Index, sample_size: int = FAISS_TRAIN_SAMPLE_SIZE, seed: int = 0) -> np.ndarray:
+    """
+    index - 可重建向量的源索引（Flat / IVF-Flat / HNSW）
+    sample_size - 样本数上限
+    seed - 随机种子
+
+    @return 样本矩阵
+    """
+    _ensure_reconstructable(index)
+    labels = index_labels(index)
+    if len(labels) > sample_size:
+        labels = np.sort(np.random.default_rng(seed).choice(labels, size=sample_size, replace=False))
+    return index.reconstruct_batch(labels)
+
+
+# 6. 按新类型重建索引：样本训练后分块迁移全部向量，保持向量标签不变
+def rebuild_index(source: faiss.Index, index_type: str = FAISS_INDEX_TYPE, sample_size: int = FAISS_TRAIN_SAMPLE_SIZE, **factory_kwargs) -> faiss.Index:
+    """
+    source - 源索引
+    index_type - 目标索引类型
+    sample_size - 训练样本数上限
+
+    @return 新索引（向量标签与源索引一致，index_to_docstore_id无需变更）
+    """
+    _ensure_reconstructable(source)
+    target = train_index(sample_vectors(source, sample_size), index_type, **factory_kwargs)
+    labels = index_labels(source)
+    for start in range(0, len(labels), REBUILD_BLOCK_SIZE):
+        block = labels[start:start + REBUILD_BLOCK_SIZE]
+        target.add_with_ids(source.reconstruct_batch(block), block)
+    logger.info(f"索引已重建为 {factory_string(index_type, **factory_kwargs)}，向量数 {target.ntotal}")
+    return target
+
+
+# 7. 召回率-延迟对比报告：以精确Flat检索为基准
+def recall_latency_report(
+    source: faiss.Index,
+    queries: np.ndarray,
+    k: int = 10,
+    candidates: Optional[List[Dict[str, Any]]] = None,
+    sample_size: int = FAISS_TRAIN_SAMPLE_SIZE
+) -> List[Dict[str, Any]]:
+    """
+    source - 包含全部向量的源索引（Flat最佳）
+    queries - 查询向量矩阵 (q, d)，float32
+    k - 召回率计算的top-k
+    candidates - 待评测配置列表，元素形如
+                 {"index_type": "ivf_flat", "nprobe": [1, 8, 32]} 或 {"index_type": "hnsw", "ef_search": [16, 64]}
+    sample_size - 训练样本数上限
+
+    @return 每种配置与查询参数组合的一行结果：
+            index_type / params / recall@k / avg_latency_ms / build_seconds
+    """
+    if candidates is None:
+        candidates = [
+            {"index_type": "flat"},
+            {"index_type": "ivf_flat", "nprobe": [1, 8, 32, 128]},
+            {"index_type": "ivf_pq", "nprobe": [8, 32, 128]},
+            {"index_type": "hnsw", "ef_search": [16, 64, 256]},
+        ]
+
+    _ensure_reconstructable(source)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact = faiss.IndexFlatL2(source.d)
+    labels = index_labels(source)
+    for start in range(0, len(labels), REBUILD_BLOCK_SIZE):
+        exact.add(source.reconstruct_batch(labels[start:start + REBUILD_BLOCK_SIZE]))
+    _, ground_truth = exact.search(queries, k)
+    relevant = sum(len(set(row) - {-1}) for row in ground_truth)
+
+    rows = []
+    for candidate in candidates:
+        index_type = candidate["index_type"]
+        if source.ntotal < min_train_size(index_type):
+            logger.warning(f"向量数 {source.ntotal} 不足以训练 {index_type}，跳过")
+            continue
+
+        build_start = time.perf_counter()
+        index = exact if index_type == "flat" else rebuild_index(exact, index_type, sample_size)
+        build_seconds = time.perf_counter() - build_start
+
+        settings = [{"nprobe": value} for value in candidate.get("nprobe", [])]
+        settings += [{"ef_search": value} for value in candidate.get("ef_search", [])]
+        for params in settings or [{}]:
+            apply_search_params(index, params.get("nprobe"), params.get("ef_search"))
+            search_start = time.perf_counter()
+            _, found = index.search(queries, k)
+            latency_ms = (time.perf_counter() - search_start) * 1000 / len(queries)
+
+            hits = sum(len(set(found[i]) & (set(ground_truth[i]) - {-1})) for i in range(len(queries)))
+            rows.append({
+                "index_type": index_type,
+                "params": params,
+                f"recall@{k}": hits / max(relevant, 1),
+                "avg_latency_ms": latency_ms,
+                "build_seconds": build_seconds
+            })
+    return rows
+
+
+# 8. 索引中全部向量的标签（升序）
+def index_labels(index: faiss.Index) -> np.ndarray:
+    """
+    index - FAISS索引
+
+    @return 标签数组；未带标签的Flat/HNSW索引标签即位置 0..ntotal-1
+    """
+    if isinstance(index, faiss.IndexIDMap2):
+        return np.sort(faiss.vector_to_array(index.id_map))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        invlists = ivf.invlists
+        parts = [
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(ivf.nlist) if invlists.list_size(list_no)
+        ]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+# 9. 是否以稳定标签保存向量（新增向量需调用add_with_ids，删除后其余标签不变）
+def has_labels(index: faiss.Index) -> bool:
+    return isinstance(index, faiss.IndexIDMap2) or faiss.try_extract_index_ivf(index) is not None
+
+
+# 10. 按标签删除向量
+def remove_labels(index: faiss.Index, labels: List[int]) -> faiss.Index:
+    """
+    IVF与IDMap2,Flat原地删除，开销与删除数量成正比（IVF经哈希表直接映射定位向量）；
+    HNSW的图结构不支持删除，只能在沿用原参数的空索引上重新添加保留的向量，开销与语料规模成正比，
+    调用方应把同一批删除合并为一次调用
+
+    index - 带标签的索引，或旧版未带标签的HNSW索引（重建后外包IDMap2，标签即原位置）
+    labels - 待删除向量的标签
+
+    @return 删除后的索引（原地删除时即index本身）
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    if not hasattr(_unwrap(index), "hnsw"):
+        _ensure_reconstructable(index)
+        index.remove_ids(labels)
+        return index
+
+    keep = np.setdiff1d(index_labels(index), labels)
+    target = faiss.clone_index(index)
+    target.reset()
+    if not isinstance(target, faiss.IndexIDMap2):
+        target = faiss.IndexIDMap2(target)
+    for start in range(0, len(keep), REBUILD_BLOCK_SIZE):
+        block = keep[start:start + REBUILD_BLOCK_SIZE]
+        target.add_with_ids(index.reconstruct_batch(block), block)
+    apply_search_params(target)
+    return target
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+
+def _ensure_reconstructable(index: faiss.Index):
+    # IVF索引需要直接映射表才能按标签取回或删除向量；使用哈希表映射，标签可以不连续
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type != faiss.DirectMap.Hashtable:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+流式导入流水线
+目录遍历 → 解析(PDF/TXT)与分块 → 批量嵌入 → 追加到索引，
+各阶段之间以有界队列连接并在独立线程中运行：解析、嵌入、写入在时间上重叠，
+内存占用只取决于队列长度，与语料规模无关
+"""
+import queue
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from services.vector_store import VectorStoreService
+from utils.document_processor import DocumentProcessor
+from utils.file_source import FileSource
+from config.settings import INGEST_BATCH_SIZE, INGEST_QUEUE_SIZE, INGEST_PROGRESS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = ('.pdf', '.txt')
+
+# 阶段结束标记
+_DONE = object()
+
+# 队列阻塞读写时检查停止信号的间隔秒数
+_POLL_INTERVAL = 0.5
+
+
+class _Stopped(Exception):
+    """
+    其他阶段失败，流水线已停止
+    """
+
+
+class IngestPipeline:
+    """
+    目录到向量索引的流式导入流水线
+    """
+    # 1. 初始化流水线
+    def __init__(
+        self,
+        vector_store: VectorStoreService,
+        document_processor: DocumentProcessor,
+        batch_size: int = INGEST_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        progress_interval: float = INGEST_PROGRESS_INTERVAL
+    ):
+        """
+        vector_store - 向量存储服务
+        document_processor - 文档处理器（负责并行解析与分块）
+        batch_size - 每批嵌入的文档块数量
+        queue_size - 阶段间队列的最大长度
+        progress_interval - 进度输出间隔秒数
+        """
+        self.vector_store = vector_store
+        self.document_processor = document_processor
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.progress_interval = progress_interval
+        self._errors: List[BaseException] = []
+        self._stop = threading.Event()
+        self._stats = {"files": 0, "failed_files": 0, "chunks": 0, "embedded": 0, "written": 0, "removed": 0}
+
+    # 2. 运行流水线
+    def run(self, root: str) -> Dict[str, Any]:
+        """
+        root - 文档根目录（递归遍历）
+
+        @return 统计信息：文件数、失败文件数、文档块数、嵌入数、新写入数、删除数、耗时与吞吐
+        """
+        root_path = Path(root)
+        started = time.perf_counter()
+        # 先加载已有索引与清单，嵌入前即可跳过已索引内容
+        self.vector_store.load_vector_store()
+
+        self._stop = threading.Event()
+        parsed: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        embedded: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        stages = [
+            threading.Thread(target=self._guard, args=(self._parse_stage, root_path, parsed, embedded), name="ingest-parse", daemon=True),
+            threading.Thread(target=self._guard, args=(self._embed_stage, parsed, embedded), name="ingest-embed", daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+
+        # 写入阶段在当前线程执行，索引只被一个线程修改；
+        # 任一阶段失败都会设置停止信号，阻塞在队列上的其他阶段随之退出，join不会挂起
+        try:
+            self._write_stage(embedded, started)
+        except _Stopped:
+            pass
+        finally:
+            self._stop.set()
+            for stage in stages:
+                stage.join()
+        if self._errors:
+            raise self._errors[0]
+
+        if self._stats["written"] or self._stats["removed"]:
+            self.vector_store.persist()
+
+        elapsed = time.perf_counter() - started
+        self._report(started)
+        return {**self._stats, "seconds": elapsed, "chunks_per_second": self._stats["chunks"] / elapsed if elapsed else 0.0}
+
+    # 3. 遍历目录，惰性产出待处理文件
+    def _walk(self, root: Path) -> Iterator[Any]:
+        if root.is_file():
+            yield FileSource(root.name, path=root)
+            return
+        for path in sorted(root.rglob("*")):
+            if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES:
+                # 只传递路径，解析子进程直接读取文件
+                yield FileSource(str(path.relative_to(root)), path=path)
+
+    # 4. 解析阶段：并行解析与分块，按文件产出替换标记与文档块
+    def _parse_stage(self, root: Path, parsed: "queue.Queue", embedded: "queue.Queue"):
+        results = self.document_processor.process_files(self._walk(root))
+        try:
+            for result in results:
+                self._stats["files"] += 1
+                if result["error"]:
+                    self._stats["failed_files"] += 1
+                    logger.error(f"解析失败: {result['file_name']} - {result['error']}")
+                    continue
+                # PDF在解析时已分块，这里只分割TXT等原始文档
+                chunks = self.vector_store.split_documents(result["documents"])
+                for chunk in chunks:
+                    chunk.metadata = {**chunk.metadata, "source": result["file_name"]}
+                self._stats["chunks"] += len(chunks)
+                self._put(parsed, (result["file_name"], chunks))
+        finally:
+            # 提前退出时关闭生成器，解析进程池随之关闭并取消未开始的页段
+            results.close()
+            self._finish(parsed)
+
+    # 5. 嵌入阶段：跳过已索引内容，攒批后批量嵌入
+    def _embed_stage(self, parsed: "queue.Queue", embedded: "queue.Queue"):
+        try:
+            batch = {}
+            while True:
+                item = self._get(parsed)
+                if item is _DONE:
+                    break
+                source, chunks = item
+                # 来源内容变化时先删除其旧文档块（写入阶段按顺序执行）
+                self._put(embedded, ("remove", (source, chunks)))
+                for chunk_hash, chunk in self.vector_store.new_chunks(chunks).items():
+                    batch[chunk_hash] = chunk
+                    if len(batch) >= self.batch_size:
+                        self._embed_batch(batch, embedded)
+                        batch = {}
+            if batch:
+                self._embed_batch(batch, embedded)
+        finally:
+            self._finish(embedded)
+
+    def _embed_batch(self, batch: Dict[str, Any], embedded: "queue.Queue"):
+        vectors = self.vector_store.embeddings.embed_documents([chunk.page_content for chunk in batch.values()])
+        self._stats["embedded"] += len(batch)
+        self._put(embedded, ("add", (batch, vectors)))
+
+    # 5.1 写入阶段：按顺序删除旧文档块、追加新向量
+    def _write_stage(self, embedded: "queue.Queue", started: float):
+        last_report = time.perf_counter()
+        while True:
+            item = self._get(embedded)
+            if item is _DONE:
+                break
+            kind, payload = item
+            if kind == "remove":
+                source, chunks = payload
+                self._stats["removed"] += self.vector_store.remove_stale(source, chunks)
+            else:
+                fresh, vectors = payload
+                self._stats["written"] += self.vector_store.write_embedded(fresh, vectors)
+
+            if time.perf_counter() - last_report >= self.progress_interval:
+                self._report(started)
+                last_report = time.perf_counter()
+
+    # 6. 捕获阶段线程中的异常并停止流水线，由主线程统一抛出
+    def _guard(self, stage, *args):
+        try:
+            stage(*args)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            logger.error(f"导入阶段 {threading.current_thread().name} 失败: {str(e)}")
+            self._errors.append(e)
+            self._stop.set()
+
+    # 6.1 放入队列：队列满时等待，流水线停止时抛出_Stopped
+    def _put(self, q: "queue.Queue", item: Any):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    # 6.2 从队列取出：队列空时等待，流水线停止时抛出_Stopped
+    def _get(self, q: "queue.Queue") -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        raise _Stopped()
+
+    # 6.3 发送阶段结束标记（流水线已停止时下游不再读取，无需发送）
+    def _finish(self, q: "queue.Queue"):
+        try:
+            self._put(q, _DONE)
+        except _Stopped:
+            pass
+
+    # 7. 输出进度与吞吐
+    def _report(self, started: float):
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        print(
+            f"📥 文件 {self._stats['files']}（失败 {self._stats['failed_files']}） | "
+            f"分块 {self._stats['chunks']} | 嵌入 {self._stats['embedded']} | 写入 {self._stats['written']} | "
+            f"删除 {self._stats['removed']} | {self._stats['chunks'] / elapsed:.1f} 块/秒"
+        )
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+进程级共享资源注册表
+嵌入模型按名称缓存，已加载的索引按 (路径, 模型, 修改时间) 缓存，
+Streamlit 每次重跑脚本、CLI 与多Agent系统创建服务实例时均复用同一份资源
+"""
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = "index.faiss"
+
+
+class ResourceRegistry:
+    """
+    线程安全的资源注册表
+    """
+    # 1. 初始化注册表
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple, threading.RLock] = {}
+        self._embeddings: Dict[str, HuggingFaceEmbeddings] = {}
+        # (索引目录, 嵌入模型) -> (index.faiss修改时间, 加载结果)
+        self._indexes: Dict[Tuple[str, str], Tuple[int, Any]] = {}
+        # 索引目录 -> 版本号，索引内容每次变化（含其他进程写入后重新加载）时递增
+        self._versions: Dict[str, int] = {}
+
+    # 2. 获取某个资源键的加载锁，同一资源只会被加载一次
+    def key_lock(self, *key) -> threading.RLock:
+        """
+        key - 资源键
+
+        @return 该资源键对应的可重入锁
+        """
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.RLock())
+
+    # 3. 获取嵌入模型（首次调用时加载）
+    def get_embeddings(self, model_name: str) -> HuggingFaceEmbeddings:
+        """
+        model_name - 嵌入模型名称
+
+        @return 共享的嵌入模型实例
+        """
+        embeddings = self._embeddings.get(model_name)
+        if embeddings is not None:
+            return embeddings
+
+        with self.key_lock("embeddings", model_name):
+            if model_name not in self._embeddings:
+                logger.info(f"加载嵌入模型: {model_name}")
+                self._embeddings[model_name] = HuggingFaceEmbeddings(model_name=model_name)
+            return self._embeddings[model_name]
+
+    # 4. 获取已加载的索引；磁盘文件被其他进程更新后自动重新加载
+    def get_index(self, index_dir: Path, model_name: str, loader: Callable[[], Any]) -> Any:
+        """
+        index_dir - 索引目录
+        model_name - 索引使用的嵌入模型名称
+        loader - 加载函数，仅在缓存缺失或文件已变化时调用
+
+        @return loader的返回值（缓存或新加载）
+        """
+        key = self._index_key(index_dir, model_name)
+        with self.key_lock("index", *key):
+            mtime = self._index_mtime(index_dir)
+            cached = self._indexes.get(key)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            value = loader()
+            if value is not None and mtime is not None:
+                self._indexes[key] = (mtime, value)
+            if cached is not None:
+                self.bump_index_version(index_dir)
+            logger.info(f"索引已加载到共享注册表: {key[0]}")
+            return value
+
+    # 5. 登记本进程刚写入磁盘的索引，避免随后按新修改时间重复加载
+    def put_index(self, index_dir: Path, model_name: str, value: Any):
+        """
+        index_dir - 索引目录
+        model_name - 索引使用的嵌入模型名称
+        value - 索引对象（与get_index的loader返回值形式一致）
+        """
+        key = self._index_key(index_dir, model_name)
+        with self.key_lock("index", *key):
+            mtime = self._index_mtime(index_dir)
+            if mtime is not None:
+                self._indexes[key] = (mtime, value)
+
+    # 6. 移除某个目录下的全部缓存索引（如清除索引前）
+    def invalidate_index(self, index_dir: Path) -> List[Any]:
+        """
+        index_dir - 索引目录
+
+        @return 被移除的加载结果（调用方负责关闭其中打开的文件）
+        """
+        path = str(Path(index_dir).resolve())
+        with self._lock:
+            removed = [self._indexes.pop(key)[1] for key in [k for k in self._indexes if k[0] == path]]
+        self.bump_index_version(index_dir)
+        return removed
+
+    # 7. 获取索引版本号（依赖索引内容的缓存以此作为失效依据）
+    def index_version(self, index_dir: Path) -> int:
+        """
+        index_dir - 索引目录
+
+        @return 当前版本号
+        """
+        return self._versions.get(str(Path(index_dir).resolve()), 0)
+
+    # 8. 索引内容变化后递增版本号
+    def bump_index_version(self, index_dir: Path) -> int:
+        """
+        index_dir - 索引目录
+
+        @return 新版本号
+        """
+        path = str(Path(index_dir).resolve())
+        with self._lock:
+            self._versions[path] = self._versions.get(path, 0) + 1
+            return self._versions[path]
+
+    @staticmethod
+    def _index_key(index_dir: Path, model_name: str) -> Tuple[str, str]:
+        return str(Path(index_dir).resolve()), model_name
+
+    @staticmethod
+    def _index_mtime(index_dir: Path) -> Optional[int]:
+        try:
+            return (Path(index_dir) / INDEX_FILE_NAME).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+# 进程内唯一的注册表实例
+resource_registry = ResourceRegistry()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+BM25稀疏索引
+倒排表与文档长度存放在文档块存储的同一个SQLite库中，随文档块的写入、删除在同一事务中更新；
+中文按字符二元组切分（不依赖分词词典，"飞天项目"切为 飞天/天项/项目），英文与数字按小写单词切分
+"""
+import re
+import math
+import logging
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from config.settings import BM25_K1, BM25_B
+
+logger = logging.getLogger(__name__)
+
+# 连续的中日韩字符，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+|[0-9a-z]+")
+_CJK_START = "\u3040"
+
+# 单条SQL中IN子句的最大参数个数（与chunk_store一致）
+MAX_SQL_VARIABLES = 500
+
+
+# 1. 切分文本
+def tokenize(text: str) -> List[str]:
+    """
+    text - 文本
+
+    @return 词项列表：中文为字符二元组（单字片段保留单字），其余为小写单词
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if run[0] < _CJK_START:
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _idf(total: int, df: int) -> float:
+    return math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+
+class SparseIndex:
+    """
+    BM25倒排索引，读写经由ChunkStore的连接与锁完成，提交由ChunkStore.commit统一处理
+    """
+    # 1. 建表
+    def __init__(self, store):
+        """
+        store - ChunkStore实例
+        """
+        self._store = store
+        self._stats = None
+        store.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, id)) WITHOUT ROWID")
+        store.execute("CREATE INDEX IF NOT EXISTS terms_id ON terms (id)")
+        store.execute("CREATE TABLE IF NOT EXISTS doc_lengths (id TEXT PRIMARY KEY, length INTEGER NOT NULL)")
+
+    # 2. 索引文档块
+    def add(self, texts: Dict[str, str]):
+        """
+        texts - docstore id -> 文档块正文
+        """
+        postings, lengths = [], []
+        for doc_id, text in texts.items():
+            tokens = tokenize(text)
+            lengths.append((doc_id, len(tokens)))
+            postings.extend((term, doc_id, tf) for term, tf in Counter(tokens).items())
+        self._store.executemany("INSERT OR REPLACE INTO terms (term, id, tf) VALUES (?, ?, ?)", postings)
+        self._store.executemany("INSERT OR REPLACE INTO doc_lengths (id, length) VALUES (?, ?)", lengths)
+        self.invalidate()
+
+    # 3. 删除文档块
+    def delete(self, ids: Iterable[str]):
+        rows = [(doc_id,) for doc_id in ids]
+        self._store.executemany("DELETE FROM terms WHERE id = ?", rows)
+        self._store.executemany("DELETE FROM doc_lengths WHERE id = ?", rows)
+        self.invalidate()
+
+    # 4. 清空
+    def reset(self):
+        self._store.execute("DELETE FROM terms")
+        self._store.execute("DELETE FROM doc_lengths")
+        self.invalidate()
+
+    # 缓存的语料统计在写入或回滚后失效
+    def invalidate(self):
+        self._stats = None
+
+    # 5. BM25检索：在SQL中按文档块聚合打分并取top-k，只有k行结果返回Python
+    def search(self, query: str, k: int, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        query - 查询文本
+        k - 返回的最大文档块数
+        min_score - 归一化分数下限：BM25分数除以查询词（语料中出现过的）idf之和，
+                    约等于按idf加权的查询词命中比例，低于该值的文档块不返回
+
+        @return (docstore id, BM25分数) 列表，按分数从高到低排列
+        """
+        # 每个查询词占两个参数（词项与idf），超长查询只取前面的词项
+        terms = list(dict.fromkeys(tokenize(query)))[:(MAX_SQL_VARIABLES - 4) // 2]
+        total, average_length = self._corpus_stats()
+        if not terms or not total:
+            return []
+
+        placeholders = ','.join('?' * len(terms))
+        frequencies = self._store.execute(
+            f"SELECT term, COUNT(*) FROM terms WHERE term IN ({placeholders}) GROUP BY term", terms
+        )
+        if not frequencies:
+            return []
+        weights = [(term, _idf(total, df)) for term, df in frequencies]
+        idf_sum = sum(idf for _, idf in weights)
+
+        rows = self._store.execute(
+            f"""
+            WITH query_terms (term, idf) AS (VALUES {','.join(['(?, ?)'] * len(weights))})
+            SELECT t.id,
+                   SUM(q.idf * t.tf * ({BM25_K1} + 1) / (t.tf + {BM25_K1} * (1 - {BM25_B} + {BM25_B} * d.length / ?))) AS score
+            FROM query_terms q
+            JOIN terms t ON t.term = q.term
+            JOIN doc_lengths d ON d.id = t.id
+            GROUP BY t.id
+            HAVING score >= ?
+            ORDER BY score DESC
+            LIMIT ?
+            """,
+            [value for weight in weights for value in weight] + [average_length, min_score * idf_sum if min_score > 0 else 0.0, k]
+        )
+        return [(doc_id, score) for doc_id, score in rows]
+
+    def _corpus_stats(self) -> Tuple[int, float]:
+        if self._stats is None:
+            total, length_sum = self._store.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM doc_lengths")[0]
+            self._stats = (total, length_sum / total if total else 0.0)
+        return self._stats
+
+    # 6. 旧索引（建立稀疏索引之前写入的文档块）加载时补建，检索路径不写库
+    def ensure_built(self) -> int:
+        """
+        @return 补建的文档块数量，索引已完整时为0
+        """
+        indexed = self._store.execute("SELECT COUNT(*) FROM doc_lengths")[0][0]
+        chunks = self._store.execute("SELECT COUNT(*) FROM chunks")[0][0]
+        if indexed == chunks:
+            return 0
+        self.reset()
+        self.add({doc_id: doc.page_content for doc_id, doc in self._store.iter_documents()})
+        self._store.commit()
+        logger.info(f"已为 {chunks} 个文档块补建BM25索引")
+        return chunks
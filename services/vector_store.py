@@ -2,24 +2,37 @@
 """
 向量存储服务模块
 """
-import os
-from typing import List, Optional, Dict, Any
+import json
+import hashlib
+from typing import List, Optional, Dict, Any, Iterable, Union
 import logging
 from pathlib import Path
+import numpy as np
+import faiss
 from utils.decorators import error_handler, log_execution
+from utils.chunking import build_text_splitter, iter_split, split_once, content_metadata
+from utils.context_builder import ContextBuilder
 
 from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from config.settings import (
     DEEPSEEK_API_KEY,
     DEEPSEEK_BASE_URL,
     MAX_RETRIEVED_DOCS,
-    CHUNK_SIZE,
-    CHUNK_OVERLAP,
-    SEPARATORS
+    INGEST_BATCH_SIZE,
+    INGEST_CHECKPOINT_BATCHES,
+    FAISS_INDEX_TYPE,
+    VECTOR_STORE_MMAP,
+    CONTEXT_MAX_TOKENS,
+    HYBRID_SEARCH,
+    SPARSE_TOP_K,
+    SPARSE_MIN_SCORE,
+    RRF_K
 )
+from services.resource_registry import resource_registry
+from services.embedding_cache import query_embedding_cache
+from services import faiss_io
+from services.index_factory import apply_search_params, has_labels, min_train_size, rebuild_index, recall_latency_report, remove_labels
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -30,22 +43,22 @@ class VectorStoreService:
     向量存储服务类，用于管理文档向量存储
     """
     # 1. 初始化向量存储服务
-    def __init__(self, index_dir: str = "faiss_index"):
+    def __init__(self, index_dir: str = "faiss_index", embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"):
         """
         index_dir - 索引目录
+        embedding_model - 嵌入模型名称（模型实例从进程级注册表获取，只加载一次）
         """
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(exist_ok=True)
         self.vector_store = None
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        # 内容寻址清单（文档块哈希 -> docstore id 与来源）存放在文档块存储中，旧版manifest.json首次加载时导入
+        self.manifest_path = self.index_dir / "manifest.json"
+        self.embedding_model_name = embedding_model
+        self.embeddings = resource_registry.get_embeddings(embedding_model)
+        # 同一索引目录的写操作在进程内串行执行
+        self._write_lock = resource_registry.key_lock("index_write", str(self.index_dir.resolve()))
         # 初始化文本分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=SEPARATORS
-        )
+        self.text_splitter = build_text_splitter()
     
     # 2. 更新嵌入模型
     def update_embedding_model(self, model_name: str) -> bool:
@@ -55,10 +68,11 @@ class VectorStoreService:
         @return 是否更新成功
         """
         try:
-            if self.embeddings.model != model_name:
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name=model_name
-                )
+            if self.embedding_model_name != model_name:
+                self.embeddings = resource_registry.get_embeddings(model_name)
+                self.embedding_model_name = model_name
+                # 已加载的索引与旧模型绑定，下次使用时按新模型从注册表获取
+                self.vector_store = None
                 logger.info(f"嵌入模型已更新为: {model_name}")
                 return True
             return False
@@ -70,14 +84,14 @@ class VectorStoreService:
     @error_handler()
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """
-        对文档进行分块处理
+        对文档进行分块处理，已分块的文档原样保留
         
         @param documents - 原始文档列表
         @return 分块后的文档列表
         """
         try:
             # 使用文本分割器进行分块
-            split_docs = self.text_splitter.split_documents(documents)
+            split_docs = split_once(documents, self.text_splitter)
             logger.info(f"文档分块完成：原始文档数量 {len(documents)}，分块后文档数量 {len(split_docs)}")
             return split_docs
         except Exception as e:
@@ -103,14 +117,10 @@ class VectorStoreService:
             # 对文档进行分块
             split_documents = self.split_documents(documents)
             
-            # 使用LangChain的FAISS向量存储
-            self.vector_store = FAISS.from_documents(
-                split_documents,
-                self.embeddings
-            )
-            
-            # 保存向量存储
-            self._save_vector_store(self.vector_store)
+            # 丢弃现有索引与清单，由分批导入重新构建并保存
+            with self._write_lock:
+                self._release_vector_store()
+                self._ingest_chunks(split_documents)
             
             logger.info(f"向量存储创建成功，包含 {len(split_documents)} 个文档块")
             return self.vector_store
@@ -125,7 +135,9 @@ class VectorStoreService:
         vector_store - FAISS向量存储
         """
         try:
-            vector_store.save_local(str(self.index_dir))
+            # 清单与文档块在同一事务中提交
+            faiss_io.save(vector_store, self.index_dir)
+            resource_registry.put_index(self.index_dir, self.embedding_model_name, vector_store)
             logger.info(f"向量存储已保存到: {self.index_dir}")
         except Exception as e:
             logger.error(f"保存向量存储失败: {str(e)}")
@@ -138,10 +150,11 @@ class VectorStoreService:
         """
         try:
             if (self.index_dir / "index.faiss").exists():
-                self.vector_store = FAISS.load_local(
-                    str(self.index_dir),
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
+                # 同一进程内共享已加载的索引，文件未变化时不重复读取
+                self.vector_store = resource_registry.get_index(
+                    self.index_dir,
+                    self.embedding_model_name,
+                    self._load_from_disk
                 )
                 logger.info("向量存储加载成功")
                 return self.vector_store
@@ -151,12 +164,27 @@ class VectorStoreService:
         return None
     
 
+    def _load_from_disk(self):
+        vector_store = None
+        if VECTOR_STORE_MMAP:
+            try:
+                # 内存映射加载：启动几乎不读盘，多个进程共享同一份页缓存
+                vector_store = faiss_io.load(self.index_dir, self.embeddings, mmap=True)
+            except Exception as e:
+                logger.warning(f"内存映射加载失败，改为完整加载: {str(e)}")
+        if vector_store is None:
+            vector_store = faiss_io.load(self.index_dir, self.embeddings, mmap=False)
+        apply_search_params(vector_store.index)
+        self._ensure_manifest(vector_store)
+        return vector_store
+
     # 7. 搜索相关文档
     @error_handler()
-    def search_documents(self, query: str, threshold: float = 0.5) -> List[Document]:
+    def search_documents(self, query: str, threshold: float = 0.5, hybrid: Optional[bool] = None) -> List[Document]:
         """
         query - 查询文本
         threshold - 相似度阈值
+        hybrid - 是否与BM25结果融合，默认取HYBRID_SEARCH配置
 
         @return 相关文档列表
         """
@@ -167,14 +195,16 @@ class VectorStoreService:
                 return []
         
         try:
-            # 使用LangChain的相似度搜索
-            docs_and_scores = self.vector_store.similarity_search_with_score(
-                query,
+            # 查询向量优先从缓存获取，再按向量进行相似度搜索
+            docs_and_scores = self.vector_store.similarity_search_with_score_by_vector(
+                self.embed_query(query),
                 k=MAX_RETRIEVED_DOCS
             )
             
             # 根据阈值过滤结果
             results = [doc for doc, score in docs_and_scores if score > threshold]
+            if HYBRID_SEARCH if hybrid is None else hybrid:
+                results = self._fuse(results, self.sparse_search(query))
             
             logger.info(f"搜索到 {len(results)} 个相关文档，相似度阈值: {threshold}")
             return results
@@ -183,16 +213,128 @@ class VectorStoreService:
             logger.error(f"搜索文档失败: {str(e)}")
             return []
     
-    # 8. 获取文档上下文
-    def get_context(self, docs: List[Document]) -> str:
+    # 7.1 批量搜索：一次批量编码所有查询，一次矩阵检索
+    @error_handler()
+    def search_many(self, queries: List[str], k: int = MAX_RETRIEVED_DOCS, threshold: float = 0.5, hybrid: Optional[bool] = None) -> List[List[Document]]:
         """
-        docs - 文档列表
+        queries - 查询文本列表
+        k - 每个查询返回的最大文档数
+        threshold - 相似度阈值（与search_documents的过滤规则一致）
+        hybrid - 是否与BM25结果融合，默认取HYBRID_SEARCH配置
+
+        @return 与queries一一对应的相关文档列表
+        """
+        if not queries:
+            return []
+        if not self.vector_store:
+            self.vector_store = self.load_vector_store()
+            if not self.vector_store:
+                logger.warning("向量存储未初始化")
+                return [[] for _ in queries]
+
+        try:
+            vectors = query_embedding_cache.get_many_or_compute(
+                self.embedding_model_name,
+                queries,
+                self.embeddings.embed_documents,
+                kind="documents"
+            )
+            matrix = np.asarray(vectors, dtype=np.float32)
+            if self.vector_store._normalize_L2:
+                faiss.normalize_L2(matrix)
+            scores, positions = self.vector_store.index.search(matrix, k)
+
+            # 只为通过阈值的top-k结果取回正文，所有查询合并为一次读取
+            # FAISS以-1填充不足k个的结果
+            hits = [
+                [int(position) for score, position in zip(row_scores, row_positions) if position != -1 and score > threshold]
+                for row_scores, row_positions in zip(scores, positions)
+            ]
+            docs_by_position = self._fetch_by_positions({position for row in hits for position in row})
+            results = [
+                [docs_by_position[position] for position in row if position in docs_by_position]
+                for row in hits
+            ]
+            if HYBRID_SEARCH if hybrid is None else hybrid:
+                results = [self._fuse(dense, self.sparse_search(query), k) for query, dense in zip(queries, results)]
+
+            logger.info(f"批量搜索 {len(queries)} 个查询，共命中 {sum(len(docs) for docs in results)} 个文档，相似度阈值: {threshold}")
+            return results
+
+        except Exception as e:
+            logger.error(f"批量搜索文档失败: {str(e)}")
+            return [[] for _ in queries]
+
+    def _fetch_by_positions(self, positions) -> Dict[int, Document]:
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        if hasattr(index_to_docstore_id, "lookup"):
+            ids = index_to_docstore_id.lookup(positions)
+        else:
+            ids = {position: index_to_docstore_id[position] for position in positions}
+        docs = self.vector_store.docstore.get_many(list(ids.values()))
+        return {position: docs[doc_id] for position, doc_id in ids.items() if doc_id in docs}
+
+    # 7.2 计算查询向量（优先从查询向量缓存获取）
+    def embed_query(self, query: str) -> List[float]:
+        """
+        query - 查询文本
+
+        @return 查询向量
+        """
+        return query_embedding_cache.get_or_compute(
+            self.embedding_model_name,
+            query,
+            self.embeddings.embed_query,
+            kind="query"
+        )
+
+    # 7.3 BM25检索（倒排索引与文档块存放在同一SQLite库中）
+    def sparse_search(self, query: str, k: int = SPARSE_TOP_K, min_score: float = SPARSE_MIN_SCORE) -> List[Document]:
+        """
+        query - 查询文本
+        k - 返回的最大文档块数
+        min_score - 归一化BM25分数下限，作用与向量检索的相似度阈值相当，只命中少量查询词的文档块不参与融合
+
+        @return 按BM25分数从高到低排列的文档块
+        """
+        if not self.vector_store:
+            self.vector_store = self.load_vector_store()
+        sparse = getattr(self.vector_store.docstore, "sparse", None) if self.vector_store else None
+        if sparse is None:
+            return []
+        ranked = sparse.search(query, k, min_score)
+        docs = self.vector_store.docstore.get_many([doc_id for doc_id, _ in ranked])
+        return [docs[doc_id] for doc_id, _ in ranked if doc_id in docs]
+
+    # 7.4 倒数排名融合（RRF）：各路结果按名次计分 1/(RRF_K + 名次)，同一文档块的得分相加
+    def _fuse(self, dense: List[Document], sparse: List[Document], k: int = MAX_RETRIEVED_DOCS) -> List[Document]:
+        """
+        dense - 向量检索结果（已按阈值过滤）
+        sparse - BM25检索结果
+        k - 返回的最大文档块数
+
+        @return 融合排序后的文档块
+        """
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for ranking in (dense, sparse):
+            for rank, doc in enumerate(ranking, start=1):
+                chunk_id = self.chunk_id(doc)
+                docs.setdefault(chunk_id, doc)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+        return [docs[chunk_id] for chunk_id in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+    # 8. 获取文档上下文：去除重叠文档块，按相关度顺序放入token预算
+    def get_context(self, docs: List[Document], max_tokens: int = CONTEXT_MAX_TOKENS) -> str:
+        """
+        docs - 按相关度从高到低排列的文档列表
+        max_tokens - token预算，超出时截断或丢弃相关度最低的文档块
 
         @return 合并后的上下文
         """
         if not docs:
             return ""
-        return "\n\n".join(doc.page_content for doc in docs)
+        return ContextBuilder(max_tokens).build_chunks(doc.page_content for doc in docs)
     
 
     # 9. 添加单个文档到向量存储（保留现有向量库，仅追加新的文档向量）
@@ -210,27 +352,8 @@ class VectorStoreService:
             return False
             
         try:
-            # 创建Document对象
-            doc = Document(page_content=content, metadata=metadata or {})
-            
-            # 对文档进行分块
-            split_docs = self.split_documents([doc])
-            
-            # 如果向量存储不存在，先初始化
-            if not self.vector_store:
-                self.vector_store = self.load_vector_store()
-                if not self.vector_store:
-                    # 如果仍不存在，使用当前文档创建新的向量存储
-                    self.vector_store = self.create_vector_store([doc])
-                    return True
-            
-            # 为已存在的向量存储添加文档块
-            self.vector_store.add_documents(split_docs)
-            
-            # 保存更新后的向量存储
-            self._save_vector_store(self.vector_store)
-            
-            logger.info(f"成功添加文档，标题: {metadata.get('source', '未知') if metadata else '未知'}，分块数量: {len(split_docs)}")
+            added = self.add_documents_bulk([Document(page_content=content, metadata=metadata or {})])
+            logger.info(f"成功添加文档，标题: {metadata.get('source', '未知') if metadata else '未知'}，新增分块数量: {added}")
             return True
             
         except Exception as e:
@@ -241,10 +364,419 @@ class VectorStoreService:
     # 10. 清除索引（删除所有索引文件）
     def clear_index(self):
         try:
-            for file in self.index_dir.glob("*"):
-                file.unlink()
-            self.vector_store = None
+            with self._write_lock:
+                # 先关闭文档块存储的连接，再删除chunks.sqlite3及其-wal/-shm文件
+                self._release_vector_store()
+                for file in self.index_dir.glob("*"):
+                    file.unlink()
             logger.info("索引已清除")
         except Exception as e:
             logger.error(f"清除索引失败: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    # 10.1 丢弃当前向量存储：移除注册表中的共享实例并关闭其文档块存储连接（调用方持有写锁）
+    def _release_vector_store(self):
+        stores = [self.vector_store] + resource_registry.invalidate_index(self.index_dir)
+        closed = set()
+        for vector_store in stores:
+            docstore = getattr(vector_store, "docstore", None)
+            if docstore is not None and id(docstore) not in closed and hasattr(docstore, "close"):
+                docstore.close()
+                closed.add(id(docstore))
+        self.vector_store = None
+
+
+    # 11. 批量流式导入文档（分批嵌入、原地追加，仅在检查点或结束时持久化）
+    @error_handler()
+    def add_documents_bulk(
+        self,
+        documents: Iterable[Union[Document, Dict[str, Any]]],
+        batch_size: int = INGEST_BATCH_SIZE,
+        checkpoint_every: int = INGEST_CHECKPOINT_BATCHES
+    ) -> int:
+        """
+        documents - 文档可迭代对象，元素为Document或包含content/metadata的字典，按流式方式逐个消费
+        batch_size - 每批嵌入的文档块数量
+        checkpoint_every - 每处理多少批持久化一次，0表示仅在导入结束时持久化一次
+
+        @return 新写入向量存储的文档块数量（内容已索引的文档块会被跳过）
+        """
+        with self._write_lock:
+            # 在已有索引上追加；不存在时由第一批数据创建
+            if not self.vector_store:
+                self.vector_store = self.load_vector_store()
+
+            return self._ingest_chunks(self._iter_chunks(documents), batch_size, checkpoint_every)
+
+    # 12. 将输入统一转换为Document
+    @staticmethod
+    def _to_document(item: Union[Document, Dict[str, Any]]) -> Optional[Document]:
+        """
+        item - Document或包含content/metadata的字典
+
+        @return Document对象，内容为空时返回None
+        """
+        if isinstance(item, Document):
+            return item if item.page_content else None
+        content = item.get("content")
+        if not content:
+            return None
+        return Document(page_content=content, metadata=item.get("metadata") or {})
+
+    # 13. 逐个分块，保持流式消费
+    def _iter_chunks(self, documents: Iterable[Union[Document, Dict[str, Any]]]) -> Iterable[Document]:
+        """
+        documents - 文档可迭代对象
+
+        @return 文档块生成器
+        """
+        for item in documents:
+            doc = self._to_document(item)
+            if doc is not None:
+                yield from iter_split([doc], self.text_splitter)
+
+    # 14. 分批写入文档块，按检查点与结束时持久化
+    def _ingest_chunks(
+        self,
+        chunks: Iterable[Document],
+        batch_size: int = INGEST_BATCH_SIZE,
+        checkpoint_every: int = INGEST_CHECKPOINT_BATCHES
+    ) -> int:
+        """
+        chunks - 已分块的文档可迭代对象
+        batch_size - 每批嵌入的文档块数量
+        checkpoint_every - 每处理多少批持久化一次，0表示仅在结束时持久化
+
+        @return 新写入的文档块数量（已存在的文档块不计入）
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size必须大于0")
+
+        total_chunks = 0
+        batch_count = 0
+        pending: List[Document] = []
+
+        for chunk in chunks:
+            pending.append(chunk)
+            if len(pending) < batch_size:
+                continue
+            total_chunks += self._add_batch(pending)
+            pending = []
+            batch_count += 1
+            if checkpoint_every and batch_count % checkpoint_every == 0 and total_chunks:
+                self._save_vector_store(self.vector_store)
+                logger.info(f"导入检查点：已写入 {total_chunks} 个文档块")
+
+        if pending:
+            total_chunks += self._add_batch(pending)
+
+        # 内容均已存在时不重写索引文件
+        if total_chunks:
+            self._maybe_build_configured_index()
+            self._save_vector_store(self.vector_store)
+        logger.info(f"批量导入完成，新写入 {total_chunks} 个文档块")
+        return total_chunks
+
+    # 15. 嵌入一批文档块并追加到内存中的FAISS索引（不落盘），跳过已索引的内容
+    def _add_batch(self, chunks: List[Document]) -> int:
+        """
+        chunks - 已分块的文档列表
+
+        @return 本批新写入的文档块数量
+        """
+        fresh = self.new_chunks(chunks)
+        if not fresh:
+            return 0
+        vectors = self.embeddings.embed_documents([chunk.page_content for chunk in fresh.values()])
+        return self._write_embedded(fresh, vectors)
+
+    # 15.1 筛选尚未索引的文档块（按内容哈希去重，嵌入前调用以免重复计算）
+    def new_chunks(self, chunks: Iterable[Document]) -> Dict[str, Document]:
+        """
+        chunks - 文档块
+
+        @return 内容哈希 -> 尚未索引的文档块
+        """
+        hashed: Dict[str, Document] = {}
+        for chunk in chunks:
+            hashed.setdefault(self._chunk_hash(chunk), chunk)
+        indexed = self._indexed(hashed)
+        return {chunk_hash: chunk for chunk_hash, chunk in hashed.items() if chunk_hash not in indexed}
+
+    # 15.1.1 批量查询已索引的内容哈希
+    def _indexed(self, chunk_hashes: Iterable[str]) -> Dict[str, str]:
+        if self.vector_store is None:
+            return {}
+        return self.vector_store.docstore.manifest.lookup(chunk_hashes)
+
+    # 15.2 将已嵌入的文档块追加到内存中的FAISS索引（不落盘）
+    def _write_embedded(self, fresh: Dict[str, Document], vectors: List[List[float]]) -> int:
+        """
+        fresh - new_chunks的返回值
+        vectors - 与fresh顺序一致的向量
+
+        @return 新写入的文档块数量
+        """
+        # 嵌入期间其他批次可能已写入相同内容，写入前再次去重
+        indexed = self._indexed(fresh)
+        pairs = [(h, chunk, vector) for (h, chunk), vector in zip(fresh.items(), vectors) if h not in indexed]
+        if not pairs:
+            return 0
+
+        # 以内容哈希作为docstore id，重复导入时可直接定位
+        ids = [h for h, _, _ in pairs]
+        texts = [chunk.page_content for _, chunk, _ in pairs]
+        metadatas = [chunk.metadata for _, chunk, _ in pairs]
+        vectors = [vector for _, _, vector in pairs]
+
+        if self.vector_store is None:
+            # 新建会覆盖目录中的文档块存储，先关闭仍打开它的共享实例
+            self._release_vector_store()
+            self.vector_store = faiss_io.new_vector_store(self.index_dir, self.embeddings, len(vectors[0]))
+        faiss_io.ensure_writable(self.vector_store)
+        # 文档块正文写入SQLite文档块存储（追加，不重写已有数据）
+        if has_labels(self.vector_store.index):
+            self._add_labeled(texts, vectors, metadatas, ids)
+        else:
+            self.vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        resource_registry.bump_index_version(self.index_dir)
+
+        self.vector_store.docstore.manifest.record(
+            (chunk_hash, chunk_hash, chunk.metadata.get("source")) for chunk_hash, chunk, _ in pairs
+        )
+        return len(pairs)
+
+    # 15.3 向带标签的索引（IVF / IDMap2）追加向量：FAISS.add_embeddings按位置映射长度分配位置，删除后会与已有标签重复
+    def _add_labeled(self, texts: List[str], vectors: List[List[float]], metadatas: List[dict], ids: List[str]):
+        """
+        texts - 文档块正文
+        vectors - 向量
+        metadatas - 元数据
+        ids - docstore id
+        """
+        faiss_io.sync_positions(self.vector_store)
+        positions = self.vector_store.index_to_docstore_id
+        start = positions.next_position()
+        labels = np.arange(start, start + len(ids), dtype=np.int64)
+        self.vector_store.index.add_with_ids(np.array(vectors, dtype=np.float32), labels)
+        self.vector_store.docstore.add({
+            doc_id: Document(id=doc_id, page_content=text, metadata=metadata)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        })
+        positions.update(dict(zip(labels.tolist(), ids)))
+
+    # 16. 按来源同步文档：未变化的文档块跳过，仅替换该来源中已变化的文档块
+    @error_handler()
+    def sync_source(self, source: str, documents: Iterable[Union[Document, Dict[str, Any]]]) -> Dict[str, int]:
+        """
+        source - 文档来源（如文件名），作为替换范围
+        documents - 该来源的最新全部内容
+
+        @return 统计信息 {"added": 新增块数, "removed": 删除块数, "unchanged": 未变化块数}
+        """
+        chunks = []
+        for chunk in self._iter_chunks(documents):
+            chunk.metadata = {**chunk.metadata, "source": source}
+            chunks.append(chunk)
+
+        with self._write_lock:
+            if not self.vector_store:
+                self.vector_store = self.load_vector_store()
+
+            removed = self.remove_stale(source, chunks)
+            added = self._ingest_chunks(chunks)
+            if removed and not added:
+                self._save_vector_store(self.vector_store)
+
+        stats = {"added": added, "removed": removed, "unchanged": len({self._chunk_hash(chunk) for chunk in chunks}) - added}
+        logger.info(f"来源 {source} 同步完成: {stats}")
+        return stats
+
+    # 16.1 删除某来源中已不在最新内容里的文档块（不落盘）
+    def remove_stale(self, source: str, chunks: List[Document]) -> int:
+        """
+        source - 文档来源
+        chunks - 该来源最新的全部文档块
+
+        @return 删除的文档块数量
+        """
+        current_hashes = {self._chunk_hash(chunk) for chunk in chunks}
+        with self._write_lock:
+            if self.vector_store is None:
+                return 0
+            stale_hashes = [h for h in self.vector_store.docstore.manifest.source_hashes(source) if h not in current_hashes]
+            return self._delete_chunks(stale_hashes)
+
+    # 17. 从索引中删除指定哈希的文档块（不落盘）
+    def _delete_chunks(self, chunk_hashes: List[str]) -> int:
+        """
+        chunk_hashes - 待删除文档块的内容哈希
+
+        @return 删除的文档块数量
+        """
+        if not chunk_hashes or self.vector_store is None:
+            return 0
+        ids = list(self._indexed(chunk_hashes).values())
+        if not ids:
+            return 0
+        faiss_io.ensure_writable(self.vector_store)
+        if isinstance(self.vector_store.index, faiss.IndexFlat):
+            self.vector_store.delete(ids)
+        else:
+            self._delete_labeled(ids)
+        # 清单中的条目随文档块一起从文档块存储中删除
+        resource_registry.bump_index_version(self.index_dir)
+        return len(ids)
+
+    # 17.1 非Flat索引按标签删除文档块：其余向量的标签与位置映射保持不变
+    def _delete_labeled(self, ids: List[str]):
+        """
+        IVF原地删除，开销与删除数量成正比；HNSW不支持删除，需重建图结构，开销与语料规模成正比，
+        因此同一来源的全部过期文档块在一次调用中删除
+
+        ids - 待删除文档块的docstore id
+        """
+        faiss_io.sync_positions(self.vector_store)
+        positions = self.vector_store.index_to_docstore_id
+        labels = list(positions.positions_of(ids).values())
+        self.vector_store.index = remove_labels(self.vector_store.index, labels)
+        self.vector_store.docstore.delete(ids)
+        positions.remove(labels)
+
+    # 18. 计算文档块的内容哈希（内容 + 元数据，不含已分块标记）
+    @staticmethod
+    def _chunk_hash(chunk: Document) -> str:
+        """
+        chunk - 文档块
+
+        @return sha256十六进制字符串
+        """
+        payload = json.dumps(
+            {"content": chunk.page_content, "metadata": content_metadata(chunk.metadata)},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # 18.1 文档块id：即内容哈希，新写入的文档块以此作为docstore id，检索结果可据此去重
+    @classmethod
+    def chunk_id(cls, chunk: Document) -> str:
+        return getattr(chunk, "id", None) or cls._chunk_hash(chunk)
+
+    # 19. 旧索引首次加载时建立清单：导入旧版manifest.json，没有时根据文档块存储重建（只执行一次）
+    def _ensure_manifest(self, vector_store: FAISS):
+        """
+        vector_store - 已加载的FAISS向量存储
+        """
+        store = vector_store.docstore
+        if len(store.manifest) or not len(vector_store.index_to_docstore_id):
+            return
+        rows = None
+        try:
+            if self.manifest_path.exists():
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                sources = {h: source for source, hashes in legacy.get("sources", {}).items() for h in hashes}
+                rows = [(h, docstore_id, sources.get(h)) for h, docstore_id in legacy.get("chunks", {}).items()]
+        except Exception as e:
+            logger.warning(f"导入旧版索引清单失败，将根据文档块存储重建: {str(e)}")
+        if rows is None:
+            rows = [
+                (self._chunk_hash(doc), docstore_id, doc.metadata.get("source"))
+                for docstore_id, doc in store.iter_documents()
+            ]
+        store.manifest.record(rows)
+        store.commit()
+        if self.manifest_path.exists():
+            self.manifest_path.unlink()
+        logger.info(f"已建立索引清单，共 {len(rows)} 个文档块")
+
+    # 20. 新数据以Flat索引写入，向量数足够训练时按配置的索引类型重建
+    def _maybe_build_configured_index(self):
+        if FAISS_INDEX_TYPE == "flat" or self.vector_store is None:
+            return
+        index = self.vector_store.index
+        if isinstance(index, faiss.IndexFlat) and index.ntotal >= min_train_size(FAISS_INDEX_TYPE):
+            self.vector_store.index = rebuild_index(index, FAISS_INDEX_TYPE)
+            self.vector_store.mmap_loaded = False
+
+    # 21. 将当前索引重建为指定类型（在全部向量中抽样训练）
+    @error_handler()
+    def rebuild_index(self, index_type: str = FAISS_INDEX_TYPE) -> bool:
+        """
+        index_type - 目标索引类型：flat / ivf_flat / ivf_pq / hnsw
+
+        @return 是否重建成功
+        """
+        with self._write_lock:
+            if not self.vector_store:
+                self.vector_store = self.load_vector_store()
+                if not self.vector_store:
+                    logger.warning("向量存储未初始化，无法重建索引")
+                    return False
+            if self.vector_store.index.ntotal < min_train_size(index_type):
+                logger.warning(f"向量数 {self.vector_store.index.ntotal} 不足以训练 {index_type} 索引")
+                return False
+            self.vector_store.index = rebuild_index(self.vector_store.index, index_type)
+            self.vector_store.mmap_loaded = False
+            resource_registry.bump_index_version(self.index_dir)
+            self._save_vector_store(self.vector_store)
+            return True
+
+    # 21.1 当前索引版本号：写入、删除、重建、清除索引或其他进程更新索引文件后递增
+    @property
+    def index_version(self) -> int:
+        return resource_registry.index_version(self.index_dir)
+
+    # 22. 调整查询时参数（IVF的nprobe、HNSW的efSearch）
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """
+        nprobe - IVF查询时访问的聚类数
+        ef_search - HNSW查询时的候选队列长度
+        """
+        if not self.vector_store:
+            self.vector_store = self.load_vector_store()
+        if self.vector_store:
+            apply_search_params(self.vector_store.index, nprobe, ef_search)
+
+    # 23. 用给定查询评测各索引类型的召回率与延迟
+    def index_report(self, queries: List[str], k: int = 10, candidates: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        queries - 评测用查询文本
+        k - top-k
+        candidates - 待评测配置，格式见index_factory.recall_latency_report
+
+        @return 召回率-延迟报告
+        """
+        if not self.vector_store:
+            self.vector_store = self.load_vector_store()
+        if not self.vector_store or not queries:
+            return []
+        vectors = query_embedding_cache.get_many_or_compute(
+            self.embedding_model_name,
+            queries,
+            self.embeddings.embed_documents,
+            kind="documents"
+        )
+        return recall_latency_report(self.vector_store.index, np.asarray(vectors, dtype=np.float32), k, candidates)
+
+    # 24. 写入一批已在外部嵌入的文档块（流式导入流水线的写入阶段使用，不落盘）
+    def write_embedded(self, fresh: Dict[str, Document], vectors: List[List[float]]) -> int:
+        """
+        fresh - new_chunks的返回值
+        vectors - 与fresh顺序一致的向量
+
+        @return 新写入的文档块数量
+        """
+        with self._write_lock:
+            if not self.vector_store:
+                self.vector_store = self.load_vector_store()
+            return self._write_embedded(fresh, vectors)
+
+    # 25. 持久化当前索引（必要时先按配置的索引类型重建）
+    def persist(self):
+        with self._write_lock:
+            if self.vector_store:
+                self._maybe_build_configured_index()
+                self._save_vector_store(self.vector_store)
@@ -30,6 +30,8 @@ class WeatherService:
             api_key: 高德地图API密钥
         """
         self.api_key = api_key
+        # 复用HTTP连接（智能体被池化复用时，连接随之复用）
+        self.session = requests.Session()
         logger.info("天气查询服务初始化成功")
     
 
@@ -49,7 +51,7 @@ class WeatherService:
                 "output": "JSON"
             }
             
-            response = requests.get(self.GEO_API_URL, params=params)
+            response = self.session.get(self.GEO_API_URL, params=params)
             data = response.json()
             
             if data["status"] == "1" and data["count"] != "0":
@@ -99,7 +101,7 @@ class WeatherService:
                 "output": "JSON"
             }
             
-            response = requests.get(self.WEATHER_API_URL, params=params)
+            response = self.session.get(self.WEATHER_API_URL, params=params)
             data = response.json()
             
             if data["status"] == "1":
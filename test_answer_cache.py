@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+答案缓存测试
+覆盖语义命中的词项重合度检查与缓存结果的副本隔离
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent))
+
+from services.answer_cache import SemanticAnswerCache
+
+SCOPE = ("index", 1)
+VECTOR = [1.0, 0.0, 0.0]
+
+
+def test_entity_swap_is_not_a_hit():
+    """
+    向量完全相同但实体名不同的问题不互相命中
+    """
+    cache = SemanticAnswerCache(max_entries=8, ttl=0, similarity=0.9, min_overlap=0.85)
+    cache.put(SCOPE, "张三参与了哪个项目？", VECTOR, {"final_answer": "飞天项目"})
+
+    assert cache.get(SCOPE, "赵六参与了哪个项目？", VECTOR) is None
+    assert cache.get(SCOPE, "张三 参与了哪个项目", VECTOR)[0] == {"final_answer": "飞天项目"}
+
+
+def test_exact_match_only_by_default():
+    """
+    相似度阈值为1时只命中归一化文本相同的查询
+    """
+    cache = SemanticAnswerCache(max_entries=8, ttl=0, similarity=1.0)
+    cache.put(SCOPE, "What is Project Apollo?", VECTOR, {"final_answer": "a"})
+
+    assert cache.get(SCOPE, "what is  PROJECT apollo?", VECTOR) is not None
+    assert cache.get(SCOPE, "What was Project Apollo?", VECTOR) is None
+
+
+def test_results_are_copied():
+    """
+    修改写入前的结果或命中返回的结果都不影响缓存内容
+    """
+    cache = SemanticAnswerCache(max_entries=8, ttl=0, similarity=1.0)
+    result = {"final_answer": "飞天项目", "reasoning_chain": [{"step": 1}]}
+    cache.put(SCOPE, "张三参与了哪个项目？", VECTOR, result)
+    result["reasoning_chain"].append({"step": 2})
+
+    hit = cache.get(SCOPE, "张三参与了哪个项目？", VECTOR)[0]
+    assert hit["reasoning_chain"] == [{"step": 1}]
+    hit["reasoning_chain"].clear()
+    assert cache.get(SCOPE, "张三参与了哪个项目？", VECTOR)[0]["reasoning_chain"] == [{"step": 1}]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FAISS索引构建测试
+覆盖重建后的稳定标签：删除向量后其余向量的标签不变，新增向量使用新标签
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent))
+
+import faiss
+import numpy as np
+import pytest
+
+from services.index_factory import has_labels, index_labels, min_train_size, rebuild_index, remove_labels
+
+DIM = 16
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).random((200, DIM), dtype=np.float32)
+
+
+@pytest.mark.parametrize("index_type, factory_kwargs", [("ivf_flat", {"nlist": 4}), ("hnsw", {}), ("flat", {})])
+def test_remove_keeps_labels(vectors, index_type, factory_kwargs):
+    """
+    删除部分向量后，其余向量仍按原标签检索到，新增向量可用新标签追加
+    """
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(vectors)
+    index = rebuild_index(flat, index_type, **factory_kwargs)
+    assert has_labels(index)
+
+    index = remove_labels(index, [0, 7])
+    assert index.ntotal == len(vectors) - 2
+    assert not {0, 7} & set(index_labels(index).tolist())
+    assert index.search(vectors[10:11], 1)[1][0][0] == 10
+
+    index.add_with_ids(vectors[:1], np.array([len(vectors)], dtype=np.int64))
+    assert index.search(vectors[:1], 1)[1][0][0] == len(vectors)
+
+
+def test_ivf_remove_is_in_place(vectors):
+    """
+    IVF按标签原地删除，不重建索引
+    """
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(vectors)
+    index = rebuild_index(flat, "ivf_flat", nlist=4)
+    assert remove_labels(index, [3]) is index
+
+
+def test_hnsw_needs_minimum_corpus():
+    """
+    向量数较少时不转换为HNSW
+    """
+    assert min_train_size("hnsw", hnsw_min_size=10000) == 10000
+    assert min_train_size("flat") == 1
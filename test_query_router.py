@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询路由测试
+快速路径只能接收明确的单实体定义类查询，需要多跳推理的查询必须交给规划LLM
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent))
+
+from utils.query_router import is_single_hop, lookup_entity, single_hop_plan
+
+QUERIES_FILE = Path(__file__).parent / "test_queries.txt"
+
+
+def test_sample_queries_go_to_planner():
+    """
+    test_queries.txt 中的查询都涉及关系或属性，不应走快速路径
+    """
+    queries = [line.strip() for line in QUERIES_FILE.read_text(encoding="utf-8").splitlines() if line.strip()]
+    assert queries
+    for query in queries:
+        assert not is_single_hop(query), query
+
+
+def test_relation_and_possessive_queries_go_to_planner():
+    for query in [
+        "张三参与了哪个项目？",
+        "张三的同事参与了什么项目？",
+        "飞天项目的负责人是谁？",
+        "李四属于哪个团队？",
+        "张三和王五在同一个项目吗？",
+        "What is the project of Zhang San?",
+    ]:
+        assert not is_single_hop(query), query
+
+
+def test_entity_lookups_take_fast_path():
+    assert lookup_entity("飞天项目是什么？") == "飞天项目"
+    assert lookup_entity("什么是RAG？") == "RAG"
+    assert lookup_entity("What is FAISS?") == "FAISS"
+    assert single_hop_plan("飞天项目是什么？")["reasoning_steps"][0]["target"] == "飞天项目"
+
+
+def test_fallback_plan_searches_raw_query():
+    query = "张三参与了哪个项目？"
+    assert single_hop_plan(query)["reasoning_steps"][0]["target"] == query
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量存储端到端测试
+用确定性的假嵌入函数导入文档，再经search_documents读回，覆盖SQLite文档块存储的写入与检索路径
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent))
+
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from services.resource_registry import resource_registry
+from services.embedding_cache import query_embedding_cache
+from services.vector_store import VectorStoreService
+
+FAKE_MODEL = "test-fake-embedding"
+
+DOCUMENTS = [
+    Document(page_content="张三参与了飞天项目的研发工作。", metadata={"source": "people.txt"}),
+    Document(page_content="飞天项目由技术部的李四负责。", metadata={"source": "projects.txt"}),
+    Document(page_content="王五是市场部的经理。", metadata={"source": "departments.txt"}),
+]
+
+
+@pytest.fixture
+def vector_store(tmp_path, monkeypatch):
+    """
+    使用假嵌入函数的向量存储服务（索引写入临时目录，查询向量缓存不落盘）
+    """
+    monkeypatch.setitem(resource_registry._embeddings, FAKE_MODEL, DeterministicFakeEmbedding(size=64))
+    monkeypatch.setattr(query_embedding_cache, "persist_path", None)
+    service = VectorStoreService(index_dir=str(tmp_path / "index"), embedding_model=FAKE_MODEL)
+    yield service
+    service.clear_index()
+    # 测试写入的假向量不进入持久化的查询向量缓存
+    query_embedding_cache.clear()
+
+
+def test_ingest_and_search_round_trip(vector_store):
+    """
+    导入的文档块可以经向量检索与BM25检索读回，正文与元数据保持不变
+    """
+    written = vector_store.add_documents_bulk(DOCUMENTS)
+    assert written == len(DOCUMENTS)
+
+    # 假嵌入与语义无关，阈值取负数以取回全部向量检索结果
+    dense = vector_store.search_documents("张三参与了哪个项目？", threshold=-1.0, hybrid=False)
+    assert {doc.page_content for doc in dense} == {doc.page_content for doc in DOCUMENTS}
+
+    hybrid = vector_store.search_documents("王五是市场部的经理。", threshold=-1.0, hybrid=True)
+    assert hybrid[0].page_content == "王五是市场部的经理。"
+    assert hybrid[0].metadata["source"] == "departments.txt"
+
+
+def test_reload_and_skip_indexed_content(vector_store):
+    """
+    持久化后从磁盘重新加载，重复导入相同内容时不再写入
+    """
+    vector_store.add_documents_bulk(DOCUMENTS)
+
+    reloaded = VectorStoreService(index_dir=str(vector_store.index_dir), embedding_model=FAKE_MODEL)
+    assert reloaded.add_documents_bulk(DOCUMENTS) == 0
+    docs = reloaded.search_documents("飞天项目由技术部的李四负责。", threshold=-1.0, hybrid=True)
+    assert docs[0].metadata["source"] == "projects.txt"
+
+
+def test_sync_source_replaces_changed_chunks(vector_store):
+    """
+    按来源同步：未变化的文档块保留，已变化的文档块被替换，清单随之更新
+    """
+    first = [Document(page_content="赵六在研发部工作。"), Document(page_content="研发部位于北京。")]
+    assert vector_store.sync_source("org.txt", first) == {"added": 2, "removed": 0, "unchanged": 0}
+
+    second = [Document(page_content="赵六在研发部工作。"), Document(page_content="研发部位于上海。")]
+    assert vector_store.sync_source("org.txt", second) == {"added": 1, "removed": 1, "unchanged": 1}
+
+    contents = {doc.page_content for doc in vector_store.search_documents("研发部", threshold=-1.0, hybrid=False)}
+    assert contents == {"赵六在研发部工作。", "研发部位于上海。"}
+
+
+def test_sync_source_on_hnsw_index(vector_store, monkeypatch):
+    """
+    重建为HNSW后按来源同步：删除按标签进行，新增向量追加新标签，重新加载后仍可检索
+    """
+    monkeypatch.setattr("services.vector_store.min_train_size", lambda *args, **kwargs: 1)
+    vector_store.add_documents_bulk(DOCUMENTS)
+    vector_store.sync_source("org.txt", [Document(page_content="赵六在研发部工作。"), Document(page_content="研发部位于北京。")])
+    assert vector_store.rebuild_index("hnsw")
+
+    stats = vector_store.sync_source("org.txt", [Document(page_content="赵六在研发部工作。"), Document(page_content="研发部位于上海。")])
+    assert stats == {"added": 1, "removed": 1, "unchanged": 1}
+
+    reloaded = VectorStoreService(index_dir=str(vector_store.index_dir), embedding_model=FAKE_MODEL)
+    docs = reloaded.search_documents("研发部位于上海。", threshold=-1.0, hybrid=False)
+    contents = {doc.page_content for doc in docs}
+    assert "研发部位于上海。" in contents
+    assert "研发部位于北京。" not in contents
+    assert reloaded.vector_store.index.ntotal == len(reloaded.vector_store.index_to_docstore_id) == len(DOCUMENTS) + 2
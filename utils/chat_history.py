@@ -3,79 +3,272 @@
 """
 import json
 import os
-from typing import List, Dict, Optional
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Optional, Iterator
 import pandas as pd
 from datetime import datetime
-from config.settings import HISTORY_FILE, MAX_HISTORY_TURNS
+from utils.context_builder import ContextBuilder
+from config.settings import (
+    HISTORY_FILE,
+    HISTORY_DIR,
+    DEFAULT_SESSION_ID,
+    LEGACY_SESSION_ID,
+    MAX_ACTIVE_SESSIONS,
+    MAX_HISTORY_TURNS,
+    HISTORY_MAX_TOKENS,
+    HISTORY_LOAD_MESSAGES,
+    HISTORY_COMPACT_THRESHOLD,
+    HISTORY_RETAIN_MESSAGES
+)
+
+# 从文件尾部反向读取的块大小
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# 旧版历史只迁移一次，多个会话同时创建时避免重复迁移
+_MIGRATION_LOCK = threading.Lock()
+
+
+class HistoryLog:
+    """
+    追加写入的JSONL对话日志：每条消息一行，写入只追加不重写；
+    行数超过阈值时把较早的消息移入同目录的归档文件（<名称>.archive.jsonl），活跃文件只保留最近的若干条，
+    完整日志 = 归档文件 + 活跃文件，不丢弃任何消息
+    """
+    # 1. 打开日志
+    def __init__(
+        self,
+        path: str,
+        compact_threshold: int = HISTORY_COMPACT_THRESHOLD,
+        retain_messages: int = HISTORY_RETAIN_MESSAGES
+    ):
+        """
+        path - JSONL文件路径
+        compact_threshold - 活跃文件消息数超过该值时压缩，0表示不压缩
+        retain_messages - 压缩后活跃文件保留的最近消息数
+        """
+        self.path = Path(path)
+        self.archive_path = self.path.with_name(self.path.stem + ".archive.jsonl")
+        self.compact_threshold = compact_threshold
+        self.retain_messages = retain_messages
+        self._lock = threading.Lock()
+        self._counts = None
+        self._active_messages = 0
+
+    # 2. 追加一批消息（一次写入）
+    def append(self, messages: List[Dict]) -> None:
+        """
+        messages - 消息列表
+        """
+        if not messages:
+            return
+        lines = "".join(json.dumps(msg, ensure_ascii=False, separators=(",", ":")) + "\n" for msg in messages)
+        with self._lock:
+            counts = self._load_counts()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+            counts["total_messages"] += len(messages)
+            counts["user_messages"] += sum(1 for msg in messages if msg.get("role") == "user")
+            self._active_messages += len(messages)
+            if self.compact_threshold and self._active_messages > self.compact_threshold:
+                self._compact()
+
+    # 3. 读取最近的n条消息（从文件尾部反向读取，不扫描整个文件）
+    def tail(self, n: int) -> List[Dict]:
+        """
+        n - 消息数
+
+        @return 按时间顺序排列的消息列表
+        """
+        if n <= 0 or not self.path.exists():
+            return []
+        with self._lock, open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            # 多读一行，保证第一行完整
+            while position > 0 and data.count(b"\n") <= n:
+                step = min(TAIL_BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        lines = data.splitlines()
+        if position > 0:
+            lines = lines[1:]
+        return [self._parse(line) for line in lines[-n:] if line.strip()]
+
+    # 4. 按时间顺序逐条读取全部消息，包括已归档的消息（导出时使用）
+    def iter_all(self) -> Iterator[Dict]:
+        for path in (self.archive_path, self.path):
+            if not path.exists():
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield self._parse(line)
+
+    # 5. 消息统计（包括已归档的消息）
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._load_counts())
+
+    # 6. 删除日志（包括归档文件）
+    def clear(self) -> None:
+        with self._lock:
+            for path in (self.path, self.archive_path):
+                if path.exists():
+                    os.remove(path)
+            self._counts = {"total_messages": 0, "user_messages": 0}
+            self._active_messages = 0
+
+    # 压缩：较早的消息追加到归档文件，活跃文件写临时文件后原子替换为最近的消息
+    # （两步之间进程中断时归档中可能出现重复消息，但不会丢失消息）
+    def _compact(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = [line for line in f if line.strip()]
+        split = max(len(lines) - self.retain_messages, 0)
+        archived, kept = lines[:split], lines[split:]
+        if not archived:
+            return
+        with open(self.archive_path, 'a', encoding='utf-8') as f:
+            f.writelines(line if line.endswith("\n") else line + "\n" for line in archived)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+        os.replace(tmp_path, self.path)
+        self._active_messages = len(kept)
+
+    # 首次使用时扫描一遍文件得到计数，之后随追加增量更新
+    def _load_counts(self) -> Dict[str, int]:
+        if self._counts is None:
+            counts = {"total_messages": 0, "user_messages": 0}
+            self._active_messages = 0
+            for path in (self.archive_path, self.path):
+                if not path.exists():
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            counts["total_messages"] += 1
+                            counts["user_messages"] += self._parse(line).get("role") == "user"
+                            self._active_messages += path == self.path
+            self._counts = counts
+        return self._counts
+
+    @staticmethod
+    def _parse(line) -> Dict:
+        try:
+            return json.loads(line)
+        except ValueError:
+            # 进程中断可能留下不完整的最后一行
+            return {}
+
 
 class ChatHistoryManager:
     """
-    对话历史管理器类
+    对话历史管理器类（一个实例对应一个会话）
     """
-    def __init__(self):
-        """初始化对话历史管理器"""
-        self.history: List[Dict] = self.load_history()
+    def __init__(self, session_id: str = DEFAULT_SESSION_ID, history_dir: str = HISTORY_DIR):
+        """
+        初始化对话历史管理器
+
+        session_id - 会话id，每个会话的历史写入独立文件
+        history_dir - 历史文件目录
+        """
+        self.session_id = session_id
+        Path(history_dir).mkdir(parents=True, exist_ok=True)
+        self.log = HistoryLog(Path(history_dir) / f"{_session_file_stem(session_id)}.jsonl")
+        # 同一会话的读写互斥，不同会话互不阻塞
+        self._lock = threading.RLock()
+        self._history: Optional[List[Dict]] = None
+        self._migrate_legacy_history()
+
+    # 0. 对话历史（首次访问时才从文件尾部加载）
+    @property
+    def history(self) -> List[Dict]:
+        with self._lock:
+            if self._history is None:
+                self._history = self.load_history()
+            return self._history
     
-    # 1. 从文件加载对话历史
+    # 1. 从文件加载对话历史（只读取尾部最近的消息）
     def load_history(self) -> List[Dict]:
         """
         Returns:
             List[Dict]: 对话历史记录列表
         """
         try:
-            if os.path.exists(HISTORY_FILE):
-                with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return [msg for msg in self.log.tail(HISTORY_LOAD_MESSAGES) if msg]
         except Exception as e:
             print(f"加载对话历史时出错: {str(e)}")
         return []
     
-    # 2. 保存对话历史到文件
-    def save_history(self) -> None:
-        try:
-            with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存对话历史时出错: {str(e)}")
-    
-    # 3. 添加新消息到历史记录
+    # 2. 添加新消息到历史记录（追加写入文件，无需单独保存）
     def add_message(self, role: str, content: str) -> None:
         """
         Args:
             role (str): 消息角色 ('user' 或 'assistant')
             content (str): 消息内容
         """
-        self.history.append({"role": role, "content": content})
-        self.save_history()
+        self.add_messages([{"role": role, "content": content}])
+
+    # 2.1 批量添加消息（一轮对话的多条消息只写一次文件）
+    def add_messages(self, messages: List[Dict]) -> None:
+        """
+        Args:
+            messages (List[Dict]): 消息列表，每条包含role与content
+        """
+        with self._lock:
+            history = self.history
+            history.extend(messages)
+            # 内存中只保留最近的消息，与启动时加载的范围一致
+            if len(history) > HISTORY_LOAD_MESSAGES:
+                del history[:-HISTORY_LOAD_MESSAGES]
+            try:
+                self.log.append(messages)
+            except Exception as e:
+                print(f"保存对话历史时出错: {str(e)}")
     
-    # 4. 清空对话历史
+    # 3. 清空对话历史
     def clear_history(self) -> None:
-        self.history = []
-        if os.path.exists(HISTORY_FILE):
-            os.remove(HISTORY_FILE)
-    
-    # 5. 获取格式化的对话历史
-    def get_formatted_history(self, max_turns: int = MAX_HISTORY_TURNS) -> str:
+        with self._lock:
+            self._history = []
+            self.log.clear()
+
+    # 4. 获取格式化的对话历史
+    def get_formatted_history(self, max_turns: int = MAX_HISTORY_TURNS, max_tokens: int = HISTORY_MAX_TOKENS) -> str:
         """
         Args:
             max_turns (int): 最大保留的对话轮数
+            max_tokens (int): token预算，超出时优先截断、丢弃较早的消息
             
         Returns:
             str: 格式化后的对话历史
         """
-        if not self.history:
+        # 检索文档与思考过程不进入历史提示词
+        history = [msg for msg in self.history if msg["role"] in ("user", "assistant")]
+        if not history:
             return ""
         
-        recent_history = self.history[-max_turns*2:] if len(self.history) > max_turns*2 else self.history
+        recent_history = history[-max_turns*2:] if len(history) > max_turns*2 else history
         
-        formatted_history = "以下是之前的对话历史：\n"
+        lines = []
         for msg in recent_history:
             role = "用户" if msg["role"] == "user" else "助手"
-            formatted_history += f"{role}: {msg['content']}\n"
+            lines.append(f"{role}: {msg['content']}")
         
-        return formatted_history
+        # 从最新的消息开始放入预算，再恢复时间顺序
+        kept = ContextBuilder(max_tokens, separator="\n").select(reversed(lines))
+        if not kept:
+            return ""
+        return "以下是之前的对话历史：\n" + "\n".join(reversed(kept)) + "\n"
     
-    # 6. 导出对话历史为CSV文件
+    # 5. 导出对话历史为CSV文件
     def export_to_csv(self) -> Optional[bytes]:
         """
         导出对话历史为CSV文件
@@ -84,13 +277,13 @@ class ChatHistoryManager:
             Optional[bytes]: CSV文件内容，如果导出失败则返回None
         """
         try:
-            df = pd.DataFrame(self.history)
+            df = pd.DataFrame([msg for msg in self.log.iter_all() if msg])
             return df.to_csv(index=False).encode('utf-8')
         except Exception as e:
             print(f"导出对话历史时出错: {str(e)}")
             return None
     
-    # 7. 获取对话历史统计信息
+    # 6. 获取对话历史统计信息
     def get_stats(self) -> Dict[str, int]:
         """
         获取对话历史统计信息
@@ -98,9 +291,86 @@ class ChatHistoryManager:
         Returns:
             Dict[str, int]: 包含总消息数和用户消息数的字典
         """
-        total_messages = len(self.history)
-        user_messages = sum(1 for msg in self.history if msg["role"] == "user")
-        return {
-            "total_messages": total_messages,
-            "user_messages": user_messages
-        } 
\ No newline at end of file
+        return self.log.counts()
+
+    # 7. 将会话目录之外的旧版全局历史文件（JSON或JSONL）一次性迁移到固定的旧版会话
+    #    （不并入任何随机生成的浏览器会话，旧历史只能通过旧版会话id访问）
+    def _migrate_legacy_history(self) -> None:
+        legacy_jsonl = Path(HISTORY_FILE)
+        legacy_json = legacy_jsonl.with_suffix(".json")
+        if not (legacy_jsonl.exists() or legacy_json.exists()):
+            return
+        target = HistoryLog(self.log.path.with_name(f"{_session_file_stem(LEGACY_SESSION_ID)}.jsonl"))
+        with _MIGRATION_LOCK:
+            if target.path.exists():
+                return
+            try:
+                if legacy_jsonl.exists() and legacy_jsonl.resolve() != target.path.resolve():
+                    os.replace(legacy_jsonl, target.path)
+                elif legacy_json.exists():
+                    with open(legacy_json, 'r', encoding='utf-8') as f:
+                        target.append(json.load(f))
+                    os.remove(legacy_json)
+                else:
+                    return
+                print(f"旧版对话历史已迁移到会话: {LEGACY_SESSION_ID}")
+            except Exception as e:
+                print(f"迁移对话历史时出错: {str(e)}")
+
+
+class ChatHistoryStore:
+    """
+    按会话id管理对话历史：同一会话在进程内共享一个管理器，
+    活跃会话数超过上限时淘汰最久未使用的会话（历史已落盘，再次访问时重新加载尾部）
+    """
+    def __init__(self, history_dir: str = HISTORY_DIR, max_sessions: int = MAX_ACTIVE_SESSIONS):
+        """
+        history_dir - 历史文件目录
+        max_sessions - 内存中保留的最大会话数
+        """
+        self.history_dir = history_dir
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ChatHistoryManager]" = OrderedDict()
+
+    # 1. 获取会话的历史管理器（不存在时创建，不读取文件）
+    def get(self, session_id: str = DEFAULT_SESSION_ID) -> ChatHistoryManager:
+        """
+        session_id - 会话id
+
+        @return 该会话的对话历史管理器
+        """
+        with self._lock:
+            manager = self._sessions.get(session_id)
+            if manager is None:
+                manager = self._sessions[session_id] = ChatHistoryManager(session_id, self.history_dir)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return manager
+
+    # 2. 从内存中移除会话（不删除文件）
+    def evict(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    # 3. 当前内存中的会话数
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# Web界面会话id的格式校验：uuid4十六进制（32位）或旧版会话id，URL中的其他值不作为会话id使用
+def is_valid_session_id(session_id: Optional[str]) -> bool:
+    return session_id == LEGACY_SESSION_ID or (bool(session_id) and re.fullmatch(r"[0-9a-f]{32}", session_id) is not None)
+
+
+# 会话id转为安全的文件名
+def _session_file_stem(session_id: str) -> str:
+    if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", session_id):
+        return session_id
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+
+
+# 进程级共享的会话历史存储（Streamlit各会话与重跑之间复用）
+history_store = ChatHistoryStore()
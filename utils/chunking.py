@@ -0,0 +1,67 @@
+"""
+文档分块模块
+全项目唯一的分块入口：分块结果在元数据中带有已分块标记，
+后续环节遇到带标记的文档块直接透传，保证每段文本只被分割一次
+"""
+from typing import Any, Dict, Iterable, Iterator, List
+
+from langchain.schema import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from config.settings import CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS
+
+# 已分块标记的元数据键（可随文档块进出进程池、解析缓存与文档块存储）
+CHUNKED_KEY = "chunked"
+
+
+# 1. 创建文本分割器（子进程中同样使用）
+def build_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=SEPARATORS,
+        length_function=len,
+        is_separator_regex=False
+    )
+
+
+# 2. 判断文档是否已经分块
+def is_chunked(doc: Document) -> bool:
+    return doc.metadata.get(CHUNKED_KEY) is True
+
+
+# 3. 为文档块打上已分块标记
+def mark_chunked(docs: List[Document]) -> List[Document]:
+    """
+    docs - 分割器产出的文档块
+
+    @return 原列表（元数据已原地更新）
+    """
+    for doc in docs:
+        doc.metadata = {**doc.metadata, CHUNKED_KEY: True}
+    return docs
+
+
+# 4. 逐个分块：已分块的文档原样透传，其余文档分割后打标记
+def iter_split(docs: Iterable[Document], splitter: RecursiveCharacterTextSplitter = None) -> Iterator[Document]:
+    """
+    docs - 文档可迭代对象（可混合原始文档与已分块文档）
+    splitter - 文本分割器，默认使用build_text_splitter的配置
+
+    @return 文档块生成器，保持输入顺序
+    """
+    splitter = splitter or build_text_splitter()
+    for doc in docs:
+        if is_chunked(doc):
+            yield doc
+        else:
+            yield from mark_chunked(splitter.split_documents([doc]))
+
+
+# 5. 一次性分块
+def split_once(docs: Iterable[Document], splitter: RecursiveCharacterTextSplitter = None) -> List[Document]:
+    return list(iter_split(docs, splitter))
+
+
+# 6. 去掉已分块标记后的元数据（用于计算内容哈希，标记不影响去重）
+def content_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in metadata.items() if key != CHUNKED_KEY}
@@ -0,0 +1,147 @@
+"""
+上下文组装模块
+按token预算拼接检索文档块、对话历史等提示词片段：
+去除重复与重叠的文档块，按价值从高到低放入，预算不足时截断最后一个片段、丢弃其余片段
+"""
+import re
+from typing import Iterable, List, Tuple
+
+from config.settings import TOKEN_ENCODING, CONTEXT_MIN_TRUNCATE_TOKENS, CHUNK_OVERLAP
+
+try:
+    import tiktoken
+    _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+except Exception:
+    # 未安装tiktoken或编码表不可用时使用字符估算
+    _encoder = None
+
+# 中日韩字符（约1个token/字）
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+# 其余字符约4个字符/token
+_CHARS_PER_TOKEN = 4
+
+# 判定为重叠所需的最少重复字符数（分块器的chunk_overlap会在相邻块之间产生重复文本）
+MIN_OVERLAP_CHARS = 20
+
+
+# 1. 统计token数
+def count_tokens(text: str) -> int:
+    """
+    text - 文本
+
+    @return token数（有tiktoken时精确计算，否则按字符估算，中文偏保守）
+    """
+    if not text:
+        return 0
+    if _encoder is not None:
+        return len(_encoder.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+# 2. 将文本截断到指定token数以内
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    text - 文本
+    max_tokens - token上限
+
+    @return 截断后的文本（未超出时原样返回）
+    """
+    if max_tokens <= 0:
+        return ""
+    if _encoder is not None:
+        tokens = _encoder.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else _encoder.decode(tokens[:max_tokens])
+    # 二分查找满足预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+# 3. 去除重复与重叠的文档块
+def dedupe_chunks(texts: Iterable[str]) -> List[str]:
+    """
+    texts - 按价值从高到低排列的文档块
+
+    @return 去重后的文档块：完全相同或被已保留块包含的块被丢弃，
+            与已保留块首尾重叠的部分被裁掉，顺序不变
+    """
+    return [text for _, text in dedupe_indexed(texts)]
+
+
+# 3.1 去重并保留每个文档块在输入中的位置（调用方需要关联元数据时使用）
+def dedupe_indexed(texts: Iterable[str]) -> List[Tuple[int, str]]:
+    kept: List[Tuple[int, str]] = []
+    for index, text in enumerate(texts):
+        text = text.strip()
+        if not text or any(text in other for _, other in kept):
+            continue
+        for _, other in kept:
+            text = _strip_overlap(other, text)
+        if text:
+            kept.append((index, text))
+    return kept
+
+
+def _strip_overlap(previous: str, text: str) -> str:
+    # 裁掉text开头与previous结尾重复的部分（或text结尾与previous开头重复的部分），重叠长度不超过分块重叠
+    longest = min(len(previous), len(text), CHUNK_OVERLAP)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:].strip()
+        if previous.startswith(text[-size:]):
+            return text[:-size].strip()
+    return text
+
+
+class ContextBuilder:
+    """
+    按token预算组装上下文
+    """
+    # 1. 初始化
+    def __init__(self, max_tokens: int, separator: str = "\n\n", min_truncate_tokens: int = CONTEXT_MIN_TRUNCATE_TOKENS):
+        """
+        max_tokens - token预算
+        separator - 片段之间的分隔符（计入预算）
+        min_truncate_tokens - 剩余预算少于该值时不再截断放入，直接丢弃
+        """
+        self.max_tokens = max_tokens
+        self.separator = separator
+        self.min_truncate_tokens = min_truncate_tokens
+
+    # 2. 选取片段
+    def select(self, pieces: Iterable[str]) -> List[str]:
+        """
+        pieces - 按价值从高到低排列的片段
+
+        @return 预算内保留的片段（顺序不变，最后一个可能被截断）
+        """
+        selected: List[str] = []
+        remaining = self.max_tokens
+        separator_tokens = count_tokens(self.separator)
+        for piece in pieces:
+            cost = count_tokens(piece) + (separator_tokens if selected else 0)
+            if cost <= remaining:
+                selected.append(piece)
+                remaining -= cost
+                continue
+            # 预算不足：截断当前片段后停止，价值更低的片段全部丢弃
+            available = remaining - (separator_tokens if selected else 0)
+            if available >= self.min_truncate_tokens:
+                selected.append(truncate_to_tokens(piece, available))
+            break
+        return selected
+
+    # 3. 组装文档块上下文：先去重再按预算选取
+    def build_chunks(self, texts: Iterable[str]) -> str:
+        """
+        texts - 按相关度从高到低排列的文档块
+
+        @return 拼接后的上下文
+        """
+        return self.separator.join(self.select(dedupe_chunks(texts)))
@@ -1,26 +1,53 @@
 """
 文档处理模块
 """
-import os
-import hashlib
-import json
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Iterable, Iterator, Tuple, Sequence
 import logging
 from pathlib import Path
-import io
+import time
 import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
 from utils.decorators import error_handler, log_execution
-from datetime import datetime
-from config.settings import CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS
+from utils.chunking import build_text_splitter, mark_chunked
+from utils.parse_cache import ParseCache
+from utils.file_source import FileSource
+from config.settings import PDF_PAGES_PER_TASK
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
 from langchain.schema import Document
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+# 解析PDF的一段页面并分块（模块级函数，可在进程池中执行）
+def _parse_pdf_pages(source: FileSource, start: int, end: int) -> Tuple[List[Document], float]:
+    """
+    source - PDF文件来源（路径来源在子进程中直接打开文件，不传输文件内容）
+    start - 起始页（含）
+    end - 结束页（不含）
+
+    @return (分块后的文档列表, 解析耗时秒数)
+    """
+    started = time.perf_counter()
+    with source.open() as stream:
+        reader = PdfReader(stream)
+        pages = [
+            Document(page_content=reader.pages[i].extract_text() or "", metadata={"source": source.name, "page": i})
+            for i in range(start, end)
+        ]
+    # 分割器逐页处理，按页段并行后拼接的结果与整本分割一致；结果带已分块标记，入库时不再分割
+    return mark_chunked(build_text_splitter().split_documents(pages)), time.perf_counter() - started
+
+
+# 解析进程池的启动方式：不fork当前进程（避免继承父进程内存中的上传内容、模型与锁）
+def _pool_context():
+    return get_context("forkserver" if "forkserver" in get_all_start_methods() else "spawn")
+
+
 class DocumentProcessor:
     """
     文档处理器类，用于处理PDF文档
@@ -35,54 +62,40 @@ class DocumentProcessor:
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         self.max_workers = max_workers
+        self.parse_cache = ParseCache(self.cache_dir)
         
         # 初始化文本分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=SEPARATORS,
-            length_function=len,
-            is_separator_regex=False
-        )
+        self.text_splitter = build_text_splitter()
     
-    # 2. 获取缓存文件路径
-    def _get_cache_path(self, file_content: bytes, file_name: str) -> Path:
+    # 2. 计算缓存键（流式哈希，不复制文件内容）
+    def _get_cache_key(self, source: FileSource) -> str:
         """
-        file_content - 文件内容
-        file_name - 文件名
+        source - 文件来源
 
-        @return 缓存文件路径
+        @return 缓存键
         """
-        cache_key = hashlib.md5(file_content + file_name.encode()).hexdigest()
-        return self.cache_dir / f"{cache_key}.json"
+        return source.content_hash()
     
     # 3. 从缓存加载处理结果
-    def _load_from_cache(self, cache_path: str) -> Optional[List[Document]]:
+    def _load_from_cache(self, cache_key: str) -> Optional[Sequence[Document]]:
         """
-        @param {str} cache_path - 缓存文件路径
-        @return {Optional[List[Document]]} 处理结果，如果缓存不存在则返回None
+        @param {str} cache_key - 缓存键
+        @return {Optional[Sequence[Document]]} 惰性解码的处理结果，如果缓存不存在则返回None
         """
         try:
-            path = Path(cache_path)
-            if path.exists():
-                with open(path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return [Document(**doc) for doc in data]
+            return self.parse_cache.get(cache_key)
         except Exception as e:
             logger.warning(f"从缓存加载失败: {str(e)}")
         return None
     
     # 4. 保存处理结果到缓存
-    def _save_to_cache(self, cache_path: Path, documents: List[Document]):
+    def _save_to_cache(self, cache_key: str, documents: List[Document]):
         """
-        @param {Path} cache_path - 缓存文件路径
+        @param {str} cache_key - 缓存键
         @param {List[Document]} documents - 处理结果
         """
         try:
-            # 将Document对象转换为可序列化的字典
-            docs_data = [doc.dict() for doc in documents]
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(docs_data, f, ensure_ascii=False, indent=2)
+            self.parse_cache.put(cache_key, documents)
         except Exception as e:
             logger.warning(f"保存到缓存失败: {str(e)}")
     
@@ -90,41 +103,32 @@ class DocumentProcessor:
     # 5. 处理PDF文件
     @error_handler()
     @log_execution
-    def _process_pdf(self, file_content: bytes, file_name: str) -> List[Document]:
+    def _process_pdf(self, source: FileSource) -> List[Document]:
         """
-        file_content - PDF文件内容
-        file_name - PDF文件名
+        source - PDF文件来源
 
         @return 处理后的文档列表
         """
+        file_name = source.name
         # 检查缓存
-        cache_path = self._get_cache_path(file_content, file_name)
-        cached_docs = self._load_from_cache(str(cache_path))
+        cache_key = self._get_cache_key(source)
+        cached_docs = self._load_from_cache(cache_key)
         if cached_docs is not None:
             logger.info(f"从缓存加载文件: {file_name}")
-            return cached_docs
+            return list(cached_docs)
         
         # 处理PDF
         logger.info(f"处理文件: {file_name}")
         
         try:
-            # 创建临时文件，使用上下文管理器自动清理
-            with tempfile.NamedTemporaryFile(suffix='.pdf') as temp_file:
-                temp_file.write(file_content)
-                temp_file.flush()
-                
-                # 使用临时文件加载PDF
-                loader = PyPDFLoader(temp_file.name)
-                documents = loader.load()
-                
-                # 使用文本分割器分割文档
-                split_docs = self.text_splitter.split_documents(documents)
-                
-                # 保存到缓存
-                if split_docs:
-                    self._save_to_cache(cache_path, split_docs)
-                
-                return split_docs
+            # 直接从文件路径或内存缓冲区解析全部页面并分块
+            split_docs, _ = _parse_pdf_pages(source, 0, self._page_count(source))
+            
+            # 保存到缓存
+            if split_docs:
+                self._save_to_cache(cache_key, split_docs)
+            
+            return split_docs
                 
         except Exception as e:
             logger.error(f"处理PDF文件失败: {str(e)}")
@@ -134,49 +138,172 @@ class DocumentProcessor:
     # 6. 清除所有缓存
     def clear_cache(self):
         try:
+            self.parse_cache.clear()
+            # 旧版JSON缓存（文件名为md5），同目录下的其他缓存文件不受影响
             for file in self.cache_dir.glob("*.json"):
-                file.unlink()
+                if len(file.stem) == 32 and all(c in "0123456789abcdef" for c in file.stem):
+                    file.unlink()
             logger.info("缓存已清除")
         except Exception as e:
             logger.error(f"清除缓存失败: {str(e)}")
             raise
 
+    # 6.1 解析缓存统计（命中率、读写字节数、淘汰次数、当前大小）
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.parse_cache.stats()
+
 
     # 7. 处理上传的文件，支持多种文件类型
     @error_handler()
     @log_execution
     def process_file(self, uploaded_file_or_content, file_name: str = None) -> Union[str, List[Document]]:
         """
-        uploaded_file_or_content - Streamlit上传的文件对象或文件内容
+        uploaded_file_or_content - Streamlit上传的文件对象、文件路径或文件内容
         file_name - 文件名，当第一个参数为文件内容时需要提供
 
-        @return  处理结果，可能是文本内容或Document对象列表
+        @return  处理结果：PDF为已分块的Document列表（保留页码与来源），TXT为文本内容
         """
         try:
-            # 判断输入类型
-            if hasattr(uploaded_file_or_content, 'getvalue') and hasattr(uploaded_file_or_content, 'name'):
-                # Streamlit上传的文件对象
-                file_content = uploaded_file_or_content.getvalue()
-                file_name = uploaded_file_or_content.name
-            elif isinstance(uploaded_file_or_content, bytes) and file_name:
-                # 直接传入的文件内容和文件名
-                file_content = uploaded_file_or_content
-            else:
-                raise ValueError("参数错误：需要提供有效的文件对象或文件内容和文件名")
+            # 判断输入类型：Streamlit上传的文件对象、文件路径或文件内容和文件名
+            source = FileSource.from_any(uploaded_file_or_content, file_name)
             
             # 根据文件类型进行特定处理
-            if file_name.lower().endswith('.pdf'):
-                docs = self._process_pdf(file_content, file_name)
-                # 如果是从Streamlit上传的文件，返回文本内容，否则返回文档对象
-                if hasattr(uploaded_file_or_content, 'getvalue'):
-                    return "\n\n".join(doc.page_content for doc in docs)
-                return docs
-            elif file_name.lower().endswith('.txt'):
-                return file_content.decode('utf-8')
+            if source.suffix == '.pdf':
+                # 返回已分块的文档，不再拼接为文本后重新分块
+                return self._process_pdf(source)
+            elif source.suffix == '.txt':
+                return source.read_text()
             else:
-                return f"不支持的文件类型: {file_name}"
+                return f"不支持的文件类型: {source.name}"
             
         except Exception as e:
             logger.error(f"处理文件失败: {str(e)}")
             raise Exception(f"处理文件失败: {str(e)}")
-            
\ No newline at end of file
+
+
+    # 8. 并行处理多个文件：PDF解析分发到进程池（大文件按页段拆分），按输入顺序流式返回
+    def process_files(self, files: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        """
+        files - Streamlit上传的文件对象、(文件内容bytes, 文件名) 元组、本地文件路径或FileSource，可以是惰性生成器
+
+        @return 按输入顺序逐个产出的结果字典：
+                file_name - 文件名
+                documents - Document列表：PDF已分块并带已分块标记，TXT为整篇原始文档（失败时为空）
+                error - 错误信息（成功时为None）
+                from_cache - 是否命中缓存
+                parse_seconds - 各页段解析耗时之和
+                elapsed_seconds - 从开始处理到该文件结果就绪的耗时
+        """
+        started = time.perf_counter()
+        # 同时在途的文件数有上限，输入可以是任意长的生成器，内存占用保持平稳
+        window = max(1, self.max_workers * 2)
+        items = iter(files)
+        pending = deque()
+        executor = None
+        try:
+            item = next(items, None)
+            while item is not None:
+                job = self._plan_file(item)
+                item = next(items, None)
+                if job["ranges"]:
+                    # 只有一个文件且只有一个页段时无需进程池开销
+                    if executor is None and (len(job["ranges"]) > 1 or item is not None):
+                        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_pool_context())
+                    if executor:
+                        self._spill_upload(job)
+                    job["futures"] = [
+                        executor.submit(_parse_pdf_pages, job["source"], start, end)
+                        for start, end in job["ranges"]
+                    ] if executor else None
+                pending.append(job)
+                while len(pending) > window:
+                    yield self._collect_job(pending.popleft(), started)
+
+            while pending:
+                yield self._collect_job(pending.popleft(), started)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            for job in pending:
+                self._remove_spill(job)
+
+    # 8.0 上传内容写入临时文件一次，各页段任务只传路径（否则每个任务都要序列化整份文件内容）
+    @staticmethod
+    def _spill_upload(job: Dict[str, Any]):
+        source = job["source"]
+        if source.data is None:
+            return
+        with tempfile.NamedTemporaryFile(suffix=source.suffix, delete=False) as f:
+            f.write(source.data)
+        job["source"] = FileSource(source.name, path=f.name)
+        job["spill_path"] = Path(f.name)
+
+    @staticmethod
+    def _remove_spill(job: Dict[str, Any]):
+        spill_path = job.pop("spill_path", None)
+        if spill_path is not None:
+            spill_path.unlink(missing_ok=True)
+
+    # 8.1 准备单个文件：检查缓存、划分页段（路径来源不预先读入内存）
+    def _plan_file(self, item: Any) -> Dict[str, Any]:
+        source = FileSource.from_any(item)
+        file_name = source.name
+        job = {"file_name": file_name, "source": source, "ranges": [], "documents": [], "error": None, "from_cache": False}
+
+        try:
+            if source.suffix == '.txt':
+                job["documents"] = [Document(page_content=source.read_text(), metadata={"source": file_name})]
+            elif source.suffix == '.pdf':
+                job["cache_key"] = self._get_cache_key(source)
+                cached_docs = self._load_from_cache(job["cache_key"])
+                if cached_docs is not None:
+                    job["documents"], job["from_cache"] = cached_docs, True
+                else:
+                    page_count = self._page_count(source)
+                    job["ranges"] = [
+                        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+                        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+                    ]
+            else:
+                job["error"] = f"不支持的文件类型: {file_name}"
+        except Exception as e:
+            job["error"] = f"处理文件失败: {str(e)}"
+        return job
+
+    # 8.2 读取PDF页数（只解析交叉引用表，不提取文本）
+    @staticmethod
+    def _page_count(source: FileSource) -> int:
+        with source.open() as stream:
+            return len(PdfReader(stream).pages)
+
+    # 8.3 等待单个文件的全部页段完成并组装结果
+    def _collect_job(self, job: Dict[str, Any], started: float) -> Dict[str, Any]:
+        parse_seconds = 0.0
+        if job["ranges"] and not job["error"]:
+            try:
+                if job["futures"] is None:
+                    parts = [_parse_pdf_pages(job["source"], start, end) for start, end in job["ranges"]]
+                else:
+                    parts = [future.result() for future in job["futures"]]
+                for docs, seconds in parts:
+                    job["documents"].extend(docs)
+                    parse_seconds += seconds
+                if job["documents"]:
+                    self._save_to_cache(job["cache_key"], job["documents"])
+            except Exception as e:
+                job["documents"] = []
+                job["error"] = f"处理PDF文件失败: {str(e)}"
+            finally:
+                self._remove_spill(job)
+
+        job["source"] = None
+        result = {
+            "file_name": job["file_name"],
+            "documents": job["documents"],
+            "error": job["error"],
+            "from_cache": job["from_cache"],
+            "parse_seconds": parse_seconds,
+            "elapsed_seconds": time.perf_counter() - started
+        }
+        logger.info(f"文件处理完成: {job['file_name']}，分块数 {len(job['documents'])}，解析耗时 {parse_seconds:.2f}s")
+        return result
@@ -0,0 +1,91 @@
+"""
+文件来源模块
+统一表示本地文件路径与内存中的上传内容：以流的方式读取与哈希，
+不拼接、不复制文件内容（只有分发到解析进程池时，上传内容才写入一次临时文件）
+"""
+import io
+import hashlib
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Union
+
+# 流式读取的块大小
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class FileSource:
+    """
+    文件来源：path与data二选一，可序列化后传给解析子进程
+    （路径来源只传路径，子进程自行打开文件）
+    """
+    # 1. 初始化
+    def __init__(self, name: str, path: Optional[Union[str, Path]] = None, data: Optional[bytes] = None):
+        """
+        name - 文件名（写入元数据source，并参与缓存键计算）
+        path - 本地文件路径
+        data - 内存中的文件内容
+        """
+        if (path is None) == (data is None):
+            raise ValueError("path与data必须且只能提供一个")
+        self.name = name
+        self.path = Path(path) if path is not None else None
+        self.data = data
+
+    # 2. 从Streamlit上传对象、(bytes, 文件名) 元组、bytes或本地路径构造
+    @classmethod
+    def from_any(cls, item: Any, name: str = None) -> "FileSource":
+        """
+        item - 文件来源
+        name - 文件名，item为bytes时必须提供
+
+        @return FileSource
+        """
+        if isinstance(item, FileSource):
+            return item
+        if hasattr(item, 'getvalue') and hasattr(item, 'name'):
+            # UploadedFile是BytesIO，getvalue()返回其内部缓冲区而不复制
+            return cls(name or item.name, data=item.getvalue())
+        if isinstance(item, (str, Path)):
+            return cls(name or str(item), path=item)
+        if isinstance(item, tuple):
+            data, name = item
+            return cls(name, data=data)
+        if isinstance(item, (bytes, bytearray)) and name:
+            return cls(name, data=bytes(item))
+        raise ValueError("参数错误：需要提供有效的文件对象、文件路径或文件内容和文件名")
+
+    # 3. 以二进制流打开（路径来源按需读取，内存来源共享缓冲区）
+    def open(self) -> BinaryIO:
+        if self.path is not None:
+            return open(self.path, 'rb')
+        return io.BytesIO(self.data)
+
+    # 4. 文件大小（字节）
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path is not None else len(self.data)
+
+    # 5. 流式计算内容哈希（文件名一并参与）
+    def content_hash(self) -> str:
+        """
+        @return blake2b十六进制摘要
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        if self.path is not None:
+            with self.open() as stream:
+                for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b""):
+                    hasher.update(block)
+        else:
+            hasher.update(memoryview(self.data))
+        hasher.update(self.name.encode())
+        return hasher.hexdigest()
+
+    # 6. 读取为文本
+    def read_text(self, encoding: str = 'utf-8') -> str:
+        if self.path is not None:
+            return self.path.read_text(encoding=encoding)
+        return self.data.decode(encoding)
+
+    # 7. 按文件名判断类型
+    @property
+    def suffix(self) -> str:
+        return Path(self.name).suffix.lower()
@@ -0,0 +1,191 @@
+"""
+解析结果缓存模块
+每个文件的分块结果存为一个zstd压缩的二进制文件：文档块逐条以长度前缀编码，
+命中时只解压一次，Document对象在访问到对应位置时才创建；
+缓存目录总大小超过上限时按最近使用时间淘汰
+"""
+import os
+import json
+import struct
+import threading
+import logging
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import zstandard
+from langchain.schema import Document
+from config.settings import PARSE_CACHE_MAX_BYTES, PARSE_CACHE_LEVEL
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".chunks"
+MAGIC = b"DPC1"
+# 文档块数量
+_HEADER = struct.Struct("<4sI")
+# 单条记录：正文字节数、元数据字节数
+_RECORD = struct.Struct("<II")
+
+
+class LazyChunks(Sequence):
+    """
+    惰性解码的文档块序列：按位置首次访问时才创建Document，之后复用同一对象
+    """
+    def __init__(self, buffer: bytes, offsets: List[int]):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._docs: List[Optional[Document]] = [None] * len(offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        doc = self._docs[index]
+        if doc is None:
+            offset = self._offsets[index]
+            content_len, metadata_len = _RECORD.unpack_from(self._buffer, offset)
+            start = offset + _RECORD.size
+            content = self._buffer[start:start + content_len].decode("utf-8")
+            metadata = json.loads(self._buffer[start + content_len:start + content_len + metadata_len])
+            doc = self._docs[index] = Document(page_content=content, metadata=metadata)
+        return doc
+
+
+class ParseCache:
+    """
+    文档解析结果缓存（进程内线程安全）
+    """
+    # 1. 初始化缓存
+    def __init__(self, cache_dir: Union[str, Path], max_bytes: int = PARSE_CACHE_MAX_BYTES, level: int = PARSE_CACHE_LEVEL):
+        """
+        cache_dir - 缓存目录
+        max_bytes - 缓存文件总大小上限，0表示不限制
+        level - zstd压缩级别
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "bytes_read": 0, "bytes_written": 0}
+
+    # 2. 缓存键对应的文件路径
+    def path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{CACHE_SUFFIX}"
+
+    # 3. 读取缓存
+    def get(self, key: str) -> Optional[LazyChunks]:
+        """
+        key - 缓存键
+
+        @return 惰性解码的文档块序列，未命中或文件损坏时返回None
+        """
+        path = self.path_for(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self._count(misses=1)
+            return None
+
+        try:
+            magic, count = _HEADER.unpack_from(data, 0)
+            if magic != MAGIC:
+                raise ValueError("缓存文件格式不匹配")
+            buffer = zstandard.ZstdDecompressor().decompress(data[_HEADER.size:])
+            # 只扫描长度前缀建立偏移表，不解码正文
+            offsets, offset = [], 0
+            for _ in range(count):
+                offsets.append(offset)
+                content_len, metadata_len = _RECORD.unpack_from(buffer, offset)
+                offset += _RECORD.size + content_len + metadata_len
+            if offset != len(buffer):
+                raise ValueError("缓存文件长度不匹配")
+        except Exception as e:
+            logger.warning(f"缓存文件损坏，已删除: {path.name} - {str(e)}")
+            path.unlink(missing_ok=True)
+            self._count(misses=1)
+            return None
+
+        # 刷新修改时间，作为LRU淘汰依据
+        os.utime(path)
+        self._count(hits=1, bytes_read=len(data))
+        return LazyChunks(buffer, offsets)
+
+    # 4. 写入缓存（先写临时文件再原子替换），必要时淘汰旧条目
+    def put(self, key: str, documents: List[Document]):
+        """
+        key - 缓存键
+        documents - 文档块
+        """
+        parts = []
+        for doc in documents:
+            content = doc.page_content.encode("utf-8")
+            metadata = json.dumps(doc.metadata, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+            parts += [_RECORD.pack(len(content), len(metadata)), content, metadata]
+        payload = zstandard.ZstdCompressor(level=self.level).compress(b"".join(parts))
+
+        path = self.path_for(key)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(documents)))
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._count(writes=1, bytes_written=_HEADER.size + len(payload))
+        self.evict()
+
+    # 5. 按最近使用时间淘汰，直到总大小不超过上限
+    def evict(self) -> int:
+        """
+        @return 淘汰的条目数
+        """
+        if not self.max_bytes:
+            return 0
+        entries = []
+        for path in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count(evictions=evicted)
+            logger.info(f"解析缓存超出上限，已淘汰 {evicted} 个条目")
+        return evicted
+
+    # 6. 删除全部缓存文件
+    def clear(self):
+        for path in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            path.unlink(missing_ok=True)
+
+    # 7. 缓存统计
+    def stats(self) -> Dict[str, Any]:
+        """
+        @return 命中/未命中/写入/淘汰次数、读写字节数、命中率、当前条目数与总大小
+        """
+        sizes = [path.stat().st_size for path in self.cache_dir.glob(f"*{CACHE_SUFFIX}")]
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(sizes),
+            "total_bytes": sum(sizes),
+            "max_bytes": self.max_bytes
+        })
+        return stats
+
+    def _count(self, **deltas: int):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
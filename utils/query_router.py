@@ -0,0 +1,75 @@
+"""
+查询路由模块
+用本地规则识别明确的单实体定义类查询（如"飞天项目是什么？"），这类查询无需规划LLM，直接以实体执行一次检索；
+其余查询（包括"张三参与了哪个项目？"这类需要先找到中间实体的问题）一律交给规划LLM
+"""
+import re
+from typing import Any, Dict, Optional
+
+from config.settings import PLAN_FAST_PATH_MAX_CHARS
+
+# 单实体定义类查询的句式，捕获组为实体
+_LOOKUP_PATTERNS = [
+    re.compile(r"^(?P<entity>.+?)(是什么|是啥|是什么意思)[?？。!！]*$"),
+    re.compile(r"^(什么是|何为|请介绍一下|介绍一下|介绍)(?P<entity>.+?)[?？。!！]*$"),
+    re.compile(r"^(what\s+is|what\s+are|define)\s+(?P<entity>.+?)[?.!]*$", re.IGNORECASE),
+]
+
+# 多跳特征：关系动词（"参与""负责""同事"等需要经由中间实体推理）、并列与比较、所属与链式指代
+_MULTI_HOP_PATTERN = re.compile(
+    r"参与|负责|属于|隶属|所属|所在|同事|上级|下属|领导|管理|成员|团队|合作|加入|担任|汇报|经历|工作"
+    r"|和|与|及|跟|同一|之间|关系|比较|对比|区别|共同|分别|同时|还是|并且|而且|其中|哪|谁|的"
+    r"|\b(and|or|of|between|compare|versus|vs|both|relationship|who|which|whose)\b",
+    re.IGNORECASE
+)
+# 多个分句（逗号、分号）意味着多个信息需求
+_CLAUSE_PATTERN = re.compile(r"[,，;；]")
+
+
+# 1. 提取单实体定义类查询中的实体
+def lookup_entity(query: str, max_chars: int = PLAN_FAST_PATH_MAX_CHARS) -> Optional[str]:
+    """
+    query - 用户查询
+    max_chars - 超过该长度的查询交给规划LLM
+
+    @return 实体名称；不是明确的单实体查询时返回None（规则偏保守，拿不准时返回None）
+    """
+    query = query.strip()
+    if not query or len(query) > max_chars or _CLAUSE_PATTERN.search(query):
+        return None
+    for pattern in _LOOKUP_PATTERNS:
+        match = pattern.match(query)
+        if match:
+            entity = match.group("entity").strip()
+            if entity and not _MULTI_HOP_PATTERN.search(entity):
+                return entity
+            return None
+    return None
+
+
+# 2. 判断是否可以跳过规划LLM
+def is_single_hop(query: str, max_chars: int = PLAN_FAST_PATH_MAX_CHARS) -> bool:
+    return lookup_entity(query, max_chars) is not None
+
+
+# 3. 单跳检索计划（与规划LLM输出的格式一致）
+def single_hop_plan(query: str) -> Dict[str, Any]:
+    """
+    query - 用户查询
+
+    @return 检索一次的计划：单实体查询以实体为检索目标，否则以原查询为目标（规划失败时的兜底计划）
+    """
+    target = lookup_entity(query) or query
+    return {
+        "query_type": "simple",
+        "key_entities": [target],
+        "reasoning_steps": [
+            {
+                "step": 1,
+                "action": "search",
+                "target": target,
+                "purpose": "直接搜索相关信息"
+            }
+        ],
+        "expected_hops": 1
+    }
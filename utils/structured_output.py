@@ -0,0 +1,283 @@
+"""
+结构化输出模块
+从模型的（流式）输出中增量解析JSON对象并按pydantic模型校验：
+对象的右括号一到达即可解析，无需等待生成结束；校验失败时把错误反馈给模型要求修复，重试次数有上限
+"""
+import re
+import json
+import inspect
+import logging
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from config.settings import STRUCTURED_OUTPUT_MAX_REPAIRS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+# 宽松修复：去掉右括号前多余的逗号，Python字面量改为JSON字面量
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PYTHON_LITERALS = re.compile(r"\b(True|False|None)\b")
+_JSON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class StructuredOutputError(ValueError):
+    """
+    修复重试后模型输出仍无法解析为目标模型
+    """
+    def __init__(self, message: str, content: str = ""):
+        super().__init__(message)
+        self.content = content
+
+
+class IncrementalJSONParser:
+    """
+    增量JSON解析器：逐段输入文本，跟踪字符串与括号状态，顶层对象闭合时立即解析；
+    每个字符只扫描一次，代码块标记和对象前后的说明文字会被跳过
+    """
+    def __init__(self):
+        self.text = ""
+        self.errors: List[str] = []
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+
+    # 1. 输入一段新文本
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        text - 模型新输出的文本
+
+        @return 本次闭合并解析成功的顶层JSON对象
+        """
+        self.text += text or ""
+        objects: List[Dict[str, Any]] = []
+        while self._pos < len(self.text):
+            char = self.text[self._pos]
+            self._pos += 1
+            if self._start is None:
+                if char == "{":
+                    self._start = self._pos - 1
+                    self._stack = ["{"]
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    value = self._loads(self.text[self._start:self._pos])
+                    self._start = None
+                    if isinstance(value, dict):
+                        objects.append(value)
+        return objects
+
+    # 2. 当前未闭合对象的尽力解析结果（仅用于生成过程中的流式预览，不作为最终结果）
+    def partial(self) -> Optional[Dict[str, Any]]:
+        """
+        @return 补全字符串与括号后得到的对象，无法补全时返回None
+        """
+        if self._start is None:
+            return None
+        text = self.text[self._start:]
+        in_string = self._in_string
+        stack = list(self._stack)
+        # 最后一个键值对不完整时逐步回退到上一个逗号
+        for _ in range(8):
+            candidate = text + ('"' if in_string else "")
+            candidate = re.sub(r"[,:]\s*$", "", candidate.rstrip())
+            candidate += "".join("}" if bracket == "{" else "]" for bracket in reversed(stack))
+            value = self._loads(candidate, record=False)
+            if isinstance(value, dict):
+                return value
+            cut = text.rfind(",")
+            if cut <= 0:
+                return None
+            text = text[:cut]
+            in_string, stack = _scan_state(text)
+        return None
+
+    # 3. 是否有已开始但尚未闭合的顶层对象
+    @property
+    def unclosed(self) -> bool:
+        return self._start is not None
+
+    def _loads(self, text: str, record: bool = True) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+        try:
+            repaired = _TRAILING_COMMA.sub(r"\1", text)
+            repaired = _PYTHON_LITERALS.sub(lambda match: _JSON_LITERALS[match.group(1)], repaired)
+            return json.loads(repaired)
+        except ValueError as e:
+            if record:
+                self.errors.append(f"JSON语法错误: {e}")
+            return None
+
+
+def _scan_state(text: str) -> Tuple[bool, List[str]]:
+    # 重新计算一段以"{"开头的文本末尾的字符串与括号状态
+    in_string, escape, stack = False, False, []
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]" and stack:
+            stack.pop()
+    return in_string, stack
+
+
+# 1. 解析完整文本
+def parse_structured(content: str, schema: Type[T]) -> T:
+    """
+    content - 模型输出
+    schema - 目标pydantic模型
+
+    @return 校验通过的模型实例，失败时抛出StructuredOutputError
+    """
+    parser = IncrementalJSONParser()
+    result, error = _first_valid(parser, [content], schema)
+    if result is None:
+        raise StructuredOutputError(error, content)
+    return result
+
+
+# 2. 同步运行并解析：对象闭合即停止读取流，失败时发送修复提示重试
+def run_structured(
+    stream_fn: Callable[[str], Iterable[Any]],
+    prompt: str,
+    schema: Type[T],
+    max_repairs: int = STRUCTURED_OUTPUT_MAX_REPAIRS
+) -> T:
+    """
+    stream_fn - 以提示词调用模型、返回流式输出片段的函数（片段为文本或带content属性的对象）
+    prompt - 提示词
+    schema - 目标pydantic模型
+    max_repairs - 最多发送几次修复提示
+
+    @return 校验通过的模型实例，重试用尽时抛出StructuredOutputError
+    """
+    for attempt in range(max_repairs + 1):
+        parser = IncrementalJSONParser()
+        chunks = stream_fn(prompt)
+        try:
+            result, error = _first_valid(parser, chunks, schema)
+        finally:
+            _close(chunks)
+        if result is not None:
+            return result
+        logger.warning(f"结构化输出解析失败（第 {attempt + 1} 次）: {error}")
+        prompt = repair_prompt(schema, parser.text, error)
+    raise StructuredOutputError(error, parser.text)
+
+
+# 3. run_structured的异步版本
+async def arun_structured(
+    stream_fn: Callable[[str], AsyncIterable[Any]],
+    prompt: str,
+    schema: Type[T],
+    max_repairs: int = STRUCTURED_OUTPUT_MAX_REPAIRS
+) -> T:
+    """
+    stream_fn - 以提示词调用模型、返回异步流式输出的函数
+    """
+    for attempt in range(max_repairs + 1):
+        parser = IncrementalJSONParser()
+        chunks = stream_fn(prompt)
+        result, error = None, "模型没有输出JSON对象"
+        try:
+            async for chunk in chunks:
+                result, error = _validate_objects(parser.feed(_chunk_text(chunk)), schema, error)
+                if result is not None:
+                    break
+        finally:
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+        if result is None:
+            result, error = _validate_tail(parser, schema, error)
+        if result is not None:
+            return result
+        logger.warning(f"结构化输出解析失败（第 {attempt + 1} 次）: {error}")
+        prompt = repair_prompt(schema, parser.text, error)
+    raise StructuredOutputError(error, parser.text)
+
+
+# 4. 修复提示：附上原输出、错误与JSON Schema，要求只输出修正后的JSON
+def repair_prompt(schema: Type[BaseModel], content: str, error: str) -> str:
+    """
+    schema - 目标pydantic模型
+    content - 上一次的模型输出
+    error - 解析或校验错误
+
+    @return 修复提示词
+    """
+    return f"""
+        你上一次的输出无法解析为要求的JSON格式。
+
+        错误：{error}
+
+        上一次的输出：
+        {content[-4000:]}
+
+        请只输出一个符合以下JSON Schema的JSON对象，不要输出其他内容：
+        {json.dumps(schema.model_json_schema(), ensure_ascii=False)}
+        """
+
+
+def _first_valid(parser: IncrementalJSONParser, chunks: Iterable[Any], schema: Type[T]) -> Tuple[Optional[T], str]:
+    error = "模型没有输出JSON对象"
+    for chunk in chunks:
+        result, error = _validate_objects(parser.feed(_chunk_text(chunk)), schema, error)
+        if result is not None:
+            return result, error
+    return _validate_tail(parser, schema, error)
+
+
+def _validate_objects(objects: List[Dict[str, Any]], schema: Type[T], error: str) -> Tuple[Optional[T], str]:
+    for value in objects:
+        try:
+            return schema.model_validate(value), error
+        except ValidationError as e:
+            error = f"字段校验失败: {e}"
+    return None, error
+
+
+def _validate_tail(parser: IncrementalJSONParser, schema: Type[T], error: str) -> Tuple[Optional[T], str]:
+    # 输出结束仍未得到有效对象：未闭合的对象视为输出被截断（补全后的字段可能不完整），交给修复重试
+    if parser.unclosed:
+        return None, "输出被截断：JSON对象没有闭合"
+    if parser.errors:
+        error = parser.errors[-1]
+    return None, error
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = chunk if isinstance(chunk, str) else getattr(chunk, "content", None)
+    return content if isinstance(content, str) else ""
+
+
+def _close(chunks: Any):
+    # 提前停止读取生成器时显式关闭，释放底层连接
+    if inspect.isgenerator(chunks):
+        chunks.close()
@@ -0,0 +1,73 @@
+"""
+流式<think>块解析模块
+逐段输入模型输出，实时区分思考过程与正式回答；标签跨片段被截断时暂存尾部，等下一段到达再判断
+"""
+from typing import List, Tuple
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# 片段类型
+THINK = "think"
+ANSWER = "answer"
+
+
+class ThinkStreamParser:
+    """
+    增量解析器：feed返回本次可以确定类型的 (类型, 文本) 片段列表
+    """
+    def __init__(self):
+        self.in_think = False
+        self._pending = ""
+        self.think = ""
+        self.answer = ""
+
+    # 1. 输入一段新文本
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """
+        text - 模型新输出的文本
+
+        @return 已确定类型的片段
+        """
+        buffer = self._pending + (text or "")
+        self._pending = ""
+        parts: List[Tuple[str, str]] = []
+        while buffer:
+            tag = THINK_CLOSE if self.in_think else THINK_OPEN
+            index = buffer.find(tag)
+            if index >= 0:
+                self._emit(parts, buffer[:index])
+                buffer = buffer[index + len(tag):]
+                self.in_think = not self.in_think
+                continue
+            # 结尾可能是被截断的标签前缀，留到下一段再判断
+            keep = _partial_suffix(buffer, tag)
+            self._emit(parts, buffer[:len(buffer) - keep])
+            self._pending = buffer[len(buffer) - keep:]
+            break
+        return parts
+
+    # 2. 输入结束，输出剩余文本
+    def close(self) -> List[Tuple[str, str]]:
+        parts: List[Tuple[str, str]] = []
+        self._emit(parts, self._pending)
+        self._pending = ""
+        return parts
+
+    def _emit(self, parts: List[Tuple[str, str]], text: str):
+        if not text:
+            return
+        kind = THINK if self.in_think else ANSWER
+        if kind == THINK:
+            self.think += text
+        else:
+            self.answer += text
+        parts.append((kind, text))
+
+
+# 文本结尾与标签开头重合的最大长度
+def _partial_suffix(text: str, tag: str) -> int:
+    for size in range(min(len(text), len(tag) - 1), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
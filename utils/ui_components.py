@@ -4,12 +4,13 @@ UI组件模块，包含所有Streamlit UI渲染逻辑
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from typing import Tuple, List, Any
+from typing import Tuple, List, Any, Iterable, Optional
 import logging
 from utils.document_processor import DocumentProcessor
 from services.vector_store import VectorStoreService
 from langchain.schema import Document
 from config.settings import AVAILABLE_EMBEDDING_MODELS
+from utils.think_parser import ThinkStreamParser, THINK
 
 logger = logging.getLogger(__name__)
 
@@ -133,34 +134,28 @@ class UIComponents:
             all_docs = []
             if uploaded_files:
                 if st.button("处理文档"):
-                    with st.spinner("正在处理文档..."):
-                        for uploaded_file in uploaded_files:
-                            if uploaded_file.name not in processed_documents:
-                                try:
-                                    # 统一处理所有文件类型
-                                    result = document_processor.process_file(uploaded_file)
-                                    
-                                    if isinstance(result, list):
-                                        # 结果是Document列表(PDF文档)
-                                        all_docs.extend(result)
-                                    else:
-                                        # 结果是文本内容(TXT、DOCX等)
-                                        doc = Document(
-                                            page_content=result, 
-                                            metadata={"source": uploaded_file.name}
-                                        )
-                                        all_docs.append(doc)
-                                    
-                                    processed_documents.append(uploaded_file.name)
-                                    st.success(f"✅ 已处理: {uploaded_file.name}")
-                                except Exception as e:
-                                    st.error(f"❌ 处理失败: {uploaded_file.name} - {str(e)}")
-                            else:
-                                st.warning(f"⚠️ 已存在: {uploaded_file.name}")
-                
-                if all_docs:
-                    with st.spinner("正在构建向量索引..."):
-                        vector_store.vector_store = vector_store.create_vector_store(all_docs)
+                    with st.spinner("正在处理文档并更新向量索引..."):
+                        # 多个文件并行解析，结果按上传顺序逐个返回
+                        for result in document_processor.process_files(uploaded_files):
+                            file_name = result["file_name"]
+                            if result["error"]:
+                                st.error(f"❌ 处理失败: {file_name} - {result['error']}")
+                                continue
+                            try:
+                                file_docs = result["documents"]
+                                all_docs.extend(file_docs)
+                                
+                                # 按文件增量同步：内容未变化时不重新嵌入，变化时仅替换该文件的文档块
+                                stats = vector_store.sync_source(file_name, file_docs)
+                                
+                                if file_name not in processed_documents:
+                                    processed_documents.append(file_name)
+                                if stats["added"] or stats["removed"]:
+                                    st.success(f"✅ 已处理: {file_name}（新增 {stats['added']} 块，移除 {stats['removed']} 块，耗时 {result['elapsed_seconds']:.1f}s）")
+                                else:
+                                    st.info(f"ℹ️ 内容未变化: {file_name}")
+                            except Exception as e:
+                                st.error(f"❌ 处理失败: {file_name} - {str(e)}")
             
             # 显示已处理文档列表
             if processed_documents:
@@ -200,4 +195,43 @@ class UIComponents:
                         st.markdown(content)
             else:
                 with st.chat_message(role):
-                    st.write(content) 
\ No newline at end of file
+                    st.write(content) 
+
+
+    # 6. 流式渲染模型回复：思考过程与正式回答实时分开显示
+    @staticmethod
+    def render_streaming_response(chunks: Iterable[str], docs: Optional[List[Document]] = None) -> Tuple[str, Optional[str]]:
+        """
+        chunks - 模型输出的增量文本
+        docs - 检索到的文档（可选，回答结束后显示）
+
+        @return (正式回答, 思考过程)，没有思考过程时为None
+        """
+        parser = ThinkStreamParser()
+        with st.chat_message("assistant"):
+            think_placeholder = st.empty()
+            answer_placeholder = st.empty()
+            answer_placeholder.markdown("▌")
+            think_body = None
+
+            def render(parts):
+                nonlocal think_body
+                for kind, _ in parts:
+                    if kind == THINK and think_body is None:
+                        think_body = think_placeholder.expander("💡 查看推理过程 <think> ... </think>", expanded=True).empty()
+                if think_body is not None and any(kind == THINK for kind, _ in parts):
+                    think_body.markdown(parser.think)
+                if any(kind != THINK for kind, _ in parts):
+                    answer_placeholder.markdown(parser.answer.lstrip() + "▌")
+
+            for chunk in chunks:
+                render(parser.feed(chunk))
+            render(parser.close())
+            answer_placeholder.markdown(parser.answer.strip())
+
+            if docs:
+                with st.expander(f"🔎 查看本次召回的文档块", expanded=False):
+                    for idx, doc in enumerate(docs, 1):
+                        st.markdown(f"**文档块{idx}:**\n{doc.page_content}")
+
+        return parser.answer.strip(), (parser.think.strip() or None)